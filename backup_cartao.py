@@ -1,5 +1,4 @@
 import os
-import shutil
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext, messagebox, font
 import threading
@@ -10,14 +9,34 @@ import queue
 import re
 import platform
 import subprocess
-
-# Importação opcional do PIL
+import json
+import sqlite3
+import argparse
+import sys
+import asyncio
+
+# Toda a parte de ingestão (varredura, cópia, verificação, catálogo, envio) fica no motor
+from motor_ingest import (
+    ARQUIVO_CATALOGO, FILTROS_NIVEL, MAX_LINHAS_LOG, MB, MODOS_CACHE, MODOS_DESTINO,
+    MODOS_REORGANIZACAO, ORDENS_COPIA, PASTAS_CATEGORIA, PORTA_ENVIO_PADRAO, REGISTRO_TIPOS,
+    ZSTD_AVAILABLE, CanalEventos, CatalogoMetadados, LeitorDiario, LimitadorBanda, MetricasIngest,
+    MonitorCartoes, ServidorEnvioLocal, ServidorMetricas, algoritmo_hash_padrao, avisos_sondagem,
+    backend_envio, caminhos_origem, carregar_thumbnail, checar_espaco, duplicatas_da_data,
+    endereco_metricas, estimar_duracao, excluidos_por_classificacao, exportar_mhl, formatar_data_br,
+    formatar_duracao, formatar_tamanho, ingest, ler_data_usuario, listar_arquivos,
+    redundantes_na_selecao, reorganizacao_disponivel, scan, separar_membro, sondar_velocidades,
+    tamanho_total_arquivos, tem_lista_mhl, tipo_arquivo, verificar_contra_mhl,
+    verificar_contra_origem,
+)
+
+# Importação opcional do PIL (miniaturas na interface)
 try:
     from PIL import Image, ImageTk
     PIL_AVAILABLE = True
 except ImportError:
     PIL_AVAILABLE = False
 
+
 # --------------------------- CONFIGURAÇÃO DE TEMA ---------------------------
 
 
@@ -125,6 +144,15 @@ class ModernTheme:
                         width=12)
         style.map('TScrollbar', background=[('active', ModernTheme.ACCENT)])
 
+        # Treeview (diário do backup)
+        style.configure('Treeview', background=ModernTheme.BG_TERTIARY,
+                        fieldbackground=ModernTheme.BG_TERTIARY,
+                        foreground=ModernTheme.FG_PRIMARY,
+                        borderwidth=0, font=('Consolas', 10))
+        style.configure('Treeview.Heading', background=ModernTheme.BG_SECONDARY,
+                        foreground=ModernTheme.FG_PRIMARY, relief='flat', font=('Arial', 10, 'bold'))
+        style.map('Treeview', background=[('selected', ModernTheme.ACCENT)])
+
         # Progressbar styling
         style.configure('Modern.Horizontal.TProgressbar',
                         background=ModernTheme.ACCENT,
@@ -157,113 +185,12 @@ class ThreadSafeQueue:
                 break
         return items
 
-# --------------------------- FUNÇÕES AUXILIARES ---------------------------
-
-
-def get_file_types():
-    return {
-        'photo': ['.JPG', '.JPEG', '.ARW', '.RAW', '.CR2', '.CR3', '.NEF', '.DNG', '.RAF', '.ORF', '.HEIC', '.TIFF'],
-        'video': ['.MP4', '.MOV', '.AVI', '.MTS', '.M2TS', '.MXF', '.BRAW', '.R3D', '.MPEG', '.WMV', '.FLV'],
-        'meta': ['.XML', '.XMP']
-    }
-
-
-def listar_arquivos(caminho, incluir_xml):
-    file_types = get_file_types()
-    tipos_fotos = file_types['photo']
-    tipos_videos = file_types['video']
-    tipos_xml = file_types['meta'] if incluir_xml else []
-
-    arquivos_fotos, arquivos_videos, arquivos_xml = [], [], []
-
-    excluded_dirs = ['THMBNL', '.Trash',
-                     'System Volume Information', 'RECYCLER', '$RECYCLE.BIN']
-
-    for raiz, _, nomes in os.walk(caminho):
-        if any(skip in raiz for skip in excluded_dirs):
-            continue
-
-        for nome in nomes:
-            if nome.startswith(('._', '~$')) or nome == '.DS_Store':
-                continue
-
-            full_path = os.path.join(raiz, nome)
-            nome_up = nome.upper()
-
-            if any(nome_up.endswith(t) for t in tipos_fotos):
-                arquivos_fotos.append(full_path)
-            elif any(nome_up.endswith(t) for t in tipos_videos):
-                arquivos_videos.append(full_path)
-            elif any(nome_up.endswith(t) for t in tipos_xml):
-                arquivos_xml.append(full_path)
-
-    return arquivos_fotos, arquivos_videos, arquivos_xml
-
-
-def extrair_data_arquivo(caminho):
-    try:
-        return datetime.fromtimestamp(os.path.getmtime(caminho)).strftime('%Y-%m-%d')
-    except Exception:
-        return 'UNKNOWN-DATE'
-
-
-def formatar_data_br(data_str):
-    if data_str == 'UNKNOWN-DATE':
-        return 'Data Desconhecida'
-    try:
-        return datetime.strptime(data_str, '%Y-%m-%d').strftime('%d/%m/%Y')
-    except (ValueError, IndexError):
-        return data_str
-
-
-def checar_espaco(destino):
-    try:
-        total, _, free = shutil.disk_usage(destino)
-        return total, free
-    except FileNotFoundError:
-        return 0, 0
-
-
-def tamanho_total_arquivos(arquivos):
-    return sum(os.path.getsize(a) for a in arquivos if os.path.exists(a))
-
-
-def formatar_tamanho(b):
-    if b is None:
-        return "N/A"
-    if b < 1024:
-        return f"{b} B"
-    kb = b / 1024
-    if kb < 1024:
-        return f"{kb:.0f} KB"
-    mb = kb / 1024
-    if mb < 1024:
-        return f"{mb:.1f} MB"
-    gb = mb / 1024
-    return f"{gb:.2f} GB"
-
-
-def tipo_arquivo(nome):
-    nome_up = nome.upper()
-    file_types = get_file_types()
-    if any(nome_up.endswith(t) for t in file_types['video']):
-        return 'VIDEOS'
-    if any(nome_up.endswith(t) for t in file_types['photo']):
-        return 'FOTOS'
-    if any(nome_up.endswith(t) for t in file_types['meta']):
-        return 'METADATA'
-    return 'OUTROS'
+# --------------------------- FUNÇÕES AUXILIARES DA INTERFACE ---------------------------
 
 
 def gerar_thumbnail(arquivo, tamanho=(100, 100)):
-    if not PIL_AVAILABLE or tipo_arquivo(arquivo) != 'FOTOS':
-        return None
-    try:
-        with Image.open(arquivo) as img:
-            img.thumbnail(tamanho, Image.Resampling.LANCZOS)
-            return ImageTk.PhotoImage(img)
-    except Exception:
-        return None
+    img = carregar_thumbnail(arquivo, tamanho)
+    return ImageTk.PhotoImage(img) if img is not None else None
 
 
 def abrir_pasta(pasta):
@@ -282,13 +209,13 @@ def abrir_pasta(pasta):
         messagebox.showerror("Erro ao abrir pasta",
                              f"Não foi possível abrir a pasta:\n{e}")
 
-
 # --------------------------- POPUP DE SELEÇÃO DE DATAS ---------------------------
 class PopupSelecaoDatas(tk.Toplevel):
-    def __init__(self, parent, datas_info, destino_base, video_icon):
+    def __init__(self, parent, datas_info, destino_base, video_icon, duplicatas=()):
         super().__init__(parent)
         self.parent = parent
         self.datas_info = datas_info
+        self.duplicatas = duplicatas
         self.destino_base = destino_base
         self.video_icon = video_icon
         self.result = {}
@@ -340,13 +267,36 @@ class PopupSelecaoDatas(tk.Toplevel):
 
         self.checkboxes, self.pasta_entries, self.prefixo_entries, self.renomear_vars, self.manter_numeracao_vars, self.exemplo_labels, self.rename_widgets_by_date = {
         }, {}, {}, {}, {}, {}, defaultdict(list)
+        self.fixar_vars = {}
 
         for data in sorted(datas_info.keys()):
             self._create_date_entry(scrollable_frame, data, datas_info[data])
 
+        filtros_frame = ttk.Frame(main_frame, style='TFrame')
+        filtros_frame.grid(row=2, column=0, sticky="w", pady=(10, 0))
+
+        # Duplicatas exatas (dual-slot, pastas já copiadas)
+        self.pular_duplicatas_var = tk.BooleanVar(value=True)
+        redundantes = [a for info in datas_info.values()
+                       for a in info.get('duplicatas', [])]
+        if redundantes:
+            ttk.Checkbutton(filtros_frame, variable=self.pular_duplicatas_var,
+                            text=f"♊ Pular duplicatas, conferidas por hash na cópia ({len(redundantes)} arquivos, "
+                            f"{formatar_tamanho(tamanho_total_arquivos(redundantes))})").pack(side="left", padx=(0, 20))
+
+        # Seleção pela classificação feita na câmera ou no culling (sidecars XMP)
+        self.nota_minima_var = tk.StringVar(value="Todas")
+        self.pular_rejeitadas_var = tk.BooleanVar(value=False)
+        if any(info.get('classificacoes') for info in datas_info.values()):
+            ttk.Label(filtros_frame, text="⭐ Fotos com nota ≥").pack(side="left")
+            ttk.Combobox(filtros_frame, textvariable=self.nota_minima_var, values=["Todas", "1", "2", "3", "4", "5"],
+                         state="readonly", width=6).pack(side="left", padx=(5, 15))
+            ttk.Checkbutton(filtros_frame, text="🚫 Pular rejeitadas",
+                            variable=self.pular_rejeitadas_var).pack(side="left")
+
         # Action Buttons
         btn_frame = ttk.Frame(main_frame)
-        btn_frame.grid(row=2, column=0, pady=(20, 0))
+        btn_frame.grid(row=3, column=0, pady=(20, 0))
 
         ModernTheme.create_styled_button(
             btn_frame, "Selecionar Todas", self.selecionar_todas).pack(side="left", padx=5)
@@ -369,8 +319,16 @@ class PopupSelecaoDatas(tk.Toplevel):
         ttk.Checkbutton(data_frame, text=f"📅 {formatar_data_br(data)}", variable=var).grid(
             row=0, column=0, sticky="w", pady=(0, 5))
         info_text = f"({len(info['arquivos'])} arquivos - {formatar_tamanho(info['tamanho'])})"
+        if info.get('duplicatas'):
+            info_text += f" ♊ {len(info['duplicatas'])} duplicatas"
+        if info.get('classificacoes'):
+            info_text += f" ⭐ {len(info['classificacoes'])} classificadas"
         ttk.Label(data_frame, text=info_text, foreground=ModernTheme.FG_SECONDARY).grid(
             row=0, column=1, sticky="w", padx=10, pady=(0, 5))
+        fixar_var = tk.BooleanVar(value=False)
+        self.fixar_vars[data] = fixar_var
+        ttk.Checkbutton(data_frame, text="📌 Copiar primeiro", variable=fixar_var).grid(
+            row=0, column=2, sticky="e", pady=(0, 5))
 
         # Previews
         preview_frame = ttk.Frame(data_frame, style='TFrame')
@@ -510,20 +468,39 @@ class PopupSelecaoDatas(tk.Toplevel):
 
     def confirmar(self):
         self.result = {}
-        for data, var in self.checkboxes.items():
-            if var.get():
-                pasta_destino = self.pasta_entries[data].get().strip()
-                if not pasta_destino:
-                    messagebox.showerror(
-                        "Erro de Configuração", f"A pasta de destino para {formatar_data_br(data)} não pode estar vazia.")
-                    return
-                self.result[data] = {
-                    'pasta': pasta_destino,
-                    'prefixo': self.prefixo_entries[data].get().strip() if self.renomear_vars[data].get() else None,
-                    'renomear': self.renomear_vars[data].get(),
-                    'manter_numeracao': self.manter_numeracao_vars[data].get(),
-                    'arquivos': self.datas_info[data]['arquivos']
-                }
+        nota_minima = int(self.nota_minima_var.get()) if self.nota_minima_var.get().isdigit() else 0
+        classificacoes, sidecars = {}, {}
+        for info in self.datas_info.values():
+            classificacoes.update(info.get('classificacoes', {}))
+            sidecars.update(info.get('sidecars', {}))
+        excluidos = excluidos_por_classificacao(
+            [a for info in self.datas_info.values() for a in info['arquivos']],
+            classificacoes, sidecars, nota_minima, self.pular_rejeitadas_var.get())
+        selecionadas = [data for data, var in self.checkboxes.items() if var.get()]
+        redundantes = {}
+        if self.pular_duplicatas_var.get():
+            # O arquivo que fica de cada grupo precisa estar entre os que serão copiados
+            redundantes = redundantes_na_selecao(self.duplicatas, {
+                a for data in selecionadas for a in self.datas_info[data]['arquivos'] if a not in excluidos})
+        for data in selecionadas:
+            pasta_destino = self.pasta_entries[data].get().strip()
+            if not pasta_destino:
+                messagebox.showerror(
+                    "Erro de Configuração", f"A pasta de destino para {formatar_data_br(data)} não pode estar vazia.")
+                return
+            arquivos = [a for a in self.datas_info[data]['arquivos']
+                        if a not in excluidos and a not in redundantes]
+            if not arquivos:
+                continue  # nada da data passou nos filtros
+            self.result[data] = {
+                'pasta': pasta_destino,
+                'prefixo': self.prefixo_entries[data].get().strip() if self.renomear_vars[data].get() else None,
+                'renomear': self.renomear_vars[data].get(),
+                'manter_numeracao': self.manter_numeracao_vars[data].get(),
+                'fixada': self.fixar_vars[data].get(),
+                'arquivos': arquivos,
+                'duplicatas': duplicatas_da_data(redundantes, self.datas_info[data]['arquivos'])
+            }
         if not self.result:
             messagebox.showwarning(
                 "Seleção Vazia", "Nenhuma data selecionada para backup. Selecione ao menos uma data ou Cancele.")
@@ -571,6 +548,8 @@ class PopupResumoFinal(tk.Toplevel):
                       ("⏱️ Tempo Total:",
                        f"{resumo_dados.get('tempo_total', 0)}s"),
                       ("❌ Erros:", f"{resumo_dados.get('erros', 0)}")]
+        if 'enviados' in resumo_dados:
+            stats_data.append(("☁️ Na nuvem:", resumo_dados['enviados']))
         for i, (label, value) in enumerate(stats_data):
             col = i % 2
             row = i // 2
@@ -592,12 +571,23 @@ class PopupResumoFinal(tk.Toplevel):
         ttk.Label(lembrete_frame, text="💡 Lembretes Importantes", font=('Arial', 14, 'bold'),
                   foreground=ModernTheme.WARNING).grid(row=0, column=0, sticky="w", pady=(5, 10))
 
-        lembretes_text = """🧠 LEMBRETE: Salve agora na nuvem pra não dar ruim depois! ☁️🔥
+        # O aviso de segurança depende do modo de reorganização usado neste backup
+        reorganizacao = resumo_dados.get('reorganizacao', 'copiar')
+        if reorganizacao == 'mover':
+            seguranca = (f"• Modo Mover: {resumo_dados.get('removidos_origem', 0)} arquivo(s) foram retirados da origem\n"
+                         "  (movidos para o destino; não há mais cópia deles lá).\n"
+                         "• Os demais arquivos da origem foram apenas lidos.")
+        elif reorganizacao == 'hardlink':
+            seguranca = ("• Nenhum arquivo da origem foi alterado ou removido.\n"
+                         "• Links físicos: destino e origem são o mesmo arquivo; editar um altera o outro.")
+        else:
+            seguranca = ("• Este programa NÃO alterou arquivos no cartão.\n"
+                         "• Apenas leitura e cópia foram realizadas.\n"
+                         "• Seus arquivos originais estão seguros.")
+        lembretes_text = f"""🧠 LEMBRETE: Salve agora na nuvem pra não dar ruim depois! ☁️🔥
 
 🛡️ SEGURANÇA:
-• Este programa NÃO altera arquivos no cartão.
-• Apenas leitura e cópia são realizadas.
-• Seus arquivos originais estão seguros.
+{seguranca}
 
 ☁️ BACKUP NA NUVEM:
 • Faça upload para Google Drive, iCloud, Dropbox, etc.
@@ -629,9 +619,12 @@ class PopupResumoFinal(tk.Toplevel):
 
 
 class PopupProgresso(tk.Toplevel):
-    def __init__(self, parent):
+    def __init__(self, parent, titulo="🚀 Realizando Backup...", titulo_janela="Progresso do Backup",
+                 titulo_concluido="✅ Backup Concluído!", titulo_erro="❌ Erro no Backup"):
         super().__init__(parent)
-        self.title("Progresso do Backup")
+        self.title(titulo_janela)
+        self.titulo_concluido = titulo_concluido
+        self.titulo_erro = titulo_erro
         self.geometry("600x400")
         self.configure(bg=ModernTheme.BG_PRIMARY)
         self.resizable(False, False)
@@ -649,7 +642,7 @@ class PopupProgresso(tk.Toplevel):
         main_frame.pack(fill="both", expand=True)
 
         self.titulo = ttk.Label(
-            main_frame, text="🚀 Realizando Backup...", font=('Arial', 18, 'bold'))
+            main_frame, text=titulo, font=('Arial', 18, 'bold'))
         self.titulo.pack(pady=(0, 20))
 
         self.info_label = ttk.Label(main_frame, text="Preparando...", font=(
@@ -670,6 +663,41 @@ class PopupProgresso(tk.Toplevel):
 
         self.btn_frame = ttk.Frame(main_frame, style='TFrame')
         self.btn_frame.pack(fill="x", pady=(10, 0))
+        self.ao_cancelar = None
+        self.cancelar_btn = None
+
+    def adicionar_cancelamento(self):
+        """Botão que chama `ao_cancelar`, definido por quem executa o trabalho."""
+        def _cancelar():
+            if self.ao_cancelar is not None:
+                self.cancelar_btn.config(state="disabled")
+                self.info_label.config(text="Cancelando após o arquivo em curso...")
+                self.ao_cancelar()
+        self.cancelar_btn = ModernTheme.create_styled_button(
+            self.btn_frame, "⛔ Cancelar", _cancelar, "Error.TButton")
+        self.cancelar_btn.pack()
+
+    def adicionar_controle_banda(self, limitador):
+        controle_frame = ttk.Frame(self.btn_frame.master, style='TFrame')
+        controle_frame.pack(fill="x", before=self.status_text)
+        ttk.Label(controle_frame, text="🐢 Limite de banda (MB/s):",
+                  foreground=ModernTheme.FG_SECONDARY).pack(side="left", padx=(0, 10))
+        limite_var = tk.StringVar(
+            value=str(limitador.taxa // MB) if limitador.taxa else "Sem limite")
+        combo = ttk.Combobox(controle_frame, textvariable=limite_var, width=12,
+                             values=["Sem limite", "400", "200", "100", "50", "25", "10"])
+        combo.pack(side="left")
+
+        def _aplicar(_event=None):
+            texto = limite_var.get().strip()
+            try:
+                limitador.ajustar(int(float(texto) * MB)
+                                  if texto[:1].isdigit() else 0)
+            except ValueError:
+                limite_var.set("Sem limite")
+                limitador.ajustar(0)
+        combo.bind("<<ComboboxSelected>>", _aplicar)
+        combo.bind("<Return>", _aplicar)
 
     def atualizar(self, progresso, info, status):
         progresso = max(0, min(100, progresso))
@@ -681,20 +709,24 @@ class PopupProgresso(tk.Toplevel):
             self.status_text.see(tk.END)
 
     def finalizar(self, sucesso=True, resumo_dados=None):
+        if self.cancelar_btn is not None:
+            self.cancelar_btn.destroy()
+            self.cancelar_btn = None
         if sucesso:
-            self.titulo.config(text="✅ Backup Concluído!",
+            self.titulo.config(text=self.titulo_concluido,
                                foreground=ModernTheme.SUCCESS)
             self.percent_label.config(
                 text="100%", foreground=ModernTheme.SUCCESS)
 
             btn_inner_frame = ttk.Frame(self.btn_frame)
             btn_inner_frame.pack()
-            ModernTheme.create_styled_button(btn_inner_frame, "Ver Resumo Final", lambda: self.mostrar_resumo_final(
-                resumo_dados), "Success.TButton").pack(side="left", padx=5)
+            if resumo_dados:
+                ModernTheme.create_styled_button(btn_inner_frame, "Ver Resumo Final", lambda: self.mostrar_resumo_final(
+                    resumo_dados), "Success.TButton").pack(side="left", padx=5)
             ModernTheme.create_styled_button(
                 btn_inner_frame, "Fechar", self.destroy, "Modern.TButton").pack(side="left", padx=5)
         else:
-            self.titulo.config(text="❌ Erro no Backup",
+            self.titulo.config(text=self.titulo_erro,
                                foreground=ModernTheme.ERROR)
             ModernTheme.create_styled_button(
                 self.btn_frame, "Fechar", self.destroy, "Error.TButton").pack()
@@ -707,111 +739,104 @@ class PopupProgresso(tk.Toplevel):
 # --------------------------- THREAD DE BACKUP ---------------------------
 
 
-def copiar_arquivos(app, mapa_datas, popup_progresso):
-    copiados, erros, total_tamanho, pastas_criadas = 0, 0, 0, set()
-    tempo_inicio = time.time()
-    linhas_log = []
+def copiar_arquivos(app, mapa_datas, popup_progresso, opcoes=None):
+    """Roda o `ingest` do motor num loop próprio e repassa os eventos para a interface."""
+    async def _executar():
+        eventos = CanalEventos()
+        tarefa = asyncio.create_task(ingest(
+            mapa_datas, opcoes, eventos, origem=app.cartao_var.get(), destino=app.destino_var.get(),
+            tamanhos=app.tamanhos))
+        loop = asyncio.get_running_loop()
+        popup_progresso.ao_cancelar = lambda: loop.call_soon_threadsafe(tarefa.cancel)
+        async for evento in eventos:
+            tipo = evento['tipo']
+            if tipo == 'progresso':
+                popup_progresso.atualizar(
+                    evento['percentual'], evento['info'], evento['detalhe'])
+            elif tipo == 'diario':
+                app.msg_queue.put(('diario', evento['caminho']))
+            elif tipo == 'log':
+                app.msg_queue.put(('log', evento['texto']))
+            elif tipo == 'fim':
+                app.msg_queue.put(('fim_backup', evento['concluido']))
+                popup_progresso.finalizar(
+                    sucesso=evento['sucesso'], resumo_dados=evento['resumo'])
+        try:
+            await tarefa
+        except asyncio.CancelledError:
+            pass
 
-    total_arquivos_a_copiar = sum(len(d['arquivos'])
-                                  for d in mapa_datas.values())
-    if total_arquivos_a_copiar == 0:
-        popup_progresso.finalizar(sucesso=True, resumo_dados={
-                                  'arquivos_copiados': 0, 'erros': 0, 'tamanho_total': '0 B', 'pastas_criadas': 0, 'tempo_total': 0, 'pasta_destino': None})
-        return
+    try:
+        asyncio.run(_executar())
+    except Exception as e:
+        app.msg_queue.put(('log', f"❌ Erro no backup: {e}"))
+        app.msg_queue.put(('fim_backup', False))
+        popup_progresso.finalizar(sucesso=False)
 
-    file_counters = defaultdict(lambda: 1)
-    for data, dados in mapa_datas.items():
-        arquivos_ordenados = sorted(
-            dados['arquivos'], key=lambda x: (os.path.getmtime(x), x))
+# --------------------------- VERIFICAÇÃO E ASC MHL ---------------------------
 
-        popup_progresso.atualizar(int((copiados / total_arquivos_a_copiar) * 100),
-                                  f"Processando data: {formatar_data_br(data)}", f"\n📅 Iniciando backup de {formatar_data_br(data)} ({len(arquivos_ordenados)} arquivos)")
 
-        for arq in arquivos_ordenados:
-            try:
-                tipo = tipo_arquivo(arq)
-                destino_subpasta = os.path.join(dados['pasta'], tipo)
-                if destino_subpasta not in pastas_criadas:
-                    os.makedirs(destino_subpasta, exist_ok=True)
-                    pastas_criadas.add(destino_subpasta)
-
-                nome_original, ext = os.path.splitext(os.path.basename(arq))
-                ext = ext.lower()
-
-                if dados.get('renomear') and dados.get('prefixo'):
-                    prefixo = dados['prefixo']
-                    if dados['manter_numeracao']:
-                        match = re.search(r'(\d+)', nome_original)
-                        num_part = match.group(
-                            1) if match else f"{file_counters[data]:04d}"
-                    else:
-                        num_part = f"{file_counters[data]:04d}"
-                    novo_nome = f"{prefixo}_{num_part}{ext}"
-                else:
-                    novo_nome = os.path.basename(arq)
-
-                destino_final = os.path.join(destino_subpasta, novo_nome)
-
-                status = ""
-                if os.path.exists(destino_final) and os.path.getsize(destino_final) == os.path.getsize(arq):
-                    status = "⏭️ Ignorado (idêntico)"
-                else:
-                    shutil.copy2(arq, destino_final)
-                    tamanho_copiado = os.path.getsize(destino_final)
-                    if tamanho_copiado == os.path.getsize(arq):
-                        status = "✅ Copiado"
-                        total_tamanho += tamanho_copiado
-                    else:
-                        status = "❌ Erro (tamanho diferente)"
-                        erros += 1
+def verificar_backup(app, popup_progresso, origem, destino, modo, incluir_xml=True, segundo_plano=False):
+    tempo_inicio = time.time()
+    algoritmo = algoritmo_hash_padrao()
 
-            except Exception as e:
-                status = f"❌ Erro: {e}"
-                erros += 1
+    def _progresso(feitos, total, caminho):
+        popup_progresso.atualizar((feitos / max(total, 1)) * 100,
+                                  f"Verificando: {os.path.basename(caminho)} ({feitos}/{total})", None)
 
-            copiados += 1
-            progresso_percent = (copiados / total_arquivos_a_copiar) * 100
-            popup_progresso.atualizar(
-                progresso_percent, f"Copiando: {os.path.basename(arq)}", f"{status} -> {novo_nome}")
-
-            log_msg = f"{os.path.basename(arq)} -> {tipo} -> {novo_nome}: {status}"
-            linhas_log.append(log_msg)
-            file_counters[data] += 1
-
-    popup_progresso.atualizar(100, "Finalizando...", "\n🔍 Gerando log...")
-    time.sleep(1)
-
-    tempo_total = int(time.time() - tempo_inicio)
-    resumo_texto = (f"📊 RESUMO DO BACKUP\n{'='*40}\n"
-                    f"✅ Arquivos copiados: {copiados - erros}\n"
-                    f"❌ Erros: {erros}\n"
-                    f"💾 Tamanho total: {formatar_tamanho(total_tamanho)}\n"
-                    f"⏱️ Tempo total: {tempo_total} segundos\n{'='*40}")
-
-    destino_log_base = list(mapa_datas.values())[
-        0]['pasta'] if mapa_datas else app.destino_var.get()
-    log_file_path = os.path.join(
-        destino_log_base, f"backup_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
     try:
-        with open(log_file_path, 'w', encoding='utf-8') as f:
-            f.write(
-                f"BACKUP LOG - {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n")
-            f.write(
-                f"Origem: {app.cartao_var.get()}\nDestino: {app.destino_var.get()}\n\n")
-            f.write(resumo_texto + "\n\n" + "="*40 +
-                    "\nDETALHES\n" + "="*40 + "\n\n")
-            f.write("\n".join(linhas_log))
+        if origem:
+            popup_progresso.atualizar(
+                0, "Listando arquivos do cartão...", "🔍 Comparando destino com o cartão")
+            arquivos_origem = []
+            for caminho in caminhos_origem(origem):
+                arquivos_origem.extend(
+                    sum(listar_arquivos(caminho, incluir_xml), []))
+            resultados = verificar_contra_origem(arquivos_origem, destino, modo, algoritmo,
+                                                 progresso=_progresso, segundo_plano=segundo_plano)
+        else:
+            popup_progresso.atualizar(
+                0, "Lendo lista ASC MHL...", "🔍 Comparando destino com a lista de hashes ASC MHL")
+            resultados = verificar_contra_mhl(
+                destino, modo, progresso=_progresso, segundo_plano=segundo_plano)
     except Exception as e:
-        app.msg_queue.put(('log', f"ERRO: Não foi possível salvar o log: {e}"))
+        app.msg_queue.put(('log', f"❌ Erro na verificação: {e}"))
+        app.msg_queue.put(('fim_backup', True))
+        popup_progresso.finalizar(sucesso=False)
+        return
 
+    contagem = defaultdict(int)
+    for r in resultados:
+        contagem[r['status']] += 1
+        if r['status'] != 'ok':
+            nome = os.path.basename(r['origem'] or r['destino'])
+            popup_progresso.atualizar(
+                100, "Consolidando...", f"❌ {r['status'].upper()}: {nome} {r.get('erro', '')}")
+
+    # Só o modo completo gera hashes reais do arquivo, aceitos numa lista ASC MHL; a lista
+    # descreve arquivos da pasta, então membros de contêineres TAR ficam de fora
+    mhl_gerado = None
+    if modo == 'completo':
+        entradas = [(r['destino'], r['algoritmo'], r['hash'], 'original' if origem else 'verified')
+                    for r in resultados if r['status'] == 'ok' and r['hash'] and not separar_membro(r['destino'])[1]]
+        if entradas:
+            try:
+                mhl_gerado = exportar_mhl(destino, entradas)
+            except Exception as e:
+                app.msg_queue.put(
+                    ('log', f"ERRO: Não foi possível exportar o ASC MHL: {e}"))
+
+    falhas = len(resultados) - contagem['ok']
+    resumo_texto = (f"🔍 RESUMO DA VERIFICAÇÃO ({'completa' if modo == 'completo' else 'rápida'})\n{'='*40}\n"
+                    f"✅ Conferidos: {contagem['ok']}\n"
+                    f"❌ Divergentes: {contagem['divergente']}\n"
+                    f"❓ Ausentes no destino: {contagem['ausente']}\n"
+                    f"⚠️ Erros de leitura: {contagem['erro']}\n"
+                    f"⏱️ Tempo total: {int(time.time() - tempo_inicio)} segundos\n"
+                    + (f"📜 ASC MHL: {mhl_gerado}\n" if mhl_gerado else "") + "="*40)
     app.msg_queue.put(('log', resumo_texto))
     app.msg_queue.put(('fim_backup', True))
-
-    resumo_dados = {'arquivos_copiados': copiados - erros, 'erros': erros,
-                    'tamanho_total': formatar_tamanho(total_tamanho),
-                    'tempo_total': tempo_total, 'pasta_destino': destino_log_base}
-
-    popup_progresso.finalizar(sucesso=(erros == 0), resumo_dados=resumo_dados)
+    popup_progresso.finalizar(sucesso=(falhas == 0))
 
 # --------------------------- APLICAÇÃO PRINCIPAL ---------------------------
 
@@ -828,6 +853,14 @@ class BackupCartaoApp(tk.Tk):
         self.msg_queue = ThreadSafeQueue()
         self.backup_em_andamento = False
         self.datas_info = {}
+        self.duplicatas = []
+        self.tamanhos = {}
+        self.metadados = {}
+        self.monitor_cartoes = None
+        self.metricas = MetricasIngest()
+        self.servidor_metricas = None
+        self.leitor_diario = None
+        self.pagina_diario = 0
         self.video_icon = self.create_video_icon()
 
         # Main layout
@@ -840,6 +873,9 @@ class BackupCartaoApp(tk.Tk):
         self.notebook = self.create_notebook(main_frame)
         self.create_footer(main_frame)
 
+        if REGISTRO_TIPOS.erro_config:
+            self.adicionar_log(f"⚠️ {REGISTRO_TIPOS.erro_config}")
+
         self.after(100, self.processar_mensagens)
 
     def create_video_icon(self):
@@ -866,10 +902,12 @@ class BackupCartaoApp(tk.Tk):
         self.tab1 = self.create_config_tab(notebook)
         self.tab2 = self.create_analysis_tab(notebook)
         self.tab3 = self.create_log_tab(notebook)
+        self.tab4 = self.create_catalog_tab(notebook)
 
         notebook.add(self.tab1, text=" 1. Configuração ")
         notebook.add(self.tab2, text=" 2. Análise ")
         notebook.add(self.tab3, text=" 3. Log ")
+        notebook.add(self.tab4, text=" 4. Catálogo ")
 
         return notebook
 
@@ -886,6 +924,8 @@ class BackupCartaoApp(tk.Tk):
             row=0, column=1, sticky="ew", padx=(0, 10), pady=8)
         ModernTheme.create_styled_button(
             tab, "Procurar", self.escolher_cartao).grid(row=0, column=2)
+        ModernTheme.create_styled_button(
+            tab, "➕", self.adicionar_cartao, width=3).grid(row=0, column=3, padx=(5, 0))
 
         # Destination
         ttk.Label(tab, text="Destino (Backup):", font=('Arial', 12, 'bold')).grid(
@@ -904,6 +944,80 @@ class BackupCartaoApp(tk.Tk):
         self.xml_var = tk.BooleanVar(value=True)
         ttk.Checkbutton(options_frame, text="Incluir arquivos de metadados (XMP/XML)",
                         variable=self.xml_var).pack(anchor="w")
+        self.auto_ingest_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Detectar cartões inseridos e analisar automaticamente",
+                        variable=self.auto_ingest_var, command=self.alternar_monitor).pack(anchor="w")
+
+        modo_frame = ttk.Frame(options_frame, style='TFrame')
+        modo_frame.pack(anchor="w", pady=(10, 0))
+        ttk.Label(modo_frame, text="Formato do destino:",
+                  foreground=ModernTheme.FG_SECONDARY).pack(side="left", padx=(0, 10))
+        self.modo_destino_var = tk.StringVar(value=MODOS_DESTINO['pastas'])
+        ttk.Combobox(modo_frame, textvariable=self.modo_destino_var, values=list(MODOS_DESTINO.values()),
+                     state="readonly", width=40).pack(side="left")
+
+        reorganizar_frame = ttk.Frame(options_frame, style='TFrame')
+        reorganizar_frame.pack(anchor="w", pady=(10, 0))
+        ttk.Label(reorganizar_frame, text="Origem no mesmo disco do destino:",
+                  foreground=ModernTheme.FG_SECONDARY).pack(side="left", padx=(0, 10))
+        self.reorganizar_var = tk.StringVar(value=MODOS_REORGANIZACAO['copiar'])
+        ttk.Combobox(reorganizar_frame, textvariable=self.reorganizar_var, values=list(MODOS_REORGANIZACAO.values()),
+                     state="readonly", width=50).pack(side="left")
+
+        cache_frame = ttk.Frame(options_frame, style='TFrame')
+        cache_frame.pack(anchor="w", pady=(10, 0))
+        ttk.Label(cache_frame, text="Cache do sistema durante a cópia:",
+                  foreground=ModernTheme.FG_SECONDARY).pack(side="left", padx=(0, 10))
+        self.cache_var = tk.StringVar(value=MODOS_CACHE['normal'])
+        ttk.Combobox(cache_frame, textvariable=self.cache_var, values=list(MODOS_CACHE.values()),
+                     state="readonly", width=50).pack(side="left")
+
+        ordem_frame = ttk.Frame(options_frame, style='TFrame')
+        ordem_frame.pack(anchor="w", pady=(10, 0))
+        ttk.Label(ordem_frame, text="Ordem da cópia (📌 datas fixadas sempre primeiro):",
+                  foreground=ModernTheme.FG_SECONDARY).pack(side="left", padx=(0, 10))
+        self.ordem_copia_var = tk.StringVar(value=ORDENS_COPIA['cronologica'])
+        ttk.Combobox(ordem_frame, textvariable=self.ordem_copia_var, values=list(ORDENS_COPIA.values()),
+                     state="readonly", width=40).pack(side="left")
+
+        banda_frame = ttk.Frame(options_frame, style='TFrame')
+        banda_frame.pack(anchor="w", pady=(10, 0))
+        ttk.Label(banda_frame, text="Limite de banda (MB/s, 0 = sem limite):",
+                  foreground=ModernTheme.FG_SECONDARY).pack(side="left", padx=(0, 10))
+        self.limite_banda_var = tk.StringVar(value="0")
+        ttk.Entry(banda_frame, textvariable=self.limite_banda_var,
+                  width=8).pack(side="left")
+        self.segundo_plano_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Modo segundo plano (E/S ociosa e CPU reduzida, ideal durante edição)",
+                        variable=self.segundo_plano_var).pack(anchor="w", pady=(10, 0))
+        self.preencher_ilegiveis_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Cartão danificado: manter arquivos com áreas ilegíveis (preenchidas com zeros)",
+                        variable=self.preencher_ilegiveis_var).pack(anchor="w")
+        self.folhas_contato_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Gerar folha de contato (JPEG/PDF) por data após o backup",
+                        variable=self.folhas_contato_var).pack(anchor="w")
+        self.previas_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Extrair prévias JPEG dos RAW para PREVIEWS (em segundo plano)",
+                        variable=self.previas_var).pack(anchor="w")
+        self.catalogo_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Registrar metadados (câmera, lente, data, hash) no catálogo pesquisável",
+                        variable=self.catalogo_var).pack(anchor="w")
+        envio_frame = ttk.Frame(options_frame, style='TFrame')
+        envio_frame.pack(anchor="w")
+        self.envio_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(envio_frame, text="Enviar para a nuvem (URL ou pasta):",
+                        variable=self.envio_var).pack(side="left")
+        self.destino_envio_var = tk.StringVar()
+        ttk.Entry(envio_frame, textvariable=self.destino_envio_var,
+                  width=30).pack(side="left", padx=(5, 10))
+        ttk.Label(envio_frame, text="MB/s durante a cópia:",
+                  foreground=ModernTheme.FG_SECONDARY).pack(side="left")
+        self.limite_envio_var = tk.StringVar(value="5")
+        ttk.Entry(envio_frame, textvariable=self.limite_envio_var,
+                  width=6).pack(side="left", padx=(5, 0))
+        self.metricas_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Publicar status e métricas em http://%s:%d (JSON e Prometheus)" % endereco_metricas(),
+                        variable=self.metricas_var, command=self.alternar_metricas).pack(anchor="w", pady=(10, 0))
 
         # Action Buttons
         action_frame = ttk.Frame(tab)
@@ -917,6 +1031,10 @@ class BackupCartaoApp(tk.Tk):
         self.backup_btn.pack(side="left", padx=10)
         self.backup_btn.config(state="disabled")
 
+        self.verificar_btn = ModernTheme.create_styled_button(
+            action_frame, "Verificar Backup", self.verificar_backup, "Modern.TButton", width=20)
+        self.verificar_btn.pack(side="left", padx=10)
+
         return tab
 
     def create_analysis_tab(self, parent_notebook):
@@ -932,13 +1050,115 @@ class BackupCartaoApp(tk.Tk):
 
     def create_log_tab(self, parent_notebook):
         tab = ttk.Frame(parent_notebook, style='TFrame', padding=20)
-        tab.rowconfigure(0, weight=1)
+        tab.rowconfigure(2, weight=1)
         tab.columnconfigure(0, weight=1)
         self.resumo_text = scrolledtext.ScrolledText(
-            tab, wrap=tk.WORD, bg=ModernTheme.BG_TERTIARY, fg=ModernTheme.FG_PRIMARY, font=('Consolas', 10), relief=tk.FLAT, bd=0)
+            tab, wrap=tk.WORD, height=8, bg=ModernTheme.BG_TERTIARY, fg=ModernTheme.FG_PRIMARY, font=('Consolas', 10), relief=tk.FLAT, bd=0)
         self.resumo_text.grid(row=0, column=0, sticky="nsew")
         self.resumo_text.insert("1.0", "Aguardando operações...")
         self.resumo_text.config(state="disabled")
+
+        # Diário do backup: paginado e filtrado, lido do .jsonl sob demanda
+        filtros = ttk.Frame(tab, style='TFrame')
+        filtros.grid(row=1, column=0, sticky="ew", pady=(10, 5))
+        self.filtro_nivel_var = tk.StringVar(value="Todos")
+        self.filtro_data_var = tk.StringVar()
+        self.filtro_tipo_var = tk.StringVar(value="Todos")
+        self.filtro_texto_var = tk.StringVar()
+        ttk.Label(filtros, text="Mostrar:").pack(side="left")
+        ttk.Combobox(filtros, textvariable=self.filtro_nivel_var, values=list(FILTROS_NIVEL),
+                     state="readonly", width=14).pack(side="left", padx=(5, 10))
+        ttk.Label(filtros, text="Data:").pack(side="left")
+        ttk.Entry(filtros, textvariable=self.filtro_data_var,
+                  width=11).pack(side="left", padx=(5, 10))
+        ttk.Label(filtros, text="Tipo:").pack(side="left")
+        ttk.Combobox(filtros, textvariable=self.filtro_tipo_var,
+                     values=["Todos"] + list(PASTAS_CATEGORIA.values()) + ["OUTROS"],
+                     state="readonly", width=10).pack(side="left", padx=(5, 10))
+        busca = ttk.Entry(filtros, textvariable=self.filtro_texto_var, width=14)
+        busca.pack(side="left", padx=(0, 5))
+        busca.bind("<Return>", lambda e: self.mostrar_pagina_diario(0))
+        ModernTheme.create_styled_button(
+            filtros, "🔎 Filtrar", lambda: self.mostrar_pagina_diario(0)).pack(side="left")
+        ModernTheme.create_styled_button(
+            filtros, "📂 Abrir...", self.abrir_diario).pack(side="left", padx=5)
+        self.diario_proxima_btn = ModernTheme.create_styled_button(
+            filtros, "▶", lambda: self.mostrar_pagina_diario(self.pagina_diario + 1), width=3)
+        self.diario_proxima_btn.pack(side="right")
+        self.pagina_diario_label = ttk.Label(filtros, text="")
+        self.pagina_diario_label.pack(side="right", padx=5)
+        self.diario_anterior_btn = ModernTheme.create_styled_button(
+            filtros, "◀", lambda: self.mostrar_pagina_diario(self.pagina_diario - 1), width=3)
+        self.diario_anterior_btn.pack(side="right")
+
+        tabela = ttk.Frame(tab, style='TFrame')
+        tabela.grid(row=2, column=0, sticky="nsew")
+        tabela.rowconfigure(0, weight=1)
+        tabela.columnconfigure(0, weight=1)
+        colunas = {'hora': ("Hora", 70), 'data': ("Data", 90), 'tipo': ("Tipo", 80),
+                   'arquivo': ("Arquivo", 160), 'destino': ("Destino", 160), 'status': ("Status", 260)}
+        self.diario_tree = ttk.Treeview(
+            tabela, columns=list(colunas), show="headings")
+        for coluna, (titulo, largura) in colunas.items():
+            self.diario_tree.heading(coluna, text=titulo)
+            self.diario_tree.column(coluna, width=largura,
+                                    stretch=(coluna == 'status'))
+        self.diario_tree.tag_configure('erro', foreground=ModernTheme.ERROR)
+        self.diario_tree.tag_configure('aviso', foreground=ModernTheme.WARNING)
+        self.diario_tree.tag_configure(
+            'ignorado', foreground=ModernTheme.FG_SECONDARY)
+        rolagem = ttk.Scrollbar(
+            tabela, orient="vertical", command=self.diario_tree.yview)
+        self.diario_tree.configure(yscrollcommand=rolagem.set)
+        self.diario_tree.grid(row=0, column=0, sticky="nsew")
+        rolagem.grid(row=0, column=1, sticky="ns")
+        self._limpar_diario()
+        return tab
+
+    def create_catalog_tab(self, parent_notebook):
+        tab = ttk.Frame(parent_notebook, style='TFrame', padding=20)
+        tab.rowconfigure(1, weight=1)
+        tab.columnconfigure(0, weight=1)
+
+        filtros = ttk.Frame(tab, style='TFrame')
+        filtros.grid(row=0, column=0, sticky="ew", pady=(0, 5))
+        self.busca_camera_var = tk.StringVar()
+        self.busca_lente_var = tk.StringVar()
+        self.busca_de_var = tk.StringVar()
+        self.busca_ate_var = tk.StringVar()
+        self.busca_texto_var = tk.StringVar()
+        for rotulo, variavel, largura in (("Câmera:", self.busca_camera_var, 14), ("Lente:", self.busca_lente_var, 14),
+                                          ("De:", self.busca_de_var, 11), ("Até:", self.busca_ate_var, 11),
+                                          ("Nome:", self.busca_texto_var, 12)):
+            ttk.Label(filtros, text=rotulo).pack(side="left")
+            campo = ttk.Entry(filtros, textvariable=variavel, width=largura)
+            campo.pack(side="left", padx=(5, 10))
+            campo.bind("<Return>", lambda e: self.buscar_catalogo())
+        ModernTheme.create_styled_button(
+            filtros, "🔎 Buscar", self.buscar_catalogo).pack(side="left")
+        self.catalogo_label = ttk.Label(
+            filtros, text="", foreground=ModernTheme.FG_SECONDARY)
+        self.catalogo_label.pack(side="right")
+
+        tabela = ttk.Frame(tab, style='TFrame')
+        tabela.grid(row=1, column=0, sticky="nsew")
+        tabela.rowconfigure(0, weight=1)
+        tabela.columnconfigure(0, weight=1)
+        colunas = {'captura': ("Captura", 130), 'camera': ("Câmera", 130), 'lente': ("Lente", 150),
+                   'iso': ("ISO", 50), 'arquivo': ("Arquivo", 140), 'destino': ("Destino", 260)}
+        self.catalogo_tree = ttk.Treeview(
+            tabela, columns=list(colunas), show="headings")
+        for coluna, (titulo, largura) in colunas.items():
+            self.catalogo_tree.heading(coluna, text=titulo)
+            self.catalogo_tree.column(coluna, width=largura,
+                                      stretch=(coluna == 'destino'))
+        rolagem = ttk.Scrollbar(
+            tabela, orient="vertical", command=self.catalogo_tree.yview)
+        self.catalogo_tree.configure(yscrollcommand=rolagem.set)
+        self.catalogo_tree.grid(row=0, column=0, sticky="nsew")
+        rolagem.grid(row=0, column=1, sticky="ns")
+        # Duplo clique abre a pasta onde a cópia está (ou o .tar que a contém)
+        self.catalogo_tree.bind("<Double-1>", self._abrir_item_catalogo)
         return tab
 
     def create_footer(self, parent):
@@ -956,13 +1176,56 @@ class BackupCartaoApp(tk.Tk):
         for tipo, conteudo in self.msg_queue.get_all():
             if tipo == 'log':
                 self.adicionar_log(conteudo)
+            elif tipo == 'diario':
+                self.abrir_diario(conteudo)
             elif tipo == 'fim_backup':
+                if self.leitor_diario is not None:
+                    self.mostrar_pagina_diario(self.pagina_diario)
                 self.backup_em_andamento = False
                 self.backup_btn.config(
                     state="normal" if self.datas_info else "disabled")
                 self.analise_btn.config(state="normal")
+            elif tipo == 'cartao_detectado':
+                self._cartao_detectado(*conteudo)
         self.after(100, self.processar_mensagens)
 
+    def alternar_metricas(self):
+        if self.metricas_var.get():
+            if self.servidor_metricas is None:
+                try:
+                    self.servidor_metricas = ServidorMetricas(
+                        self.metricas, *endereco_metricas())
+                except OSError as e:
+                    self.metricas_var.set(False)
+                    self.adicionar_log(
+                        f"❌ Não foi possível abrir o endpoint de métricas: {e}")
+                    return
+                self.servidor_metricas.start()
+                self.adicionar_log(
+                    f"📡 Status em {self.servidor_metricas.endereco}/status e métricas em {self.servidor_metricas.endereco}/metrics")
+        elif self.servidor_metricas is not None:
+            self.servidor_metricas.parar()
+            self.servidor_metricas = None
+
+    def alternar_monitor(self):
+        if self.auto_ingest_var.get():
+            if self.monitor_cartoes is None:
+                self.monitor_cartoes = MonitorCartoes(
+                    lambda ponto, layout: self.msg_queue.put(('cartao_detectado', (ponto, layout))))
+                self.monitor_cartoes.start()
+        elif self.monitor_cartoes is not None:
+            self.monitor_cartoes.parar()
+            self.monitor_cartoes = None
+
+    def _cartao_detectado(self, ponto, layout):
+        if self.backup_em_andamento or str(self.analise_btn['state']) == 'disabled':
+            self.adicionar_log(
+                f"💳 Cartão detectado em {ponto} ({layout}), mas há uma operação em andamento.")
+            return
+        self.adicionar_log(f"💳 Cartão detectado: {ponto} ({layout}). Iniciando análise...")
+        self.cartao_var.set(ponto)
+        self.analisar_cartao()
+
     def escolher_cartao(self):
         if self.backup_em_andamento:
             return
@@ -970,6 +1233,17 @@ class BackupCartaoApp(tk.Tk):
         if pasta:
             self.cartao_var.set(pasta)
 
+    def adicionar_cartao(self):
+        # Analisa mais de um cartão junto (ex.: gravação simultânea nos dois slots)
+        if self.backup_em_andamento:
+            return
+        pasta = filedialog.askdirectory(
+            title="Selecione outro cartão para analisar junto")
+        if pasta:
+            atuais = caminhos_origem(self.cartao_var.get())
+            if pasta not in atuais:
+                self.cartao_var.set(os.pathsep.join(atuais + [pasta]))
+
     def escolher_destino(self):
         if self.backup_em_andamento:
             return
@@ -985,15 +1259,128 @@ class BackupCartaoApp(tk.Tk):
         if "RESUMO DO BACKUP" in mensagem:
             self.resumo_text.delete("1.0", tk.END)
         self.resumo_text.insert(tk.END, mensagem + "\n\n")
+        # O detalhe por arquivo fica no diário; aqui só as últimas mensagens
+        excesso = int(self.resumo_text.index("end-1c").split(".")[0]) - MAX_LINHAS_LOG
+        if excesso > 0:
+            self.resumo_text.delete("1.0", f"{excesso + 1}.0")
         self.resumo_text.see(tk.END)
         self.resumo_text.config(state="disabled")
         self.notebook.select(self.tab3)
 
+    def abrir_diario(self, caminho=None):
+        if caminho is None:
+            caminho = filedialog.askopenfilename(
+                title="Abrir diário de backup", filetypes=[("Diário de backup", "*.jsonl"), ("Todos os arquivos", "*.*")])
+            if not caminho:
+                return
+        self.leitor_diario = LeitorDiario(caminho)
+        self.mostrar_pagina_diario(0)
+
+    def _filtro_diario(self):
+        filtro = {}
+        niveis = FILTROS_NIVEL.get(self.filtro_nivel_var.get())
+        if niveis:
+            filtro['niveis'] = list(niveis)
+        data = self.filtro_data_var.get().strip()
+        if data:
+            for formato in ('%d/%m/%Y', '%Y-%m-%d'):
+                try:
+                    filtro['data'] = datetime.strptime(
+                        data, formato).strftime('%Y-%m-%d')
+                    break
+                except ValueError:
+                    continue
+            else:
+                messagebox.showerror(
+                    "Data inválida", "Use o formato dd/mm/aaaa para filtrar por data.")
+                return None
+        if self.filtro_tipo_var.get() != "Todos":
+            filtro['tipo'] = self.filtro_tipo_var.get()
+        if self.filtro_texto_var.get().strip():
+            filtro['texto'] = self.filtro_texto_var.get().strip()
+        return filtro
+
+    def mostrar_pagina_diario(self, numero):
+        if self.leitor_diario is None:
+            return
+        filtro = self._filtro_diario()
+        if filtro is None:
+            return
+        try:
+            numero, registros, ha_mais = self.leitor_diario.pagina(
+                max(0, numero), filtro)
+        except OSError as e:
+            self.adicionar_log(f"❌ Não foi possível ler o diário: {e}")
+            return
+
+        self.pagina_diario = numero
+        self.diario_tree.delete(*self.diario_tree.get_children())
+        for registro in registros:
+            data = formatar_data_br(registro['data']) if registro.get('data') else ""
+            if registro['evento'] == 'arquivo':
+                valores = (registro['hora'], data, registro['tipo'], os.path.basename(registro['origem']),
+                           registro['destino'], registro['status'])
+            else:
+                valores = (registro['hora'], data, "", "", "", registro['texto'])
+            self.diario_tree.insert("", tk.END, values=valores,
+                                    tags=(registro.get('nivel', 'ok'),))
+        self.pagina_diario_label.config(
+            text=f"Página {numero + 1}{'' if ha_mais else ' (fim)'}")
+        self.diario_anterior_btn.config(
+            state="normal" if numero > 0 else "disabled")
+        self.diario_proxima_btn.config(
+            state="normal" if ha_mais else "disabled")
+
+    def _limpar_diario(self):
+        self.leitor_diario = None
+        self.pagina_diario = 0
+        self.diario_tree.delete(*self.diario_tree.get_children())
+        self.pagina_diario_label.config(text="Nenhum diário aberto")
+        self.diario_anterior_btn.config(state="disabled")
+        self.diario_proxima_btn.config(state="disabled")
+
+    def buscar_catalogo(self):
+        try:
+            de = ler_data_usuario(self.busca_de_var.get()) if self.busca_de_var.get().strip() else None
+            ate = ler_data_usuario(self.busca_ate_var.get()) if self.busca_ate_var.get().strip() else None
+        except ValueError as e:
+            messagebox.showerror("Data inválida", f"{e}\nUse dd/mm/aaaa.")
+            return
+        if not os.path.exists(ARQUIVO_CATALOGO):
+            self.catalogo_label.config(text="Catálogo vazio: ative a opção na Configuração")
+            return
+        try:
+            catalogo = CatalogoMetadados()
+            try:
+                resultados = catalogo.buscar(camera=self.busca_camera_var.get().strip(),
+                                             lente=self.busca_lente_var.get().strip(), de=de, ate=ate,
+                                             texto=self.busca_texto_var.get().strip())
+            finally:
+                catalogo.fechar()
+        except sqlite3.Error as e:
+            messagebox.showerror("Erro", f"Não foi possível ler o catálogo:\n{e}")
+            return
+
+        self.catalogo_tree.delete(*self.catalogo_tree.get_children())
+        for r in resultados:
+            captura = (r['captura'] or '').replace('T', ' ')
+            self.catalogo_tree.insert("", tk.END, values=(
+                captura, r['camera'] or '', r['lente'] or '', r['iso'] or '', r['nome_original'], r['destino']))
+        self.catalogo_label.config(text=f"{len(resultados)} arquivo(s)")
+
+    def _abrir_item_catalogo(self, evento):
+        item = self.catalogo_tree.identify_row(evento.y)
+        if not item:
+            return
+        # Membros de .tar ficam registrados como "arquivo.tar::membro"
+        abrir_pasta(os.path.dirname(
+            self.catalogo_tree.item(item, 'values')[5].split('::')[0]))
+
     def analisar_cartao(self):
         if self.backup_em_andamento:
             return
-        caminho = self.cartao_var.get()
-        if not os.path.isdir(caminho):
+        caminhos = caminhos_origem(self.cartao_var.get())
+        if not caminhos or not all(os.path.isdir(c) for c in caminhos):
             messagebox.showerror(
                 "Erro", "Selecione um diretório de origem válido!")
             return
@@ -1010,27 +1397,19 @@ class BackupCartaoApp(tk.Tk):
         self.analise_btn.config(state="disabled")
 
         threading.Thread(target=self._run_analysis_in_thread, args=(
-            caminho, self.xml_var.get()), daemon=True).start()
+            caminhos, self.xml_var.get(), self.catalogo_var.get()), daemon=True).start()
 
-    def _run_analysis_in_thread(self, caminho, incluir_xml):
+    def _run_analysis_in_thread(self, caminhos, incluir_xml, ler_catalogo=False):
         try:
-            fotos, videos, xmls = listar_arquivos(caminho, incluir_xml)
-            all_files = fotos + videos + xmls
-
-            arquivos_por_data = defaultdict(
-                lambda: {'arquivos': [], 'tipos': defaultdict(list)})
-            for arquivo in all_files:
-                data = extrair_data_arquivo(arquivo)
-                arquivos_por_data[data]['arquivos'].append(arquivo)
-                arquivos_por_data[data]['tipos'][tipo_arquivo(
-                    arquivo)].append(arquivo)
+            analise = asyncio.run(scan(caminhos, incluir_xml, ler_catalogo))
+            self.tamanhos = analise['tamanhos']
+            self.metadados = analise['metadados']
+            self.duplicatas = analise['duplicatas']
 
             self.datas_info = {}
-            for data, info in arquivos_por_data.items():
-                fotos_data = sorted(info['tipos'].get(
-                    'FOTOS', []), key=os.path.getmtime)
-                videos_data = sorted(info['tipos'].get(
-                    'VIDEOS', []), key=os.path.getmtime)
+            for data, info in analise['datas'].items():
+                fotos_data = info['tipos'].get('FOTOS', [])
+                videos_data = info['tipos'].get('VIDEOS', [])
 
                 previews = []
                 if fotos_data:
@@ -1041,13 +1420,13 @@ class BackupCartaoApp(tk.Tk):
                 elif videos_data:  # If no photos, show video placeholder
                     previews.append((videos_data[0], 'video'))
 
-                self.datas_info[data] = {'arquivos': info['arquivos'], 'tamanho': tamanho_total_arquivos(
-                    info['arquivos']), 'previews': previews, 'tipos': info['tipos']}
+                self.datas_info[data] = dict(info, previews=previews)
 
-            self.after(0, self._update_analysis_ui, fotos, videos, xmls)
+            self.after(0, self._update_analysis_ui,
+                       analise['fotos'], analise['videos'], analise['xmls'])
         except Exception as e:
-            self.after(0, lambda: messagebox.showerror(
-                "Erro na Análise", f"Erro ao analisar o cartão:\n{e}"))
+            self.after(0, lambda erro=e: messagebox.showerror(
+                "Erro na Análise", f"Erro ao analisar o cartão:\n{erro}"))
             self.after(0, lambda: self.analise_btn.config(state="normal"))
 
     def _update_analysis_ui(self, fotos, videos, xmls):
@@ -1055,19 +1434,43 @@ class BackupCartaoApp(tk.Tk):
         self.analise_text.delete("1.0", tk.END)
 
         total_arquivos = len(fotos) + len(videos) + len(xmls)
-        total_tamanho = tamanho_total_arquivos(fotos + videos + xmls)
+        total_tamanho = tamanho_total_arquivos(fotos + videos + xmls, self.tamanhos)
 
         analise = f"📊 ANÁLISE DO CARTÃO\n{'='*50}\n\n"
         analise += f"📁 Arquivos Encontrados: {total_arquivos}\n"
         analise += f"💾 Tamanho Total: {formatar_tamanho(total_tamanho)}\n\n"
-        analise += f"📷 Fotos: {len(fotos)} ({formatar_tamanho(tamanho_total_arquivos(fotos))})\n"
-        analise += f"🎥 Vídeos: {len(videos)} ({formatar_tamanho(tamanho_total_arquivos(videos))})\n"
-        analise += f"📄 Metadados: {len(xmls)} ({formatar_tamanho(tamanho_total_arquivos(xmls))})\n\n"
+        analise += f"📷 Fotos: {len(fotos)} ({formatar_tamanho(tamanho_total_arquivos(fotos, self.tamanhos))})\n"
+        analise += f"🎥 Vídeos: {len(videos)} ({formatar_tamanho(tamanho_total_arquivos(videos, self.tamanhos))})\n"
+        analise += f"📄 Metadados: {len(xmls)} ({formatar_tamanho(tamanho_total_arquivos(xmls, self.tamanhos))})\n\n"
+        if self.duplicatas:
+            redundantes = [a for grupo in self.duplicatas for a in grupo[1:]]
+            analise += (f"♊ Duplicatas prováveis: {len(self.duplicatas)} grupos, {len(redundantes)} cópias redundantes "
+                        f"({formatar_tamanho(tamanho_total_arquivos(redundantes, self.tamanhos))})\n")
+            for grupo in self.duplicatas[:10]:
+                analise += f"   • {os.path.basename(grupo[0])} = " + \
+                    ", ".join(os.path.basename(a) for a in grupo[1:]) + "\n"
+            if len(self.duplicatas) > 10:
+                analise += f"   ... e mais {len(self.duplicatas) - 10} grupos\n"
+            analise += "\n"
+        classificacoes = [c for info in self.datas_info.values()
+                          for c in info.get('classificacoes', {}).values()]
+        if classificacoes:
+            notas = defaultdict(int)
+            for c in classificacoes:
+                if c['nota'] and c['nota'] > 0:
+                    notas[c['nota']] += 1
+            analise += (f"⭐ Classificação XMP: {len(classificacoes)} fotos ("
+                        + ", ".join(f"{'★' * n}: {notas[n]}" for n in sorted(notas, reverse=True))
+                        + f"{', ' if notas else ''}rejeitadas: {sum(c['rejeitada'] for c in classificacoes)}, "
+                        f"escolhidas: {sum(c['escolhida'] for c in classificacoes)})\n\n")
         analise += f"📅 Detalhes por Data ({len(self.datas_info)} dias):\n{'-'*40}\n"
 
         for data in sorted(self.datas_info.keys()):
             info = self.datas_info[data]
-            analise += f"• {formatar_data_br(data)}: {len(info['arquivos'])} arquivos ({formatar_tamanho(info['tamanho'])})\n"
+            analise += f"• {formatar_data_br(data)}: {len(info['arquivos'])} arquivos ({formatar_tamanho(info['tamanho'])})"
+            if info.get('duplicatas'):
+                analise += f" - {len(info['duplicatas'])} duplicatas"
+            analise += "\n"
 
         self.analise_text.insert("1.0", analise)
         self.analise_text.config(state="disabled")
@@ -1088,26 +1491,164 @@ class BackupCartaoApp(tk.Tk):
             messagebox.showwarning("Atenção", "Analise o cartão primeiro!")
             return
 
+        # Reorganizando no mesmo disco não há bytes novos: sem checagem de espaço nem sondagem
+        opcoes = self.opcoes_backup()
+        reorganizar = opcoes['reorganizar']
+        no_lugar = self._reorganiza_no_lugar(reorganizar, [self.destino_var.get()])
         total_necessario = sum(info['tamanho']
                                for info in self.datas_info.values())
         _, espaco_livre = checar_espaco(self.destino_var.get())
-        if espaco_livre < total_necessario * 1.05:
+        if not no_lugar and espaco_livre < total_necessario * 1.05:
             if not messagebox.askyesno("Espaço Insuficiente", f"Espaço necessário: {formatar_tamanho(total_necessario)}\nEspaço livre: {formatar_tamanho(espaco_livre)}\n\nDeseja continuar mesmo assim?"):
                 return
 
         popup = PopupSelecaoDatas(
-            self, self.datas_info, self.destino_var.get(), self.video_icon)
+            self, self.datas_info, self.destino_var.get(), self.video_icon, self.duplicatas)
         self.wait_window(popup)
 
         if popup.result:
+            # Bloqueia novas ações enquanto mede o cartão e os destinos
             self.backup_em_andamento = True
             self.backup_btn.config(state="disabled")
             self.analise_btn.config(state="disabled")
-            self.adicionar_log("🚀 Backup iniciado...")
+            sondagem = {}
+            # As pastas de cada data podem ter sido trocadas na seleção
+            no_lugar = self._reorganiza_no_lugar(
+                reorganizar, [dados['pasta'] for dados in popup.result.values()])
+            if no_lugar:
+                self.adicionar_log(
+                    f"♻️ Origem e destino no mesmo disco: {MODOS_REORGANIZACAO[reorganizar]}")
+                tarefa = threading.Thread(target=lambda: None, daemon=True)
+            else:
+                self.adicionar_log("⏱️ Medindo a velocidade do cartão e do destino...")
+                tarefa = threading.Thread(target=lambda: sondagem.update(
+                    sondar_velocidades(popup.result, self.tamanhos)), daemon=True)
+            tarefa.start()
+            self._aguardar_sondagem(tarefa, sondagem, popup.result, opcoes)
+
+    def _reorganiza_no_lugar(self, reorganizar, destinos):
+        """Verdadeiro se nenhum arquivo será copiado: o método escolhido funciona entre
+        cada origem (testado com um arquivo dela) e cada destino."""
+        if reorganizar == 'copiar':
+            return False
+        arquivos = [a for info in self.datas_info.values() for a in info['arquivos']]
+        amostras = [next((a for a in arquivos if a.startswith(os.path.join(c, ''))), None)
+                    for c in caminhos_origem(self.cartao_var.get())]
+        return all(amostra is not None and reorganizacao_disponivel(amostra, destino, reorganizar)
+                   for amostra in amostras for destino in destinos)
+
+    def _aguardar_sondagem(self, tarefa, sondagem, mapa_datas, opcoes):
+        if tarefa.is_alive():
+            self.after(100, self._aguardar_sondagem,
+                       tarefa, sondagem, mapa_datas, opcoes)
+            return
+        arquivos = [a for dados in mapa_datas.values() for a in dados['arquivos']]
+        linhas = [f"{len(arquivos)} arquivos, {formatar_tamanho(tamanho_total_arquivos(arquivos, self.tamanhos))}"]
+        if sondagem.get('leitura'):
+            linhas.append(
+                f"Leitura do cartão: {formatar_tamanho(sondagem['leitura'])}/s")
+        for medida in {id(m): m for m in sondagem.get('destinos', {}).values()}.values():
+            if medida.get('escrita'):
+                linhas.append(f"Gravação em {medida['pasta']}: {formatar_tamanho(medida['escrita'])}/s "
+                              f"(+{medida['custo_arquivo'] * 1000:.0f} ms por arquivo)")
+        duracao = estimar_duracao(
+            mapa_datas, sondagem, self.tamanhos, opcoes['limitador'].taxa) if sondagem else None
+        if duracao is not None:
+            linhas.append(f"\n⏱️ Tempo estimado: {formatar_duracao(duracao)}")
+        avisos = avisos_sondagem(sondagem) if sondagem else []
+        if opcoes['reorganizar'] == 'mover':
+            avisos.append("⚠️ Modo MOVER: os arquivos serão retirados da origem. "
+                          "Fora do mesmo disco eles são copiados e a origem é mantida.")
+        self.adicionar_log("\n".join(["⏱️ SONDAGEM DE VELOCIDADE"] + linhas + avisos))
+
+        if not messagebox.askyesno("Confirmar Backup", "\n".join(linhas + avisos) + "\n\nIniciar o backup?",
+                                   icon='warning' if avisos else 'question'):
+            self.backup_em_andamento = False
+            self.backup_btn.config(state="normal")
+            self.analise_btn.config(state="normal")
+            self.adicionar_log("Backup cancelado.")
+            return
+
+        self.adicionar_log("🚀 Backup iniciado...")
+        popup_progresso = PopupProgresso(self)
+        popup_progresso.adicionar_controle_banda(opcoes['limitador'])
+        popup_progresso.adicionar_cancelamento()
+        threading.Thread(target=copiar_arquivos, args=(
+            self, mapa_datas, popup_progresso, opcoes), daemon=True).start()
+
+    def modo_reorganizacao(self):
+        return next((chave for chave, texto in MODOS_REORGANIZACAO.items()
+                     if texto == self.reorganizar_var.get()), 'copiar')
+
+    def opcoes_backup(self):
+        modo = next((chave for chave, texto in MODOS_DESTINO.items()
+                     if texto == self.modo_destino_var.get()), 'pastas')
+        if modo == 'tar_zstd' and not ZSTD_AVAILABLE:
+            self.adicionar_log(
+                "⚠️ Módulo 'zstandard' não instalado: metadados serão gravados sem compressão.")
+        try:
+            limite = max(0, float(self.limite_banda_var.get().replace(',', '.')))
+        except ValueError:
+            limite = 0
+        ordem = next((chave for chave, texto in ORDENS_COPIA.items()
+                      if texto == self.ordem_copia_var.get()), 'cronologica')
+        reorganizar = self.modo_reorganizacao()
+        if reorganizar != 'copiar' and modo != 'pastas':
+            self.adicionar_log(
+                "⚠️ Reorganização só se aplica a pastas soltas: o contêiner TAR será gravado copiando os arquivos.")
+            reorganizar = 'copiar'
+        cache = next((chave for chave, texto in MODOS_CACHE.items()
+                      if texto == self.cache_var.get()), 'normal')
+        envio, limite_envio = None, 0
+        if self.envio_var.get():
+            if self.destino_envio_var.get().strip():
+                envio = backend_envio(self.destino_envio_var.get().strip())
+            else:
+                self.adicionar_log("⚠️ Envio para a nuvem ligado sem destino: etapa ignorada.")
+            try:
+                limite_envio = int(max(0, float(self.limite_envio_var.get().replace(',', '.'))) * MB)
+            except ValueError:
+                limite_envio = 0
+        return {'modo_destino': modo, 'ordem': ordem, 'reorganizar': reorganizar, 'cache': cache, 'limitador': LimitadorBanda(int(limite * MB)),
+                'segundo_plano': self.segundo_plano_var.get(),
+                'preencher_ilegiveis': self.preencher_ilegiveis_var.get(),
+                'folhas_contato': self.folhas_contato_var.get(),
+                'previas': self.previas_var.get(), 'metricas': self.metricas,
+                'catalogo': self.catalogo_var.get(), 'metadados': self.metadados,
+                'envio': envio, 'limite_envio': limite_envio}
+
+    def verificar_backup(self):
+        if self.backup_em_andamento:
+            return
+        origem, destino = self.cartao_var.get(), self.destino_var.get()
+        if not os.path.isdir(destino):
+            messagebox.showerror(
+                "Erro", "Selecione a pasta de Destino com o backup a verificar.")
+            return
+        if not origem or not all(os.path.isdir(c) for c in caminhos_origem(origem)):
+            if not tem_lista_mhl(destino):
+                messagebox.showerror(
+                    "Erro", "Selecione o cartão de origem ou um destino que contenha uma lista ASC MHL.")
+                return
+            origem = None
+
+        completo = messagebox.askyesnocancel("Modo de Verificação",
+                                             "Verificação completa?\n\n"
+                                             "Sim: hash de todos os bytes e exportação da lista ASC MHL.\n"
+                                             "Não: verificação rápida (tamanho + amostras do início, meio e fim).")
+        if completo is None:
+            return
+
+        self.backup_em_andamento = True
+        self.backup_btn.config(state="disabled")
+        self.analise_btn.config(state="disabled")
+        self.adicionar_log("🔍 Verificação iniciada...")
 
-            popup_progresso = PopupProgresso(self)
-            threading.Thread(target=copiar_arquivos, args=(
-                self, popup.result, popup_progresso), daemon=True).start()
+        popup_progresso = PopupProgresso(self, titulo="🔍 Verificando Backup...", titulo_janela="Verificação do Backup",
+                                         titulo_concluido="✅ Backup Verificado!", titulo_erro="❌ Divergências Encontradas")
+        threading.Thread(target=verificar_backup, args=(self, popup_progresso, origem, destino,
+                                                        'completo' if completo else 'rapido', self.xml_var.get(),
+                                                        self.segundo_plano_var.get()), daemon=True).start()
 
     def novo_cartao(self):
         if self.backup_em_andamento:
@@ -1117,15 +1658,27 @@ class BackupCartaoApp(tk.Tk):
         self.cartao_var.set("")
         self.destino_var.set("")
         self.xml_var.set(True)
+        self.duplicatas = []
+        self.tamanhos = {}
+        self.metadados = {}
+        self.modo_destino_var.set(MODOS_DESTINO['pastas'])
+        self.reorganizar_var.set(MODOS_REORGANIZACAO['copiar'])
+        self.cache_var.set(MODOS_CACHE['normal'])
+        self.ordem_copia_var.set(ORDENS_COPIA['cronologica'])
+        self.limite_banda_var.set("0")
+        self.segundo_plano_var.set(False)
+        self.preencher_ilegiveis_var.set(False)
+        self.folhas_contato_var.set(False)
+        self.previas_var.set(False)
         self.datas_info = {}
         self.backup_btn.config(state="disabled")
 
-        for tab, text in [(self.tab2, "Aguardando análise..."), (self.tab3, "Aguardando operações...")]:
-            widget = tab.winfo_children()[0]
+        for widget, text in [(self.analise_text, "Aguardando análise..."), (self.resumo_text, "Aguardando operações...")]:
             widget.config(state="normal")
             widget.delete("1.0", tk.END)
             widget.insert("1.0", text)
             widget.config(state="disabled")
+        self._limpar_diario()
 
         self.notebook.select(self.tab1)
         messagebox.showinfo(
@@ -1134,10 +1687,75 @@ class BackupCartaoApp(tk.Tk):
     def sair_aplicacao(self):
         if self.backup_em_andamento and not messagebox.askyesno("Backup em Andamento", "Um backup está em andamento. Deseja realmente sair?"):
             return
+        if self.monitor_cartoes is not None:
+            self.monitor_cartoes.parar()
+        if self.servidor_metricas is not None:
+            self.servidor_metricas.parar()
         self.quit()
 
 
 # --------------------------- MAIN ---------------------------
+def main_cli(argv):
+    """Linha de comando sem interface gráfica: `buscar` consulta o catálogo de metadados e
+    `servidor-envio` sobe o destino HTTP de teste do envio para a nuvem."""
+    parser = argparse.ArgumentParser(
+        prog="backup_cartao", description="Backup Cartão Pro - consultas sem interface gráfica")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    buscar = comandos.add_parser(
+        "buscar", help="Busca no catálogo de todos os backups já feitos")
+    buscar.add_argument("--camera", help="trecho do modelo da câmera")
+    buscar.add_argument("--lente", help="trecho do nome da lente")
+    buscar.add_argument("--de", help="data inicial de captura (dd/mm/aaaa)")
+    buscar.add_argument("--ate", help="data final de captura (dd/mm/aaaa)")
+    buscar.add_argument("--texto", help="trecho do nome ou do caminho")
+    buscar.add_argument(
+        "--tipo", choices=list(PASTAS_CATEGORIA.values()) + ["OUTROS"])
+    buscar.add_argument("--limite", type=int, default=1000)
+    buscar.add_argument("--json", action="store_true",
+                        help="uma linha JSON por arquivo")
+    buscar.add_argument("--catalogo", default=ARQUIVO_CATALOGO)
+    servidor = comandos.add_parser(
+        "servidor-envio", help="Servidor HTTP local que recebe envios em uma pasta (para testes)")
+    servidor.add_argument("pasta")
+    servidor.add_argument("--host", default="127.0.0.1")
+    servidor.add_argument("--porta", type=int, default=PORTA_ENVIO_PADRAO)
+    args = parser.parse_args(argv)
+
+    if args.comando == "servidor-envio":
+        os.makedirs(args.pasta, exist_ok=True)
+        servidor = ServidorEnvioLocal(args.pasta, args.host, args.porta)
+        servidor.start()
+        print(f"Recebendo envios em {servidor.endereco} -> {os.path.abspath(args.pasta)} (Ctrl+C encerra)")
+        try:
+            servidor.join()
+        except KeyboardInterrupt:
+            servidor.parar()
+        return 0
+
+    try:
+        de = ler_data_usuario(args.de) if args.de else None
+        ate = ler_data_usuario(args.ate) if args.ate else None
+    except ValueError as e:
+        parser.error(str(e))
+    if not os.path.exists(args.catalogo):
+        print(f"Catálogo não encontrado: {args.catalogo}", file=sys.stderr)
+        return 1
+    catalogo = CatalogoMetadados(args.catalogo)
+    try:
+        resultados = catalogo.buscar(camera=args.camera, lente=args.lente, de=de, ate=ate,
+                                     texto=args.texto, tipo=args.tipo, limite=args.limite)
+    finally:
+        catalogo.fechar()
+    for r in resultados:
+        if args.json:
+            print(json.dumps(r, ensure_ascii=False))
+        else:
+            print("\t".join(str(r[c] or '') for c in ('captura', 'camera', 'lente', 'destino')))
+    return 0
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(main_cli(sys.argv[1:]))
     app = BackupCartaoApp()
     app.mainloop()
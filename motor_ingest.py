@@ -0,0 +1,4103 @@
+"""Motor de ingestão do Backup Cartão Pro: varredura, cópia, verificação, catálogo e envio.
+
+Não depende de interface gráfica. `scan`, `plan` e `ingest` expõem o fluxo completo como
+corrotinas asyncio, para embutir em serviços e rodar vários cartões num só loop; o
+backup_cartao.py (Tkinter) é apenas um cliente deste módulo.
+"""
+import os
+import asyncio
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from collections import defaultdict
+from functools import lru_cache
+import queue
+import re
+import platform
+import subprocess
+import ctypes
+import tarfile
+import json
+import io
+import errno
+import glob
+import hashlib
+import struct
+import mmap
+import sqlite3
+import urllib.request
+import urllib.parse
+import urllib.error
+import xml.etree.ElementTree as ET
+import xml.parsers.expat
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+# Importação opcional do PIL
+try:
+    from PIL import Image, ImageDraw
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# Importação opcional do zstandard (compressão dos metadados no modo contêiner)
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Importação opcional do xxhash (hash padrão das listas ASC MHL)
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+# Importação opcional do fcntl (reflink via ioctl FICLONE; ausente no Windows)
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# --------------------------- REGISTRO DE TIPOS DE ARQUIVO ---------------------------
+
+
+PASTA_CONFIG = os.path.join(os.path.expanduser("~"), ".backup_cartao")
+ARQUIVO_TIPOS = os.path.join(PASTA_CONFIG, "tipos_arquivo.json")
+
+TIPOS_PADRAO = {
+    'photo': ['.JPG', '.JPEG', '.ARW', '.RAW', '.CR2', '.CR3', '.NEF', '.DNG', '.RAF', '.ORF', '.HEIC', '.HIF',
+              '.TIFF', '.TIF', '.GPR', '.INSP'],
+    'video': ['.MP4', '.MOV', '.AVI', '.MTS', '.M2TS', '.MXF', '.BRAW', '.R3D', '.MPEG', '.WMV', '.FLV',
+              '.LRV', '.INSV', '.360', '.CRM', '.NEV'],
+    'meta': ['.XML', '.XMP', '.THM']
+}
+PASTAS_CATEGORIA = {'photo': 'FOTOS', 'video': 'VIDEOS', 'meta': 'METADATA'}
+
+# Assinaturas no início do arquivo: (offset, bytes, categoria)
+ASSINATURAS = [
+    (0, b'\xff\xd8\xff', 'photo'),              # JPEG
+    (0, b'II*\x00', 'photo'),                   # TIFF/ARW/NEF/DNG/CR2 (little endian)
+    (0, b'MM\x00*', 'photo'),                   # TIFF big endian
+    (0, b'IIRO', 'photo'), (0, b'IIRS', 'photo'),  # Olympus ORF
+    (0, b'IIU\x00', 'photo'),                   # Panasonic RW2
+    (0, b'FUJIFILMCCD-RAW', 'photo'),           # Fuji RAF
+    (0, b'\x06\x0e\x2b\x34', 'video'),          # MXF
+    (0, b'<?xml', 'meta'), (0, b'<x:xmpmeta', 'meta'),
+]
+# Marcas "ftyp" de contêineres ISO BMFF (MP4/MOV/CR3/HEIC)
+MARCAS_FTYP = {b'crx ': 'photo', b'heic': 'photo', b'heix': 'photo', b'mif1': 'photo',
+               b'qt  ': 'video', b'isom': 'video', b'iso2': 'video', b'mp41': 'video', b'mp42': 'video',
+               b'avc1': 'video', b'XAVC': 'video', b'M4V ': 'video', b'3gp4': 'video'}
+
+
+def detectar_por_assinatura(caminho):
+    """Descobre a categoria lendo os primeiros bytes do arquivo (magic bytes)."""
+    try:
+        with open(caminho, 'rb') as f:
+            cabecalho = f.read(200)
+    except OSError:
+        return None
+    for offset, assinatura, categoria in ASSINATURAS:
+        if cabecalho[offset:offset + len(assinatura)] == assinatura:
+            return categoria
+    if cabecalho[4:8] == b'ftyp':
+        return MARCAS_FTYP.get(cabecalho[8:12])
+    if cabecalho[:4] == b'RIFF' and cabecalho[8:12] == b'AVI ':
+        return 'video'
+    # MPEG-TS (.ts) e M2TS/MTS (pacotes de 192 bytes com 4 bytes de timestamp)
+    if cabecalho[:1] == b'\x47' and cabecalho[188:189] == b'\x47':
+        return 'video'
+    if cabecalho[4:5] == b'\x47' and cabecalho[196:197] == b'\x47':
+        return 'video'
+    return None
+
+
+class RegistroTipos:
+    """Tabela sufixo -> categoria montada uma única vez.
+
+    As extensões padrão podem ser estendidas em `~/.backup_cartao/tipos_arquivo.json`:
+
+        {"photo": [".PEF"], "video": [".XAVC"], "meta": [".SRT"],
+         "detectar_por_conteudo": true}
+
+    Com `detectar_por_conteudo`, arquivos de extensão desconhecida têm os primeiros bytes
+    lidos uma vez; o resultado fica em cache pelo caminho completo.
+    """
+
+    def __init__(self, tipos, detectar_conteudo=False):
+        self.tipos = {categoria: sorted({(e if e.startswith('.') else '.' + e).upper() for e in extensoes})
+                      for categoria, extensoes in tipos.items()}
+        self.por_extensao = {extensao: categoria for categoria, extensoes in self.tipos.items()
+                             for extensao in extensoes}
+        self.detectar_conteudo = detectar_conteudo
+        self.erro_config = None
+        self._por_conteudo = {}
+
+    @classmethod
+    def carregar(cls, caminho=ARQUIVO_TIPOS):
+        tipos = {categoria: list(extensoes)
+                 for categoria, extensoes in TIPOS_PADRAO.items()}
+        config, erro = {}, None
+        try:
+            with open(caminho, encoding='utf-8') as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            erro = f"Configuração de tipos ignorada ({caminho}): {e}"
+        for categoria in tipos:
+            tipos[categoria] += [e for e in config.get(categoria, [])
+                                 if isinstance(e, str)]
+        registro = cls(tipos, bool(config.get('detectar_por_conteudo', False)))
+        registro.erro_config = erro
+        return registro
+
+    def categoria(self, nome):
+        categoria = self.por_extensao.get(os.path.splitext(nome)[1].upper())
+        if categoria is None and self._por_conteudo:
+            categoria = self._por_conteudo.get(nome)
+        return categoria
+
+    def classificar(self, caminho):
+        categoria = self.categoria(caminho)
+        if categoria is None and self.detectar_conteudo:
+            if caminho not in self._por_conteudo:
+                self._por_conteudo[caminho] = detectar_por_assinatura(caminho)
+            categoria = self._por_conteudo[caminho]
+        return categoria
+
+    def lembrar(self, caminho, categoria):
+        """Categoria já detectada pelo conteúdo em outra análise (cache de varredura)."""
+        if self.detectar_conteudo and self.categoria(caminho) is None:
+            self._por_conteudo[caminho] = categoria
+
+    def pasta(self, caminho):
+        # Caminho completo: é a chave do cache da detecção por conteúdo
+        return PASTAS_CATEGORIA.get(self.classificar(caminho), 'OUTROS')
+
+
+REGISTRO_TIPOS = RegistroTipos.carregar()
+
+# --------------------------- FUNÇÕES AUXILIARES ---------------------------
+
+
+def get_file_types():
+    return {categoria: list(extensoes) for categoria, extensoes in REGISTRO_TIPOS.tipos.items()}
+
+
+def listar_arquivos(caminho, incluir_xml):
+    return filtrar_varredura(varrer_origem(caminho), incluir_xml)
+
+
+def caminhos_origem(texto):
+    # Vários cartões (ex.: os dois slots da câmera) podem ser separados por os.pathsep
+    return [c.strip() for c in texto.split(os.pathsep) if c.strip()]
+
+
+def extrair_data_arquivo(caminho, mtime=None):
+    try:
+        if mtime is None:
+            mtime = os.path.getmtime(caminho)
+        return datetime.fromtimestamp(mtime).strftime('%Y-%m-%d')
+    except Exception:
+        return 'UNKNOWN-DATE'
+
+
+def formatar_data_br(data_str):
+    if data_str == 'UNKNOWN-DATE':
+        return 'Data Desconhecida'
+    try:
+        return datetime.strptime(data_str, '%Y-%m-%d').strftime('%d/%m/%Y')
+    except (ValueError, IndexError):
+        return data_str
+
+
+def checar_espaco(destino):
+    try:
+        total, _, free = shutil.disk_usage(destino)
+        return total, free
+    except FileNotFoundError:
+        return 0, 0
+
+
+def tamanho_total_arquivos(arquivos, tamanhos=None):
+    if tamanhos:
+        return sum(tamanhos.get(a, 0) for a in arquivos)
+    return sum(os.path.getsize(a) for a in arquivos if os.path.exists(a))
+
+
+def formatar_tamanho(b):
+    if b is None:
+        return "N/A"
+    if b < 1024:
+        return f"{b} B"
+    kb = b / 1024
+    if kb < 1024:
+        return f"{kb:.0f} KB"
+    mb = kb / 1024
+    if mb < 1024:
+        return f"{mb:.1f} MB"
+    gb = mb / 1024
+    return f"{gb:.2f} GB"
+
+
+def tipo_arquivo(caminho):
+    return REGISTRO_TIPOS.pasta(caminho)
+
+
+def carregar_thumbnail(arquivo, tamanho=(100, 100)):
+    if not PIL_AVAILABLE or tipo_arquivo(arquivo) != 'FOTOS':
+        return None
+    try:
+        origem = arquivo
+        if os.path.splitext(arquivo)[1].upper() in EXTENSOES_RAW:
+            # O Pillow não decodifica RAW: usa a prévia JPEG embutida
+            origem = io.BytesIO(extrair_previa_raw(arquivo) or b'')
+        with Image.open(origem) as img:
+            # JPEG: decodifica direto em escala reduzida, sem carregar a imagem inteira
+            img.draft('RGB', tamanho)
+            img.thumbnail(tamanho, Image.Resampling.LANCZOS)
+            return img.convert('RGB')
+    except Exception:
+        return None
+
+
+# --------------------------- MONITOR DE CARTÕES ---------------------------
+
+
+# Estruturas de pastas que identificam um cartão de câmera
+LAYOUTS_CAMERA = [
+    (('DCIM',), 'DCIM'),
+    (('PRIVATE', 'M4ROOT'), 'Sony XAVC (PRIVATE/M4ROOT)'),
+    (('PRIVATE', 'AVCHD'), 'AVCHD (PRIVATE/AVCHD)'),
+    (('CLIP',), 'Canon/Panasonic (CLIP)'),
+]
+
+
+def detectar_layout_camera(caminho):
+    """Retorna a descrição do layout de câmera encontrado em `caminho`, ou None."""
+    for partes, descricao in LAYOUTS_CAMERA:
+        atual = caminho
+        for parte in partes:
+            try:
+                nomes = {n.upper(): n for n in os.listdir(atual)}
+            except OSError:
+                atual = None
+                break
+            if parte not in nomes:
+                atual = None
+                break
+            atual = os.path.join(atual, nomes[parte])
+        if atual and os.path.isdir(atual):
+            return descricao
+    return None
+
+
+def _decodificar_mountinfo(campo):
+    # O kernel escapa espaço, tab, \n e \ como sequências octais (\040 etc.)
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), campo)
+
+
+def raizes_montagem():
+    """Diretórios onde o sistema costuma montar mídias removíveis."""
+    usuario = os.environ.get('USER') or os.environ.get('USERNAME') or ''
+    raizes = ['/media', '/mnt', '/Volumes']
+    if usuario:
+        raizes += [os.path.join('/media', usuario),
+                   os.path.join('/run/media', usuario)]
+    # Pastas extras (útil para testes com bind mount ou pasta local)
+    extras = os.environ.get('BACKUP_CARTAO_MONITORAR', '')
+    raizes += [p for p in extras.split(os.pathsep) if p]
+    return raizes
+
+
+def listar_pontos_montagem(raizes=None):
+    pontos = set()
+    try:
+        with open('/proc/self/mountinfo', encoding='utf-8', errors='replace') as f:
+            for linha in f:
+                campos = linha.split()
+                if len(campos) > 4:
+                    pontos.add(_decodificar_mountinfo(campos[4]))
+    except OSError:
+        pass
+
+    if platform.system() == "Windows":
+        pontos.update(f"{letra}:\\" for letra in "DEFGHIJKLMNOPQRSTUVWXYZ"
+                      if os.path.exists(f"{letra}:\\"))
+
+    for raiz in (raizes if raizes is not None else raizes_montagem()):
+        try:
+            with os.scandir(raiz) as entradas:
+                pontos.update(e.path for e in entradas if e.is_dir())
+        except OSError:
+            continue
+    return pontos
+
+
+class MonitorCartoes(threading.Thread):
+    """Detecta cartões recém-montados por polling e avisa via `callback(caminho, layout)`.
+
+    Pontos já presentes ao iniciar são ignorados. Pontos novos sem layout de câmera
+    continuam sendo checados a cada ciclo, pois a cópia/montagem pode ainda estar
+    em andamento quando o diretório aparece.
+    """
+
+    def __init__(self, callback, intervalo=2.0, raizes=None):
+        super().__init__(daemon=True)
+        self.callback = callback
+        self.intervalo = intervalo
+        self.raizes = raizes
+        self._parar = threading.Event()
+
+    def run(self):
+        tratados = listar_pontos_montagem(self.raizes)
+        while not self._parar.wait(self.intervalo):
+            atuais = listar_pontos_montagem(self.raizes)
+            for ponto in sorted(atuais - tratados):
+                layout = detectar_layout_camera(ponto)
+                if layout:
+                    tratados.add(ponto)
+                    self.callback(ponto, layout)
+            # Cartões removidos voltam a ser detectados quando reinseridos
+            tratados &= atuais
+
+    def parar(self):
+        self._parar.set()
+
+
+# --------------------------- CACHE DE VARREDURA ---------------------------
+
+
+PASTA_CACHE_VARREDURA = os.path.join(PASTA_CONFIG, 'cache_varredura')
+VERSAO_CACHE_VARREDURA = 1
+PASTAS_IGNORADAS = ('THMBNL', '.Trash', 'System Volume Information',
+                    'RECYCLER', '$RECYCLE.BIN')
+# O FAT guarda mtime com resolução de 2 s: pastas alteradas perto da última
+# varredura podem ter mudado sem mudar o mtime, então são relistadas
+MARGEM_MTIME_NS = 2_000_000_000
+
+
+def _montagem_linux(caminho):
+    """(ponto de montagem, dispositivo) mais específico que contém `caminho`."""
+    ponto_encontrado, dispositivo = '', None
+    try:
+        with open('/proc/self/mountinfo', encoding='utf-8', errors='replace') as f:
+            for linha in f:
+                campos = linha.split()
+                if '-' not in campos or len(campos) < campos.index('-') + 3:
+                    continue
+                ponto = _decodificar_mountinfo(campos[4])
+                contem = caminho == ponto or caminho.startswith(
+                    ponto.rstrip('/') + '/')
+                if contem and len(ponto) >= len(ponto_encontrado):
+                    ponto_encontrado = ponto
+                    dispositivo = _decodificar_mountinfo(
+                        campos[campos.index('-') + 2])
+    except OSError:
+        pass
+    return ponto_encontrado or None, dispositivo
+
+
+def _link_do_dispositivo(pasta, dispositivo):
+    try:
+        alvo = os.path.realpath(dispositivo)
+        with os.scandir(pasta) as entradas:
+            for entrada in entradas:
+                if os.path.realpath(entrada.path) == alvo:
+                    return entrada.name
+    except OSError:
+        pass
+    return None
+
+
+def identificar_volume(caminho):
+    """(identidade do volume, caminho relativo à raiz dele) para `caminho`.
+
+    Usa UUID/rótulo do sistema de arquivos (Linux: /dev/disk/by-uuid e by-label;
+    Windows: número de série do volume). Sem isso, cai no st_dev + caminho
+    absoluto, que só vale enquanto o cartão continua montado no mesmo lugar.
+    """
+    caminho = os.path.realpath(caminho)
+    if platform.system() == "Windows":
+        raiz = os.path.splitdrive(caminho)[0] + '\\'
+        serial, rotulo = ctypes.c_uint32(), ctypes.create_unicode_buffer(261)
+        if ctypes.windll.kernel32.GetVolumeInformationW(raiz, rotulo, len(rotulo), ctypes.byref(serial),
+                                                        None, None, None, 0):
+            return f"serial:{serial.value:08X}:{rotulo.value}", os.path.relpath(caminho, raiz)
+    else:
+        ponto, dispositivo = _montagem_linux(caminho)
+        if ponto and dispositivo and dispositivo.startswith('/dev/'):
+            uuid = _link_do_dispositivo('/dev/disk/by-uuid', dispositivo)
+            rotulo = _link_do_dispositivo('/dev/disk/by-label', dispositivo)
+            if uuid or rotulo:
+                return f"uuid:{uuid}:{rotulo}", os.path.relpath(caminho, ponto)
+    return f"dev:{os.stat(caminho).st_dev}", caminho
+
+
+def _assinatura_tipos():
+    # Mudou a configuração de tipos: as categorias guardadas deixam de valer
+    return hashlib.sha1(json.dumps([REGISTRO_TIPOS.tipos, REGISTRO_TIPOS.detectar_conteudo],
+                                   sort_keys=True).encode()).hexdigest()
+
+
+def _arquivo_cache_varredura(volume, relativo):
+    chave = hashlib.sha1(f"{volume}|{relativo}".encode()).hexdigest()
+    return os.path.join(PASTA_CACHE_VARREDURA, f"{chave}.json")
+
+
+def _carregar_cache_varredura(arquivo, assinatura):
+    try:
+        with open(arquivo, encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cache.get('versao') != VERSAO_CACHE_VARREDURA or cache.get('tipos') != assinatura:
+        return None
+    return cache
+
+
+def _salvar_cache_varredura(arquivo, cache):
+    try:
+        os.makedirs(PASTA_CACHE_VARREDURA, exist_ok=True)
+        temporario = arquivo + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temporario, arquivo)
+    except OSError:
+        pass  # sem cache, a próxima análise só fica mais lenta
+
+
+def _listar_pasta(pasta):
+    subpastas, arquivos = [], []
+    with os.scandir(pasta) as entradas:
+        for entrada in entradas:
+            if entrada.name.startswith(('._', '~$')) or entrada.name == '.DS_Store':
+                continue
+            if entrada.is_dir(follow_symlinks=False):
+                if not any(p in entrada.name for p in PASTAS_IGNORADAS):
+                    subpastas.append(entrada.name)
+                continue
+            categoria = REGISTRO_TIPOS.classificar(entrada.path)
+            if categoria:
+                st = entrada.stat()
+                arquivos.append([entrada.name, categoria,
+                                st.st_size, st.st_mtime])
+    return subpastas, arquivos
+
+
+def _percorrer(caminho, anteriores, varrido_em):
+    pastas, resultado, relistadas = {}, {}, 0
+    pendentes = ['']
+    while pendentes:
+        relativo = pendentes.pop()
+        pasta = os.path.join(caminho, relativo) if relativo else caminho
+        try:
+            mtime = os.stat(pasta).st_mtime_ns
+        except OSError:
+            continue
+        anterior = anteriores.get(relativo)
+        if anterior and anterior['mtime'] == mtime and mtime < varrido_em - MARGEM_MTIME_NS:
+            subpastas, arquivos = anterior['subpastas'], anterior['arquivos']
+            if REGISTRO_TIPOS.detectar_conteudo:
+                for nome, categoria, _, _ in arquivos:
+                    REGISTRO_TIPOS.lembrar(os.path.join(pasta, nome), categoria)
+        else:
+            try:
+                subpastas, arquivos = _listar_pasta(pasta)
+            except OSError:
+                continue
+            relistadas += 1
+        pastas[relativo] = {'mtime': mtime,
+                            'subpastas': subpastas, 'arquivos': arquivos}
+        prefixo = os.path.join(pasta, '')  # os.path.join por arquivo custa caro em 20k itens
+        for nome, categoria, tamanho, mtime_arquivo in arquivos:
+            resultado[prefixo + nome] = (categoria, tamanho, mtime_arquivo)
+        pendentes.extend(os.path.join(relativo, s)
+                         for s in reversed(subpastas))
+    return pastas, resultado, relistadas
+
+
+def varrer_origem(caminho, usar_cache=True):
+    """Todos os arquivos reconhecidos em `caminho`: {caminho: (categoria, tamanho, mtime)}.
+
+    Pastas com o mesmo mtime da última varredura do mesmo volume saem do cache em
+    ~/.backup_cartao/cache_varredura; só as alteradas são relistadas.
+    """
+    assinatura, arquivo_cache, cache = _assinatura_tipos(), None, None
+    try:
+        volume, relativo = identificar_volume(caminho)
+        usado = shutil.disk_usage(caminho).used
+        arquivo_cache = _arquivo_cache_varredura(volume, relativo)
+    except OSError:
+        pass
+    if arquivo_cache and usar_cache:
+        cache = _carregar_cache_varredura(arquivo_cache, assinatura)
+
+    varrido_em = time.time_ns()
+    anteriores = cache['pastas'] if cache else {}
+    pastas, resultado, relistadas = _percorrer(
+        caminho, anteriores, cache['varrido_em'] if cache else 0)
+    if cache and not relistadas and cache['usado'] != usado:
+        # Espaço usado mudou sem nenhuma pasta mudar (arquivo regravado no lugar)
+        pastas, resultado, relistadas = _percorrer(caminho, {}, 0)
+
+    if arquivo_cache and (relistadas or not cache or cache['usado'] != usado):
+        _salvar_cache_varredura(arquivo_cache, {
+            'versao': VERSAO_CACHE_VARREDURA, 'volume': volume, 'raiz': relativo,
+            'tipos': assinatura, 'usado': usado, 'varrido_em': varrido_em, 'pastas': pastas})
+    return resultado
+
+
+def filtrar_varredura(varredura, incluir_xml):
+    """Separa uma varredura em (fotos, vídeos, sidecars), aplicando a opção de XML."""
+    arquivos = {'photo': [], 'video': [], 'meta': []}
+    for caminho, (categoria, _, _) in varredura.items():
+        if incluir_xml or categoria != 'meta':
+            arquivos[categoria].append(caminho)
+    return arquivos['photo'], arquivos['video'], arquivos['meta']
+
+
+VERSAO_CACHE_ANALISE = 1
+
+
+class CacheAnalise:
+    """O que a análise já leu de cada arquivo da origem: impressão digital, classificação
+    XMP e metadados.
+
+    Fica junto do cache de varredura do mesmo volume, com caminhos relativos à origem; uma
+    entrada só vale enquanto o arquivo mantém o tamanho e o mtime da varredura.
+    """
+
+    def __init__(self, caminho, varredura, usar_cache=True):
+        self.raiz = os.path.join(caminho, '')
+        self.varredura = varredura
+        self.arquivo, self.entradas, self.alterado = None, {}, False
+        try:
+            volume, relativo = identificar_volume(caminho)
+        except OSError:
+            return
+        self.arquivo = _arquivo_cache_varredura(volume, relativo)[:-len('.json')] + '.analise.json'
+        if not usar_cache:
+            return
+        try:
+            with open(self.arquivo, encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return
+        if cache.get('versao') == VERSAO_CACHE_ANALISE:
+            self.entradas = cache.get('arquivos', {})
+
+    def obter(self, arquivo, campo):
+        """(True, valor) se `campo` já foi lido do arquivo como ele está agora."""
+        entrada = self.entradas.get(arquivo[len(self.raiz):])
+        _, tamanho, mtime = self.varredura[arquivo]
+        if entrada and entrada[0] == tamanho and entrada[1] == mtime and campo in entrada[2]:
+            return True, entrada[2][campo]
+        return False, None
+
+    def guardar(self, arquivo, campo, valor):
+        relativo = arquivo[len(self.raiz):]
+        _, tamanho, mtime = self.varredura[arquivo]
+        entrada = self.entradas.get(relativo)
+        if not entrada or entrada[0] != tamanho or entrada[1] != mtime:
+            entrada = self.entradas[relativo] = [tamanho, mtime, {}]
+        entrada[2][campo] = valor
+        self.alterado = True
+
+    def salvar(self):
+        # Arquivos que saíram do cartão deixam de ocupar o cache
+        presentes = {a[len(self.raiz):] for a in self.varredura}
+        if any(r not in presentes for r in self.entradas):
+            self.entradas = {r: e for r, e in self.entradas.items() if r in presentes}
+            self.alterado = True
+        if self.arquivo and self.alterado:
+            _salvar_cache_varredura(self.arquivo, {'versao': VERSAO_CACHE_ANALISE, 'arquivos': self.entradas})
+            self.alterado = False
+
+
+# --------------------------- CLASSIFICAÇÃO XMP ---------------------------
+
+
+# Prefixos usuais, para sidecars que usam o prefixo sem declarar o namespace
+PREFIXOS_XMP = {
+    'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+    'xmp': 'http://ns.adobe.com/xap/1.0/',
+    'xmpDM': 'http://ns.adobe.com/xmp/1.0/DynamicMedia/',
+    'photomechanic': 'http://ns.camerabits.com/photomechanic/1.0/',
+}
+CAMPOS_XMP = {
+    ('http://ns.adobe.com/xap/1.0/', 'Rating'): 'nota',
+    ('http://ns.adobe.com/xap/1.0/', 'Label'): 'rotulo',
+    ('http://ns.adobe.com/xmp/1.0/DynamicMedia/', 'pick'): 'escolha',
+    ('http://ns.adobe.com/xmp/1.0/DynamicMedia/', 'good'): 'boa',
+    ('http://ns.camerabits.com/photomechanic/1.0/', 'Tagged'): 'marcada',
+}
+BLOCO_XMP = 64 * 1024
+
+
+class _FimXmp(Exception):
+    pass
+
+
+def ler_classificacao_xmp(caminho):
+    """Nota, rótulo de cor e escolha/rejeição de um sidecar XMP, ou None se não houver.
+
+    Parser expat em fluxo: só os atributos (ou elementos simples) de rdf:Description
+    listados em CAMPOS_XMP são guardados, e a leitura para no fim do rdf:RDF.
+    """
+    prefixos, valores, campo_aberto, texto = dict(PREFIXOS_XMP), {}, [None], []
+
+    def resolver(nome):
+        prefixo, _, local = nome.rpartition(':')
+        return prefixos.get(prefixo), local
+
+    def inicio(nome, atributos):
+        for atributo, valor in atributos.items():
+            if atributo.startswith('xmlns:'):
+                prefixos[atributo[6:]] = valor
+        if resolver(nome) == (PREFIXOS_XMP['rdf'], 'Description'):
+            for atributo, valor in atributos.items():
+                campo = CAMPOS_XMP.get(resolver(atributo))
+                if campo:
+                    valores[campo] = valor
+        else:
+            campo_aberto[0] = CAMPOS_XMP.get(resolver(nome))
+            texto.clear()
+
+    def fim(nome):
+        if campo_aberto[0]:
+            valores[campo_aberto[0]] = "".join(texto).strip()
+            campo_aberto[0] = None
+        elif resolver(nome) == (PREFIXOS_XMP['rdf'], 'RDF'):
+            raise _FimXmp
+
+    def dados(conteudo):
+        if campo_aberto[0]:
+            texto.append(conteudo)
+
+    parser = xml.parsers.expat.ParserCreate()
+    parser.StartElementHandler, parser.EndElementHandler = inicio, fim
+    parser.CharacterDataHandler = dados
+    try:
+        with open(caminho, 'rb') as f:
+            while True:
+                bloco = f.read(BLOCO_XMP)
+                parser.Parse(bloco, not bloco)
+                if not bloco:
+                    break
+    except _FimXmp:
+        pass
+    except (OSError, xml.parsers.expat.ExpatError):
+        if not valores:
+            return None
+    if not valores:
+        return None
+
+    try:
+        nota = int(float(valores['nota'])) if valores.get('nota') else None
+    except ValueError:
+        nota = None
+    escolha = valores.get('escolha', '').strip()
+    # good="true" e Tagged="True" só marcam a foto; sem marca (ou "False") não é rejeição
+    marcada = any(valores.get(campo, '').strip().lower() in ('1', 'true') for campo in ('boa', 'marcada'))
+    return {'nota': nota, 'rotulo': valores.get('rotulo') or None,
+            'escolhida': escolha == '1' or marcada,
+            # Só Rating -1 (Lightroom/Bridge) e pick -1 (xmpDM) rejeitam
+            'rejeitada': (nota is not None and nota < 0) or escolha == '-1'}
+
+
+def associar_sidecars(fotos, sidecars):
+    """{foto: sidecar .XMP}: casa FOTO.XMP (Adobe) e FOTO.EXT.xmp (darktable) na mesma pasta."""
+    por_nome = {}
+    for sidecar in sidecars:
+        pasta, nome = os.path.split(sidecar)
+        por_nome[(pasta, os.path.splitext(nome)[0].upper())] = sidecar
+    associados = {}
+    for foto in fotos:
+        pasta, nome = os.path.split(foto)
+        sidecar = por_nome.get((pasta, nome.upper())) or por_nome.get(
+            (pasta, os.path.splitext(nome)[0].upper()))
+        if sidecar:
+            associados[foto] = sidecar
+    return associados
+
+
+def excluidos_por_classificacao(arquivos, classificacoes, sidecars, nota_minima=0, pular_rejeitadas=False):
+    """Conjunto das fotos abaixo da nota mínima (sem nota conta como 0) ou rejeitadas.
+
+    O sidecar de uma foto excluída também entra, a menos que ainda sirva a outra foto
+    mantida (par RAW+JPEG com um XMP só). Vídeos e outros arquivos não são afetados.
+    Passe os arquivos de todas as datas: um XMP editado depois cai em outra data.
+    """
+    excluidas = set()
+    if not nota_minima and not pular_rejeitadas:
+        return excluidas
+    for arquivo in arquivos:
+        if tipo_arquivo(arquivo) != 'FOTOS':
+            continue
+        classificacao = classificacoes.get(arquivo) or {}
+        if ((nota_minima and (classificacao.get('nota') or 0) < nota_minima)
+                or (pular_rejeitadas and classificacao.get('rejeitada'))):
+            excluidas.add(arquivo)
+    mantidos = {sidecars[a] for a in arquivos if a in sidecars and a not in excluidas}
+    excluidas |= {sidecars[a] for a in excluidas if a in sidecars} - mantidos
+    return excluidas
+
+
+# --------------------------- CONTROLE DE BANDA E PRIORIDADE ---------------------------
+
+
+TAMANHO_BLOCO_COPIA = 4 * 1024 * 1024
+MB = 1024 * 1024
+
+# Número da syscall ioprio_set por arquitetura (Linux)
+SYSCALL_IOPRIO_SET = {'x86_64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30,
+                      'armv7l': 314, 'ppc64le': 273, 'riscv64': 30}
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_WHO_PROCESS = 1
+
+
+class LimitadorBanda:
+    """Token bucket em bytes/s compartilhado por leitura e escrita de um job.
+
+    Taxa 0 significa sem limite. `ajustar` pode ser chamado de outra thread (ex.: pela
+    janela de progresso) e vale a partir do próximo bloco.
+    """
+
+    def __init__(self, bytes_por_segundo=0):
+        self._lock = threading.Lock()
+        self.taxa = max(0, bytes_por_segundo)
+        self._tokens = 0.0
+        self._ultimo = time.monotonic()
+
+    def _reabastecer(self):
+        agora = time.monotonic()
+        # Rajada máxima de 250 ms para não acumular crédito enquanto ocioso
+        capacidade = max(self.taxa * 0.25, TAMANHO_BLOCO_COPIA)
+        self._tokens = min(capacidade, self._tokens +
+                           (agora - self._ultimo) * self.taxa)
+        self._ultimo = agora
+
+    def ajustar(self, bytes_por_segundo):
+        with self._lock:
+            self._reabastecer()
+            self.taxa = max(0, bytes_por_segundo)
+
+    def consumir(self, n):
+        with self._lock:
+            if self.taxa <= 0:
+                return
+            self._reabastecer()
+            self._tokens -= n
+        while True:
+            with self._lock:
+                if self.taxa <= 0:
+                    self._tokens = 0.0
+                    return
+                self._reabastecer()
+                if self._tokens >= 0:
+                    return
+                espera = -self._tokens / self.taxa
+            # Dorme em fatias curtas para reagir a ajustes feitos durante a espera
+            time.sleep(min(espera, 0.2))
+
+
+class _LeitorLimitado:
+    def __init__(self, arquivo, limitador):
+        self.arquivo = arquivo
+        self.limitador = limitador
+
+    def read(self, n=-1):
+        dados = self.arquivo.read(n)
+        self.limitador.consumir(len(dados))
+        return dados
+
+
+def reduzir_prioridade_thread(io_ociosa=True, incremento_nice=10):
+    """Coloca a thread atual na classe de E/S ociosa e reduz sua prioridade de CPU.
+
+    Só tem efeito no Linux, onde prioridades de CPU e de E/S são por thread; nos
+    demais sistemas reduzir o processo inteiro deixaria a interface lenta também.
+    """
+    if platform.system() != "Linux":
+        return False
+    tid = threading.get_native_id()
+    if incremento_nice:
+        try:
+            atual = os.getpriority(os.PRIO_PROCESS, tid)
+            os.setpriority(os.PRIO_PROCESS, tid, min(
+                19, atual + incremento_nice))
+        except OSError:
+            pass
+    if not io_ociosa:
+        return True
+
+    numero = SYSCALL_IOPRIO_SET.get(platform.machine())
+    if numero is not None:
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            if libc.syscall(numero, IOPRIO_WHO_PROCESS, 0, IOPRIO_CLASS_IDLE << 13) == 0:
+                return True
+        except (OSError, AttributeError):
+            pass
+    if shutil.which('ionice'):
+        resultado = subprocess.run(['ionice', '-c', '3', '-p', str(tid)],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return resultado.returncode == 0
+    return False
+
+
+# Modos de uso do page cache na cópia de arquivos soltos
+MODOS_CACHE = {
+    'normal': "Normal (deixa o sistema guardar os dados em cache)",
+    'descartar': "Descartar do cache o que já foi gravado (fadvise)",
+    'direto': "E/S direta sem cache (O_DIRECT)",
+}
+# Bytes gravados entre um fdatasync + DONTNEED e o próximo
+JANELA_DESCARTE_CACHE = 64 * MB
+ALINHAMENTO_DIRETO = 4096
+
+
+class PoolBuffers:
+    """Buffers mmap (alinhados à página, como o O_DIRECT exige) reaproveitados entre arquivos."""
+
+    def __init__(self, tamanho):
+        self.tamanho = tamanho
+        self.livres = queue.LifoQueue()
+
+    def obter(self):
+        try:
+            return self.livres.get_nowait()
+        except queue.Empty:
+            return mmap.mmap(-1, self.tamanho)
+
+    def devolver(self, buffer):
+        self.livres.put(buffer)
+
+
+POOL_BUFFERS_DIRETOS = PoolBuffers(TAMANHO_BLOCO_COPIA)
+
+
+def _descartar_cache(fd, inicio, tamanho):
+    if hasattr(os, 'posix_fadvise') and tamanho > 0:
+        os.posix_fadvise(fd, inicio, tamanho, os.POSIX_FADV_DONTNEED)
+
+
+def _desligar_o_direct(fd):
+    # O final do arquivo raramente tem tamanho alinhado: esse último trecho vai pelo cache
+    if FCNTL_AVAILABLE:
+        fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(
+            fd, fcntl.F_GETFL) & ~os.O_DIRECT)
+
+
+def copiar_em_blocos(origem, destino, limitador=None, hash_obj=None, cache='normal'):
+    """Copia em blocos (passando pelo limitador de banda) e preserva os metadados como copy2.
+
+    Erros de leitura não interrompem a cópia: a região é pulada com saltos crescentes
+    (como no ddrescue), fica zerada no destino e é devolvida em `pendentes` para uma
+    segunda passada com `recuperar_regioes`. Retorna (bytes_lidos, pendentes).
+    Se `hash_obj` for passado, cada bloco lido o atualiza; o resultado só vale sem pendentes.
+
+    `cache='descartar'` grava em janelas duráveis (fdatasync) e tira do page cache as
+    páginas já copiadas da origem e do destino; `cache='direto'` usa O_DIRECT com buffers
+    alinhados do pool, caindo para o descarte no lado cujo sistema de arquivos o recusar.
+    """
+    copiados, pendentes = 0, []
+    if cache == 'direto':
+        fd_origem, direto_origem = _abrir_sem_cache(origem, os.O_RDONLY)
+    else:
+        fd_origem, direto_origem = os.open(
+            origem, os.O_RDONLY | getattr(os, 'O_BINARY', 0)), False
+    buffer = POOL_BUFFERS_DIRETOS.obter() if cache == 'direto' else None
+    try:
+        tamanho = os.fstat(fd_origem).st_size
+        if cache != 'normal' and hasattr(os, 'posix_fadvise') and not direto_origem:
+            os.posix_fadvise(fd_origem, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        if cache == 'direto':
+            fd_destino, direto_destino = _abrir_sem_cache(
+                destino, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        else:
+            fd_destino, direto_destino = os.open(
+                destino, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644), False
+        with open(fd_destino, 'wb', buffering=0) as fdst:
+            offset, salto, janela = 0, TAMANHO_BLOCO_COPIA, 0
+            while offset < tamanho:
+                try:
+                    if buffer is not None:
+                        lidos = _ler_bloco(fd_origem, buffer, offset)
+                        dados = memoryview(buffer)[:min(lidos, tamanho - offset)]
+                    else:
+                        dados = _pread(fd_origem, min(
+                            TAMANHO_BLOCO_COPIA, tamanho - offset), offset)
+                except OSError as e:
+                    if direto_origem and e.errno == errno.EINVAL:
+                        # Alguns FUSE aceitam abrir com O_DIRECT mas recusam a leitura
+                        os.close(fd_origem)
+                        fd_origem, direto_origem = os.open(
+                            origem, os.O_RDONLY | getattr(os, 'O_BINARY', 0)), False
+                        continue
+                    fim = min(tamanho, offset + salto)
+                    if pendentes and pendentes[-1][1] == offset:
+                        pendentes[-1] = (pendentes[-1][0], fim)
+                    else:
+                        pendentes.append((offset, fim))
+                    offset, salto = fim, min(salto * 2, SALTO_MAXIMO_LEITURA)
+                    fdst.seek(offset)
+                    continue
+                if not dados:
+                    break
+                if limitador:
+                    limitador.consumir(len(dados))
+                if direto_destino and len(dados) % ALINHAMENTO_DIRETO:
+                    _desligar_o_direct(fd_destino)
+                    direto_destino = False
+                fdst.write(dados)
+                if hash_obj is not None:
+                    hash_obj.update(dados)
+                offset += len(dados)
+                copiados += len(dados)
+                salto = TAMANHO_BLOCO_COPIA
+                if cache != 'normal' and offset - janela >= JANELA_DESCARTE_CACHE:
+                    janela = _fechar_janela_cache(
+                        fd_origem, fd_destino, janela, offset, direto_origem)
+            if pendentes:
+                fdst.truncate(tamanho)
+            if cache != 'normal':
+                _fechar_janela_cache(fd_origem, fd_destino,
+                                     janela, offset, direto_origem)
+    finally:
+        os.close(fd_origem)
+        if buffer is not None:
+            POOL_BUFFERS_DIRETOS.devolver(buffer)
+    shutil.copystat(origem, destino)
+    return copiados, pendentes
+
+
+def _fechar_janela_cache(fd_origem, fd_destino, inicio, fim, direto_origem):
+    """Torna a janela [inicio, fim) durável no destino e a tira do cache; devolve o novo início."""
+    getattr(os, 'fdatasync', os.fsync)(fd_destino)
+    _descartar_cache(fd_destino, inicio, fim - inicio)
+    if not direto_origem:
+        _descartar_cache(fd_origem, inicio, fim - inicio)
+    return fim
+
+# --------------------------- REORGANIZAÇÃO NO MESMO DISCO ---------------------------
+
+
+MODOS_REORGANIZACAO = {
+    'copiar': "Copiar os bytes (padrão)",
+    'reflink': "Reflink (btrfs/XFS: cópia instantânea sem ocupar espaço)",
+    'hardlink': "Link físico (mesmo arquivo em dois lugares)",
+    'mover': "Mover (renomear; os arquivos saem da origem)",
+}
+# ioctl FICLONE do Linux (_IOW(0x94, 9, int))
+FICLONE = 0x40049409
+STATUS_REORGANIZACAO = {
+    'copia': "✅ Copiado",
+    'reflink': "✅ Clonado (reflink)",
+    'hardlink': "✅ Vinculado (link físico)",
+    'mover': "✅ Movido",
+}
+
+
+def mesmo_dispositivo(origem, destino):
+    """Verdadeiro se a origem e a pasta de destino (ou o ancestral que já existe) estão no mesmo sistema de arquivos."""
+    try:
+        return os.stat(origem).st_dev == os.stat(_pasta_existente(destino)).st_dev
+    except OSError:
+        return False
+
+
+def clonar_reflink(origem, destino):
+    """Cria `destino` compartilhando os blocos de `origem` (OSError se o FS não suportar).
+
+    O clone é feito num nome temporário ao lado e só então trocado: um `destino` que já
+    existia continua intacto se o ioctl falhar.
+    """
+    if not FCNTL_AVAILABLE:
+        raise OSError(errno.EOPNOTSUPP, "reflink indisponível neste sistema")
+    temporario = f"{destino}.reorg-{os.getpid()}"
+    try:
+        with open(origem, 'rb') as fsrc, open(temporario, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        shutil.copystat(origem, temporario)
+        os.replace(temporario, destino)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+def _vincular(origem, destino):
+    # os.link não sobrescreve: cria ao lado e troca atomicamente, como a cópia faria
+    temporario = f"{destino}.reorg-{os.getpid()}"
+    os.link(origem, temporario)
+    os.replace(temporario, destino)
+
+
+def reorganizacao_disponivel(amostra, destino, modo):
+    """Verdadeiro se `modo` funciona de fato entre o arquivo `amostra` e a pasta `destino`.
+
+    O mesmo st_dev não garante reflink (ext4) nem links físicos (exFAT): o teste cria e
+    apaga um arquivo temporário no destino.
+    """
+    if modo == 'copiar' or not mesmo_dispositivo(amostra, destino):
+        return False
+    if modo == 'mover':
+        return True
+    teste = os.path.join(_pasta_existente(destino), f".teste-{modo}-{os.getpid()}")
+    try:
+        if modo == 'reflink':
+            clonar_reflink(amostra, teste)
+        else:
+            os.link(amostra, teste)
+    except OSError:
+        return False
+    try:
+        os.remove(teste)
+    except OSError:
+        pass
+    return True
+
+
+def reorganizar_arquivo(origem, destino, modo, limitador=None, hash_obj=None, cache='normal'):
+    """Leva `origem` para `destino` pelo método pedido, copiando só quando ele não se aplica.
+
+    Retorna (método usado, pendentes): o método é 'reflink', 'hardlink', 'mover' ou 'copia'
+    e `pendentes` vem de `copiar_em_blocos` quando houve cópia real. Se 'mover' cair na
+    cópia (outro sistema de arquivos), a origem é mantida: nada sai do cartão sem rename.
+    """
+    if modo != 'copiar' and mesmo_dispositivo(origem, destino):
+        try:
+            if modo == 'reflink':
+                clonar_reflink(origem, destino)
+            elif modo == 'hardlink':
+                _vincular(origem, destino)
+            else:
+                os.replace(origem, destino)
+            return modo, []
+        except OSError as e:
+            # FS sem reflink, sem links (FAT/exFAT) ou montagens cruzadas com o mesmo st_dev
+            if e.errno not in (errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL,
+                               errno.EPERM, errno.EMLINK, errno.ENOTTY):
+                raise
+    _, pendentes = copiar_em_blocos(
+        origem, destino, limitador, hash_obj, cache)
+    return 'copia', pendentes
+
+
+# --------------------------- LEITURA COM RECUPERAÇÃO ---------------------------
+
+
+# Blocos cada vez menores usados na segunda passada sobre as regiões danificadas
+BLOCOS_RECUPERACAO = (256 * 1024, 64 * 1024, 4096, 512)
+SALTO_MAXIMO_LEITURA = 64 * MB
+
+
+def _pread(fd, tamanho, offset):
+    if hasattr(os, 'pread'):
+        return os.pread(fd, tamanho, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, tamanho)
+
+
+def _ler_com_retentativas(fd, tamanho, offset, tentativas):
+    for tentativa in range(tentativas):
+        try:
+            dados = _pread(fd, tamanho, offset)
+            if dados:
+                return dados
+        except OSError:
+            pass
+        if tentativa + 1 < tentativas:
+            time.sleep(0.02 * 2 ** tentativa)
+    return None
+
+
+def _recuperar_regiao(fd_origem, fdst, inicio, fim, nivel, tentativas, limitador):
+    bloco = BLOCOS_RECUPERACAO[nivel]
+    ultimo_nivel = nivel + 1 == len(BLOCOS_RECUPERACAO)
+    ilegiveis, offset = [], inicio
+    while offset < fim:
+        n = min(bloco, fim - offset)
+        # Só insiste com backoff no menor bloco; nos maiores, divide logo a região
+        dados = _ler_com_retentativas(
+            fd_origem, n, offset, tentativas if ultimo_nivel else 1)
+        if dados:
+            if limitador:
+                limitador.consumir(len(dados))
+            fdst.seek(offset)
+            fdst.write(dados)
+            offset += len(dados)
+            continue
+        if ultimo_nivel:
+            if ilegiveis and ilegiveis[-1][1] == offset:
+                ilegiveis[-1] = (ilegiveis[-1][0], offset + n)
+            else:
+                ilegiveis.append((offset, offset + n))
+        else:
+            ilegiveis.extend(_recuperar_regiao(fd_origem, fdst, offset, offset + n,
+                                               nivel + 1, tentativas, limitador))
+        offset += n
+    return ilegiveis
+
+
+def _unir_regioes(regioes):
+    unidas = []
+    for inicio, fim in sorted(regioes):
+        if unidas and inicio <= unidas[-1][1]:
+            unidas[-1] = (unidas[-1][0], max(fim, unidas[-1][1]))
+        else:
+            unidas.append((inicio, fim))
+    return unidas
+
+
+def recuperar_regioes(origem, destino, pendentes, tentativas=3, limitador=None):
+    """Segunda passada sobre as regiões puladas: relê com blocos menores e backoff exponencial.
+
+    O que for lido é gravado no lugar certo do destino. Retorna as regiões que
+    continuaram ilegíveis, como lista de (inicio, fim) em bytes.
+    """
+    ilegiveis = []
+    fd_origem = os.open(origem, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        with open(destino, 'r+b', buffering=0) as fdst:
+            for inicio, fim in pendentes:
+                ilegiveis.extend(_recuperar_regiao(
+                    fd_origem, fdst, inicio, fim, 0, tentativas, limitador))
+    finally:
+        os.close(fd_origem)
+    shutil.copystat(origem, destino)
+    return _unir_regioes(ilegiveis)
+
+
+def caminho_mapa_danos(destino):
+    return destino + '.danificado.json'
+
+# --------------------------- CONTÊINER TAR ---------------------------
+
+
+MODOS_DESTINO = {
+    'pastas': "Pastas soltas (FOTOS/VIDEOS/METADATA)",
+    'tar': "Contêiner TAR por data",
+    'tar_zstd': "Contêiner TAR por data + metadados zstd",
+}
+
+
+def carregar_indice_container(caminho_tar):
+    """Lê o índice lateral do contêiner; se não existir, reconstrói a partir do tar."""
+    try:
+        with open(caminho_tar + '.idx.json', encoding='utf-8') as f:
+            return json.load(f)['membros']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    indice = {}
+    with tarfile.open(caminho_tar, 'r') as tar:
+        for info in tar:
+            comprimido = info.name.startswith(
+                'METADATA/') and info.name.endswith('.zst')
+            nome = info.name[:-4] if comprimido else info.name
+            indice[nome] = {'membro': info.name, 'origem': None, 'offset': info.offset_data,
+                            'tamanho': info.size, 'tamanho_original': None if comprimido else info.size,
+                            'mtime': info.mtime, 'compressao': 'zstd' if comprimido else None}
+
+    # O tamanho original dos comprimidos está no cabeçalho do quadro zstd
+    comprimidos = [e for e in indice.values() if e['compressao'] == 'zstd']
+    if comprimidos and ZSTD_AVAILABLE:
+        with open(caminho_tar, 'rb') as f:
+            for entrada in comprimidos:
+                f.seek(entrada['offset'])
+                try:
+                    tamanho = zstandard.frame_content_size(f.read(18))
+                except zstandard.ZstdError:
+                    continue
+                if tamanho >= 0:
+                    entrada['tamanho_original'] = tamanho
+    return indice
+
+
+class ContainerTar:
+    """Grava os arquivos de uma data em um único .tar, mantendo o layout FOTOS/VIDEOS/METADATA.
+
+    Um índice lateral (`<contêiner>.idx.json`) guarda o offset dos dados de cada membro,
+    permitindo extrair um arquivo isolado sem varrer o contêiner inteiro. Se o contêiner
+    já existir, os novos membros são anexados e os idênticos são ignorados.
+    """
+
+    def __init__(self, caminho, comprimir_meta=False):
+        self.caminho = caminho
+        self.caminho_indice = caminho + '.idx.json'
+        self.comprimir_meta = comprimir_meta and ZSTD_AVAILABLE
+        if os.path.exists(caminho):
+            self.indice = carregar_indice_container(caminho)
+            self.tar = tarfile.open(caminho, 'a', format=tarfile.PAX_FORMAT)
+        else:
+            self.indice = {}
+            self.tar = tarfile.open(caminho, 'w', format=tarfile.PAX_FORMAT)
+
+    def contem(self, nome_membro, tamanho, mtime=None):
+        entrada = self.indice.get(nome_membro)
+        if entrada is None:
+            return False
+        if entrada['tamanho_original'] is None:
+            # Índice reconstruído sem zstd para ler o quadro: nome + mtime (o tar guarda segundos)
+            return mtime is not None and int(entrada['mtime']) == int(mtime)
+        return entrada['tamanho_original'] == tamanho
+
+    def adicionar(self, arquivo, nome_membro, tipo, limitador=None):
+        st = os.stat(arquivo)
+        comprimir = self.comprimir_meta and tipo == 'METADATA'
+
+        info = tarfile.TarInfo(nome_membro + ('.zst' if comprimir else ''))
+        info.mtime = st.st_mtime
+        info.mode = 0o644
+        if comprimir:
+            with open(arquivo, 'rb') as f:
+                dados = zstandard.ZstdCompressor(level=19).compress(f.read())
+            info.size = len(dados)
+            fonte = io.BytesIO(dados)
+        else:
+            info.size = st.st_size
+            fonte = open(arquivo, 'rb')
+        with fonte:
+            self.tar.addfile(info, _LeitorLimitado(
+                fonte, limitador) if limitador else fonte)
+
+        # Após addfile, tar.offset aponta para o fim dos dados já alinhados em blocos
+        blocos = -(-info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+        self.indice[nome_membro] = {'membro': info.name, 'origem': arquivo, 'offset': self.tar.offset - blocos,
+                                    'tamanho': info.size, 'tamanho_original': st.st_size,
+                                    'mtime': st.st_mtime, 'compressao': 'zstd' if comprimir else None}
+        return info.size
+
+    def fechar(self):
+        self.tar.close()
+        tmp = self.caminho_indice + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'versao': 1, 'container': os.path.basename(self.caminho),
+                       'membros': self.indice}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.caminho_indice)
+
+
+def extrair_do_container(caminho_tar, nome_membro, destino, indice=None):
+    """Extrai um único membro (ex.: 'FOTOS/DSC0001.arw') usando o offset do índice."""
+    entrada = (indice or carregar_indice_container(caminho_tar))[nome_membro]
+    with open(caminho_tar, 'rb') as f, open(destino, 'wb') as saida:
+        f.seek(entrada['offset'])
+        if entrada['compressao'] == 'zstd':
+            saida.write(zstandard.ZstdDecompressor().decompress(
+                f.read(entrada['tamanho'])))
+        else:
+            restante = entrada['tamanho']
+            while restante:
+                bloco = f.read(min(restante, 1024 * 1024))
+                if not bloco:
+                    raise EOFError(f"Contêiner truncado em {nome_membro}")
+                saida.write(bloco)
+                restante -= len(bloco)
+    os.utime(destino, (entrada['mtime'], entrada['mtime']))
+
+
+def caminho_membro(caminho_tar, nome_membro):
+    """Caminho de um membro no formato do catálogo: '<contêiner>.tar::FOTOS/DSC0001.arw'."""
+    return f"{caminho_tar}::{nome_membro}"
+
+
+def separar_membro(caminho):
+    """(contêiner, nome do membro) de um caminho de membro; (caminho, None) para arquivos comuns."""
+    caminho_tar, separador, nome_membro = caminho.partition('.tar::')
+    if not separador:
+        return caminho, None
+    return caminho_tar + '.tar', nome_membro
+
+
+@lru_cache(maxsize=16)
+def _indice_em_cache(caminho_tar, _mtime_ns, _tamanho):
+    # A assinatura (mtime, tamanho) invalida o índice quando o contêiner recebe membros
+    return carregar_indice_container(caminho_tar)
+
+
+def indice_container(caminho_tar):
+    st = os.stat(caminho_tar)
+    return _indice_em_cache(caminho_tar, st.st_mtime_ns, st.st_size)
+
+
+def abrir_membro(caminho_tar, nome_membro):
+    """Conteúdo original de um membro como arquivo binário somente leitura.
+
+    Membros sem compressão são lidos direto do contêiner, pelo offset do índice; os
+    comprimidos (metadados, pequenos) são descomprimidos em memória.
+    """
+    entrada = indice_container(caminho_tar)[nome_membro]
+    if entrada['compressao'] == 'zstd' and not ZSTD_AVAILABLE:
+        raise ValueError(f"{nome_membro} está comprimido e requer o módulo 'zstandard'")
+    with open(caminho_tar, 'rb') as f:
+        if entrada['compressao'] == 'zstd':
+            f.seek(entrada['offset'])
+            return io.BytesIO(zstandard.ZstdDecompressor().decompress(
+                f.read(entrada['tamanho']), max_output_size=64 * 1024 * 1024))
+    return _JanelaArquivo(open(caminho_tar, 'rb', buffering=0), entrada['offset'], entrada['tamanho'])
+
+
+class _JanelaArquivo(io.RawIOBase):
+    """Trecho [inicio, inicio + tamanho) de um arquivo, visto como um arquivo à parte."""
+
+    def __init__(self, f, inicio, tamanho):
+        super().__init__()
+        self._f, self._inicio, self._tamanho, self._posicao = f, inicio, tamanho, 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, posicao, referencia=os.SEEK_SET):
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._posicao, os.SEEK_END: self._tamanho}[referencia]
+        self._posicao = max(0, min(self._tamanho, base + posicao))
+        return self._posicao
+
+    def tell(self):
+        return self._posicao
+
+    def readinto(self, buffer):
+        n = min(len(buffer), self._tamanho - self._posicao)
+        if n <= 0:
+            return 0
+        self._f.seek(self._inicio + self._posicao)
+        lidos = self._f.readinto(memoryview(buffer)[:n])
+        if not lidos:
+            raise EOFError("Contêiner truncado")
+        self._posicao += lidos
+        return lidos
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+# --------------------------- FOLHAS DE CONTATO ---------------------------
+
+
+def _inicializar_trabalhador_baixa_prioridade():
+    # Processos auxiliares podem ser rebaixados por inteiro sem afetar a interface
+    if hasattr(os, 'nice'):
+        try:
+            os.nice(10)
+        except OSError:
+            pass
+    reduzir_prioridade_thread(incremento_nice=0)
+
+
+def _tile_folha_contato(args):
+    caminho, tamanho = args
+    img = carregar_thumbnail(caminho, tamanho)
+    if img is None:
+        return None
+    return img.size, img.tobytes()
+
+
+def _fotos_para_folha(pasta_fotos):
+    # RAW+JPEG da mesma foto viram um único quadro, preferindo o JPEG
+    por_nome = {}
+    for nome in sorted(os.listdir(pasta_fotos)):
+        if tipo_arquivo(os.path.join(pasta_fotos, nome)) != 'FOTOS':
+            continue
+        base, ext = os.path.splitext(nome)
+        if base.upper() not in por_nome or ext.upper() in ('.JPG', '.JPEG'):
+            por_nome[base.upper()] = os.path.join(pasta_fotos, nome)
+    return sorted(por_nome.values())
+
+
+def gerar_folhas_contato(pasta_fotos, pasta_saida, titulo, pool, colunas=6, linhas=8, lado=300, gerar_pdf=True,
+                         progresso=None, cancelado=None):
+    """Monta folhas de contato (JPEG por página e um PDF) com as fotos de `pasta_fotos`.
+
+    A decodificação roda no `pool` de processos, uma página por vez, e cada quadro é
+    colado assim que chega: só as miniaturas da página atual ficam em memória.
+    Com o evento `cancelado` ligado, para antes da próxima página, sem gerar o PDF.
+    Retorna a lista de arquivos gerados.
+    """
+    fotos = _fotos_para_folha(pasta_fotos)
+    if not fotos:
+        return []
+    os.makedirs(pasta_saida, exist_ok=True)
+
+    margem, legenda, cabecalho = 16, 16, 44
+    largura = colunas * (lado + margem) + margem
+    altura = cabecalho + linhas * (lado + legenda + margem) + margem
+    por_pagina = colunas * linhas
+    total_paginas = -(-len(fotos) // por_pagina)
+    gerados = []
+    caminho_pdf = os.path.join(pasta_saida, f"{titulo}_folha_contato.pdf")
+    pdf_tmp = caminho_pdf + '.tmp'
+    # Sobra de uma execução interrompida não pode virar as primeiras páginas deste PDF
+    if os.path.exists(pdf_tmp):
+        os.remove(pdf_tmp)
+    pdf_iniciado = False
+
+    for pagina, inicio in enumerate(range(0, len(fotos), por_pagina), 1):
+        if cancelado is not None and cancelado.is_set():
+            if pdf_iniciado:
+                os.remove(pdf_tmp)
+            return gerados
+        lote = fotos[inicio:inicio + por_pagina]
+        folha = Image.new('RGB', (largura, altura), 'white')
+        desenho = ImageDraw.Draw(folha)
+        desenho.text((margem, margem), f"{titulo}  •  {len(fotos)} fotos  •  página {pagina}/{total_paginas}",
+                     fill='black')
+
+        tarefas = [(caminho, (lado, lado)) for caminho in lote]
+        for i, (caminho, resultado) in enumerate(zip(lote, pool.map(_tile_folha_contato, tarefas, chunksize=4))):
+            x = margem + (i % colunas) * (lado + margem)
+            y = cabecalho + (i // colunas) * (lado + legenda + margem)
+            if resultado is None:
+                desenho.rectangle([x, y, x + lado, y + lado], fill='#d0d0d0')
+                desenho.text((x + 8, y + lado // 2), "sem preview", fill='black')
+            else:
+                tamanho, dados = resultado
+                tile = Image.frombytes('RGB', tamanho, dados)
+                folha.paste(tile, (x + (lado - tamanho[0]) //
+                            2, y + (lado - tamanho[1]) // 2))
+            desenho.text((x, y + lado + 2),
+                         os.path.basename(caminho)[:40], fill='black')
+            if progresso:
+                progresso(inicio + i + 1, len(fotos))
+
+        caminho_jpg = os.path.join(
+            pasta_saida, f"{titulo}_folha_{pagina:02d}.jpg")
+        folha.save(caminho_jpg, 'JPEG', quality=85)
+        gerados.append(caminho_jpg)
+        if gerar_pdf:
+            folha.save(pdf_tmp, 'PDF', resolution=150.0, append=pdf_iniciado)
+            pdf_iniciado = True
+
+    if gerar_pdf:
+        os.replace(pdf_tmp, caminho_pdf)
+        gerados.append(caminho_pdf)
+    return gerados
+
+
+def gerar_folhas_contato_por_data(mapa_datas, atualizar, diario, cancelado=None):
+    """`atualizar(percentual, info, detalhe)` recebe o andamento de cada data; o evento
+    `cancelado` interrompe entre uma página e outra."""
+    if not PIL_AVAILABLE:
+        diario.mensagem("⚠️ Folhas de contato não geradas: instale o Pillow.")
+        return
+    atualizar(
+        100, "Gerando folhas de contato...", "\n🖼️ Gerando folhas de contato por data")
+    trabalhadores = max(1, min(4, (os.cpu_count() or 2) - 1))
+    with ProcessPoolExecutor(max_workers=trabalhadores, initializer=_inicializar_trabalhador_baixa_prioridade) as pool:
+        for data, dados in mapa_datas.items():
+            if cancelado is not None and cancelado.is_set():
+                break
+            pasta_fotos = os.path.join(dados['pasta'], 'FOTOS')
+            if not os.path.isdir(pasta_fotos):
+                continue
+
+            def _progresso(feitos, total, data=data):
+                atualizar((feitos / total) * 100,
+                          f"Folha de contato {formatar_data_br(data)}: {feitos}/{total}", None)
+            try:
+                gerados = gerar_folhas_contato(pasta_fotos, os.path.join(dados['pasta'], 'PROVAS'), data, pool,
+                                               progresso=_progresso, cancelado=cancelado)
+                status = f"🖼️ Folha de contato {formatar_data_br(data)}: {len(gerados)} arquivo(s) em PROVAS"
+            except Exception as e:
+                status = f"❌ Erro na folha de contato de {formatar_data_br(data)}: {e}"
+            atualizar(100, "Gerando folhas de contato...", status)
+            diario.mensagem(status, data=data)
+
+# --------------------------- PRÉVIAS DE RAW ---------------------------
+
+
+EXTENSOES_RAW = ('.ARW', '.CR2', '.CR3', '.NEF', '.DNG',
+                 '.RAF', '.ORF', '.RW2', '.PEF', '.RAW')
+PASTA_PREVIAS = 'PREVIEWS'
+# Menor número sai primeiro: RAW recém-copiados antes dos encontrados na varredura final
+PRIORIDADE_COPIA, PRIORIDADE_PENDENTE, PRIORIDADE_FIM = 1, 2, 9
+# Tipos TIFF com valores inteiros: tipo -> (bytes, formato struct)
+TIPOS_INTEIROS_TIFF = {1: (1, 'B'), 3: (2, 'H'), 4: (4, 'I'), 13: (4, 'I')}
+
+
+def _ler_ifd(f, ordem, offset, base=0):
+    """Entradas de um IFD TIFF: ({tag: (tipo, contagem, valor bruto)}, offset do próximo IFD)."""
+    f.seek(base + offset)
+    bruto = f.read(2)
+    if len(bruto) < 2:
+        return {}, 0
+    quantidade = struct.unpack(ordem + 'H', bruto)[0]
+    dados = f.read(12 * quantidade + 4)
+    if quantidade > 1000 or len(dados) < 12 * quantidade + 4:
+        return {}, 0
+    tags = {}
+    for i in range(quantidade):
+        tag, tipo, contagem = struct.unpack(
+            ordem + 'HHI', dados[12 * i:12 * i + 8])
+        tags[tag] = (tipo, contagem, dados[12 * i + 8:12 * i + 12])
+    return tags, struct.unpack(ordem + 'I', dados[12 * quantidade:])[0]
+
+
+def _valores_tiff(f, ordem, tipo, contagem, bruto, base=0):
+    if tipo not in TIPOS_INTEIROS_TIFF or not 0 < contagem <= 1024:
+        return []
+    tamanho, formato = TIPOS_INTEIROS_TIFF[tipo]
+    total = tamanho * contagem
+    if total <= 4:
+        dados = bruto[:total]
+    else:
+        f.seek(base + struct.unpack(ordem + 'I', bruto)[0])
+        dados = f.read(total)
+    if len(dados) != total:
+        return []
+    return list(struct.unpack(f"{ordem}{contagem}{formato}", dados))
+
+
+def _previas_tiff(f):
+    """(offset, tamanho) dos JPEG embutidos em RAW baseados em TIFF (ARW/CR2/NEF/DNG/ORF/RW2/PEF).
+
+    Percorre a cadeia de IFDs e as SubIFDs (0x14A): JPEGInterchangeFormat (0x201/0x202),
+    tiras únicas de IFDs reduzidas em JPEG (DNG) e o JpgFromRaw do RW2 (0x2E).
+    """
+    f.seek(0)
+    cabecalho = f.read(8)
+    ordem = '<' if cabecalho[:2] == b'II' else '>'
+    candidatos, pendentes, vistos = [], [struct.unpack(ordem + 'I', cabecalho[4:8])[0]], set()
+    while pendentes and len(vistos) < 64:
+        ifd = pendentes.pop()
+        if not ifd or ifd in vistos:
+            continue
+        vistos.add(ifd)
+        tags, proximo = _ler_ifd(f, ordem, ifd)
+        pendentes.append(proximo)
+
+        def valores(tag):
+            return _valores_tiff(f, ordem, *tags[tag]) if tag in tags else []
+
+        pendentes.extend(valores(0x14A))
+        inicio, comprimento = valores(0x201), valores(0x202)
+        if inicio and comprimento:
+            candidatos.append((inicio[0], comprimento[0]))
+        reduzida = valores(0xFE)[:1] == [1] and valores(0x103)[:1] in ([6], [7])
+        tiras, tamanhos = valores(0x111), valores(0x117)
+        if reduzida and len(tiras) == 1 and len(tamanhos) == 1:
+            candidatos.append((tiras[0], tamanhos[0]))
+        if 0x2E in tags and tags[0x2E][0] == 7:
+            candidatos.append((struct.unpack(ordem + 'I', tags[0x2E][2])[0], tags[0x2E][1]))
+    return candidatos
+
+
+def _caixas_bmff(f, inicio, fim):
+    posicao = inicio
+    while posicao + 8 <= fim:
+        f.seek(posicao)
+        cabecalho = f.read(16)
+        if len(cabecalho) < 8:
+            return
+        tamanho, tipo = struct.unpack('>I4s', cabecalho[:8])
+        inicio_dados = posicao + 8
+        if tamanho == 1:
+            tamanho, inicio_dados = struct.unpack(
+                '>Q', cabecalho[8:16])[0], posicao + 16
+        elif tamanho == 0:
+            tamanho = fim - posicao
+        if tamanho < inicio_dados - posicao:
+            return
+        yield tipo, inicio_dados, posicao + tamanho
+        posicao += tamanho
+
+
+def _caixa_bmff(f, inicio, fim, *caminho):
+    for tipo_procurado in caminho:
+        for tipo, inicio_dados, fim_caixa in _caixas_bmff(f, inicio, fim):
+            if tipo == tipo_procurado:
+                inicio, fim = inicio_dados, fim_caixa
+                break
+        else:
+            return None
+    return inicio, fim
+
+
+def _previas_cr3(f, tamanho_arquivo):
+    """No CR3 a primeira trilha do moov é o JPEG em resolução total: stco/co64 + stsz."""
+    stbl = _caixa_bmff(f, 0, tamanho_arquivo, b'moov', b'trak',
+                       b'mdia', b'minf', b'stbl')
+    if stbl is None:
+        return []
+    stsz = _caixa_bmff(f, *stbl, b'stsz')
+    stco, co64 = _caixa_bmff(f, *stbl, b'stco'), _caixa_bmff(f, *stbl, b'co64')
+    if stsz is None or (stco is None and co64 is None):
+        return []
+    f.seek(stsz[0] + 4)
+    tamanho_fixo, quantidade = struct.unpack('>II', f.read(8))
+    tamanho = tamanho_fixo or (struct.unpack('>I', f.read(4))[0] if quantidade else 0)
+    if stco is not None:
+        f.seek(stco[0] + 8)
+        offset = struct.unpack('>I', f.read(4))[0]
+    else:
+        f.seek(co64[0] + 8)
+        offset = struct.unpack('>Q', f.read(8))[0]
+    return [(offset, tamanho)]
+
+
+def _previas_raf(f):
+    # Cabeçalho RAF: offset e tamanho do JPEG em big endian nos bytes 84..91
+    f.seek(84)
+    return [struct.unpack('>II', f.read(8))]
+
+
+def extrair_previa_raw(caminho):
+    """Bytes da maior prévia JPEG embutida no RAW, ou None se não houver."""
+    with open(caminho, 'rb') as f:
+        tamanho_arquivo = os.fstat(f.fileno()).st_size
+        cabecalho = f.read(16)
+        try:
+            if cabecalho.startswith(b'FUJIFILMCCD-RAW'):
+                candidatos = _previas_raf(f)
+            elif cabecalho[4:8] == b'ftyp':
+                candidatos = _previas_cr3(f, tamanho_arquivo)
+            elif cabecalho[:2] in (b'II', b'MM'):
+                candidatos = _previas_tiff(f)
+            else:
+                return None
+        except struct.error:
+            return None  # estrutura truncada ou fora do padrão
+        for offset, comprimento in sorted(candidatos, key=lambda c: c[1], reverse=True):
+            if 0 < comprimento and offset + comprimento <= tamanho_arquivo:
+                f.seek(offset)
+                dados = f.read(comprimento)
+                if dados[:3] == b'\xff\xd8\xff':
+                    return dados
+    return None
+
+
+def caminho_previa(raw, pasta_previas):
+    # Mantém a extensão: DSC0001.ARW e DSC0001.DNG não podem disputar o mesmo DSC0001.jpg
+    return os.path.join(pasta_previas, os.path.basename(raw) + '.jpg')
+
+
+def gerar_previa(raw, destino):
+    """Grava a prévia embutida de `raw` em `destino`. Roda nos processos auxiliares."""
+    dados = extrair_previa_raw(raw)
+    if dados is None:
+        return False
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporario = destino + '.tmp'
+    with open(temporario, 'wb') as f:
+        f.write(dados)
+    os.replace(temporario, destino)
+    st = os.stat(raw)
+    os.utime(destino, ns=(st.st_atime_ns, st.st_mtime_ns))
+    return True
+
+
+class GeradorPrevias:
+    """Extrai em segundo plano as prévias JPEG dos RAW já copiados.
+
+    A cópia enfileira cada RAW numa fila de prioridade limitada, sem nunca bloquear:
+    com a fila cheia o arquivo fica para a varredura final de `concluir`. Uma thread
+    despacha para processos de baixa prioridade, com um só trabalho em voo enquanto
+    a cópia está ativa. Prévias que já existem são puladas.
+    """
+
+    def __init__(self, trabalhadores=None, tamanho_fila=64):
+        self.trabalhadores = trabalhadores or max(
+            1, min(4, (os.cpu_count() or 2) - 1))
+        self.fila = queue.PriorityQueue(maxsize=tamanho_fila)
+        self.copiando = threading.Event()
+        self.copiando.set()
+        self.cancelado = threading.Event()
+        self.geradas, self.existentes, self.sem_previa, self.erros = 0, 0, 0, []
+        self._seq = 0
+        self._vistos = set()
+        self._pool = ProcessPoolExecutor(max_workers=self.trabalhadores,
+                                         initializer=_inicializar_trabalhador_baixa_prioridade)
+        self._despachante = threading.Thread(
+            target=self._despachar, daemon=True)
+        self._despachante.start()
+
+    def enfileirar(self, raw, pasta_previas, prioridade=PRIORIDADE_COPIA, bloquear=False):
+        if raw in self._vistos:
+            return True
+        self._seq += 1
+        try:
+            self.fila.put((prioridade, self._seq, raw,
+                          caminho_previa(raw, pasta_previas)), block=bloquear)
+        except queue.Full:
+            return False
+        self._vistos.add(raw)
+        return True
+
+    def _registrar(self, raw, futuro):
+        try:
+            if futuro.result():
+                self.geradas += 1
+            else:
+                self.sem_previa += 1
+        except Exception as e:
+            self.erros.append((raw, e))
+
+    def _despachar(self):
+        em_voo = {}
+        while True:
+            _, _, raw, destino = self.fila.get()
+            if raw is None:
+                break
+            if self.cancelado.is_set():
+                continue
+            if os.path.exists(destino):
+                self.existentes += 1
+                continue
+            while len(em_voo) >= (1 if self.copiando.is_set() else self.trabalhadores):
+                feitos, _ = wait(em_voo, return_when=FIRST_COMPLETED)
+                for futuro in feitos:
+                    self._registrar(em_voo.pop(futuro), futuro)
+            em_voo[self._pool.submit(gerar_previa, raw, destino)] = raw
+        for futuro in as_completed(em_voo):
+            self._registrar(em_voo[futuro], futuro)
+
+    def concluir(self, pastas_data):
+        """Libera todos os processos, enfileira os RAW que ficaram sem prévia e espera o fim."""
+        self.copiando.clear()
+        for pasta in pastas_data:
+            if self.cancelado.is_set():
+                break
+            try:
+                with os.scandir(os.path.join(pasta, 'FOTOS')) as entradas:
+                    raws = sorted(e.path for e in entradas
+                                  if os.path.splitext(e.name)[1].upper() in EXTENSOES_RAW)
+            except OSError:
+                continue
+            for raw in raws:
+                if self.cancelado.is_set():
+                    break
+                self.enfileirar(raw, os.path.join(pasta, PASTA_PREVIAS),
+                                PRIORIDADE_PENDENTE, bloquear=True)
+        self.fila.put((PRIORIDADE_FIM, self._seq + 1, None, None))
+        self._despachante.join()
+        self._pool.shutdown()
+
+    def cancelar(self):
+        """Descarta os RAW ainda na fila e espera só as prévias já em andamento."""
+        self.cancelado.set()
+        self.copiando.clear()
+        while True:
+            try:
+                self.fila.get_nowait()
+            except queue.Empty:
+                break
+        self.fila.put((PRIORIDADE_FIM, self._seq + 1, None, None))
+        self._despachante.join()
+        self._pool.shutdown()
+
+
+# --------------------------- CATÁLOGO DE METADADOS ---------------------------
+
+
+ARQUIVO_CATALOGO = os.path.join(PASTA_CONFIG, 'catalogo.sqlite3')
+LOTE_CATALOGO = 500
+# Segundos entre 1904-01-01 (época do MP4/QuickTime) e 1970-01-01
+EPOCA_MP4 = 2082844800
+UUID_CANON_CR3 = bytes.fromhex('85c0b687820f11e08111f4ce462b6a48')
+CAMPOS_CATALOGO = ('destino', 'origem', 'nome_original', 'tipo', 'tamanho', 'captura', 'camera', 'lente',
+                   'iso', 'largura', 'altura', 'duracao', 'algoritmo', 'hash', 'backup_em')
+
+
+def _texto_tiff(f, ordem, tipo, contagem, bruto, base=0):
+    if tipo != 2 or not 0 < contagem <= 256:
+        return None
+    if contagem <= 4:
+        dados = bruto[:contagem]
+    else:
+        f.seek(base + struct.unpack(ordem + 'I', bruto)[0])
+        dados = f.read(contagem)
+    return dados.split(b'\0')[0].decode('utf-8', 'replace').strip() or None
+
+
+def _metadados_tiff(f, base, dados, primeiro_e_exif=False):
+    """Câmera, lente, data, ISO e dimensões de um bloco TIFF/EXIF que começa em `base`."""
+    f.seek(base)
+    cabecalho = f.read(8)
+    if cabecalho[:2] not in (b'II', b'MM'):
+        return dados
+    ordem = '<' if cabecalho[:2] == b'II' else '>'
+    primeiro, _ = _ler_ifd(f, ordem, struct.unpack(
+        ordem + 'I', cabecalho[4:8])[0], base)
+
+    def valores(tags, tag):
+        return _valores_tiff(f, ordem, *tags[tag], base=base) if tag in tags else []
+
+    def texto(tags, tag):
+        return _texto_tiff(f, ordem, *tags[tag], base=base) if tag in tags else None
+
+    if primeiro_e_exif:
+        ifd0, exif = {}, primeiro
+    else:
+        ifd0 = primeiro
+        deslocamento = valores(ifd0, 0x8769)
+        exif = _ler_ifd(f, ordem, deslocamento[0], base)[
+            0] if deslocamento else {}
+
+    marca, modelo = texto(ifd0, 0x10F), texto(ifd0, 0x110)
+    if modelo:
+        # Vários fabricantes já repetem a marca no modelo ("Canon EOS R5")
+        dados['camera'] = modelo if not marca or modelo.lower().startswith(
+            marca.split()[0].lower()) else f"{marca} {modelo}"
+    captura = texto(exif, 0x9003) or texto(ifd0, 0x132)
+    if captura:
+        try:
+            dados['captura'] = datetime.strptime(
+                captura[:19], '%Y:%m:%d %H:%M:%S').isoformat()
+        except ValueError:
+            pass
+    if texto(exif, 0xA434):
+        dados['lente'] = texto(exif, 0xA434)
+    for chave, tag in (('iso', 0x8827), ('largura', 0xA002), ('altura', 0xA003)):
+        valor = valores(exif, tag)
+        if valor and valor[0]:
+            dados[chave] = valor[0]
+    return dados
+
+
+def _metadados_jpeg(f, dados, inicio=0):
+    """Percorre os marcadores até o SOS: EXIF do APP1 e dimensões do SOF."""
+    posicao = inicio + 2
+    while True:
+        f.seek(posicao)
+        marcador = f.read(4)
+        if len(marcador) < 4 or marcador[0] != 0xFF or marcador[1] == 0xDA:
+            return dados
+        tamanho = struct.unpack('>H', marcador[2:])[0]
+        if marcador[1] == 0xE1 and 'captura' not in dados and f.read(6) == b'Exif\0\0':
+            _metadados_tiff(f, posicao + 10, dados)
+        elif 0xC0 <= marcador[1] <= 0xCF and marcador[1] not in (0xC4, 0xC8, 0xCC):
+            f.seek(posicao + 5)
+            altura, largura = struct.unpack('>HH', f.read(4))
+            dados.setdefault('largura', largura)
+            dados.setdefault('altura', altura)
+        posicao += 2 + tamanho
+
+
+def _metadados_cr3(f, tamanho_arquivo, dados):
+    # moov/uuid da Canon: CMT1 é o IFD0 e CMT2 o IFD EXIF, cada um com cabeçalho TIFF
+    for tipo, inicio, fim in _caixas_bmff(f, *_caixa_bmff(f, 0, tamanho_arquivo, b'moov')):
+        f.seek(inicio)
+        if tipo == b'uuid' and f.read(16) == UUID_CANON_CR3:
+            caixas = {t: i for t, i, _ in _caixas_bmff(f, inicio + 16, fim)}
+            if b'CMT1' in caixas:
+                _metadados_tiff(f, caixas[b'CMT1'], dados)
+            if b'CMT2' in caixas:
+                _metadados_tiff(f, caixas[b'CMT2'],
+                                dados, primeiro_e_exif=True)
+            break
+    return dados
+
+
+def _metadados_video(f, tamanho_arquivo, dados):
+    """Duração e data do mvhd e dimensões do primeiro tkhd com imagem (MP4/MOV)."""
+    moov = _caixa_bmff(f, 0, tamanho_arquivo, b'moov')
+    if moov is None:
+        return dados
+    for tipo, inicio, fim in _caixas_bmff(f, *moov):
+        f.seek(inicio)
+        if tipo == b'mvhd':
+            versao = f.read(4)[0]
+            if versao == 1:
+                criacao, _, escala, duracao = struct.unpack(
+                    '>QQIQ', f.read(28))
+            else:
+                criacao, _, escala, duracao = struct.unpack(
+                    '>IIII', f.read(16))
+            if escala:
+                dados['duracao'] = round(duracao / escala, 3)
+            if criacao > EPOCA_MP4:
+                dados['captura'] = datetime.fromtimestamp(
+                    criacao - EPOCA_MP4).isoformat()
+        elif tipo == b'trak' and 'largura' not in dados:
+            tkhd = _caixa_bmff(f, inicio, fim, b'tkhd')
+            if tkhd:
+                f.seek(tkhd[1] - 8)
+                largura, altura = struct.unpack('>II', f.read(8))
+                if largura and altura:
+                    dados['largura'], dados['altura'] = largura >> 16, altura >> 16
+    return dados
+
+
+def ler_metadados(caminho):
+    """Captura, câmera, lente, ISO, dimensões e duração lidos só dos cabeçalhos.
+
+    Cobre JPEG, RAW baseados em TIFF, CR3, RAF e MP4/MOV; campos não encontrados
+    ficam de fora do dicionário.
+    """
+    dados = {}
+    try:
+        with open(caminho, 'rb') as f:
+            tamanho_arquivo = os.fstat(f.fileno()).st_size
+            cabecalho = f.read(16)
+            if cabecalho[:3] == b'\xff\xd8\xff':
+                _metadados_jpeg(f, dados)
+            elif cabecalho.startswith(b'FUJIFILMCCD-RAW'):
+                # O EXIF do RAF está no JPEG embutido
+                (inicio, _), = _previas_raf(f)
+                _metadados_jpeg(f, dados, inicio)
+            elif cabecalho[4:8] == b'ftyp' and cabecalho[8:12] == b'crx ':
+                _metadados_cr3(f, tamanho_arquivo, dados)
+            elif cabecalho[4:8] == b'ftyp' or cabecalho[4:8] in (b'moov', b'mdat', b'wide', b'free'):
+                _metadados_video(f, tamanho_arquivo, dados)
+            elif cabecalho[:2] in (b'II', b'MM'):
+                _metadados_tiff(f, 0, dados)
+    except (OSError, struct.error, ValueError, TypeError, IndexError):
+        pass  # cabeçalho truncado ou fora do padrão: fica só o que já foi lido
+    return dados
+
+
+def ler_data_usuario(texto):
+    """Converte dd/mm/aaaa ou aaaa-mm-dd em aaaa-mm-dd (ValueError se inválida)."""
+    for formato in ('%d/%m/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(texto.strip(), formato).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    raise ValueError(f"Data inválida: {texto}")
+
+
+class CatalogoMetadados:
+    """Catálogo SQLite de todos os arquivos já copiados, com índices para busca.
+
+    A conexão aceita outras threads, mas não uso simultâneo: cada instância deve ser
+    usada por uma thread de cada vez (no `ingest`, as chamadas ao executor são em
+    sequência). Trabalhos simultâneos abrem instâncias próprias.
+    """
+
+    def __init__(self, caminho=ARQUIVO_CATALOGO):
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self.caminho = caminho
+        self.conexao = sqlite3.connect(caminho, timeout=10, check_same_thread=False)
+        self.conexao.row_factory = sqlite3.Row
+        self.conexao.execute("PRAGMA journal_mode=WAL")
+        self.conexao.executescript("""
+            CREATE TABLE IF NOT EXISTS arquivos (
+                id INTEGER PRIMARY KEY,
+                destino TEXT UNIQUE NOT NULL,
+                origem TEXT, nome_original TEXT, tipo TEXT, tamanho INTEGER,
+                captura TEXT, camera TEXT, lente TEXT, iso INTEGER,
+                largura INTEGER, altura INTEGER, duracao REAL,
+                algoritmo TEXT, hash TEXT, backup_em TEXT);
+            CREATE INDEX IF NOT EXISTS idx_arquivos_captura ON arquivos(captura);
+            CREATE INDEX IF NOT EXISTS idx_arquivos_camera ON arquivos(camera, captura);
+            CREATE INDEX IF NOT EXISTS idx_arquivos_lente ON arquivos(lente, captura);
+            CREATE INDEX IF NOT EXISTS idx_arquivos_hash ON arquivos(hash);
+        """)
+
+    def registrar(self, entradas):
+        """Insere ou atualiza pelo destino; um hash ausente não apaga o já conhecido."""
+        if not entradas:
+            return
+        colunas = ", ".join(CAMPOS_CATALOGO)
+        atualizacoes = ", ".join(f"{c} = excluded.{c}" for c in CAMPOS_CATALOGO
+                                 if c not in ('destino', 'algoritmo', 'hash'))
+        with self.conexao:
+            self.conexao.executemany(
+                f"INSERT INTO arquivos ({colunas}) VALUES ({', '.join('?' * len(CAMPOS_CATALOGO))}) "
+                f"ON CONFLICT(destino) DO UPDATE SET {atualizacoes}, "
+                "algoritmo = COALESCE(excluded.algoritmo, arquivos.algoritmo), "
+                "hash = COALESCE(excluded.hash, arquivos.hash)",
+                [tuple(e.get(c) for c in CAMPOS_CATALOGO) for e in entradas])
+
+    def buscar(self, camera=None, lente=None, de=None, ate=None, texto=None, tipo=None, limite=1000):
+        """Busca por trechos de câmera/lente/nome, pasta de tipo e intervalo de captura (aaaa-mm-dd)."""
+        condicoes, parametros = [], []
+        for coluna, valor in (('camera', camera), ('lente', lente)):
+            if valor:
+                condicoes.append(f"{coluna} LIKE ?")
+                parametros.append(f"%{valor}%")
+        if de:
+            condicoes.append("captura >= ?")
+            parametros.append(de)
+        if ate:
+            condicoes.append("captura <= ?")
+            parametros.append(ate + "T23:59:59")
+        if texto:
+            condicoes.append("(nome_original LIKE ? OR destino LIKE ?)")
+            parametros += [f"%{texto}%"] * 2
+        if tipo:
+            condicoes.append("tipo = ?")
+            parametros.append(tipo)
+        sql = "SELECT * FROM arquivos"
+        if condicoes:
+            sql += " WHERE " + " AND ".join(condicoes)
+        sql += " ORDER BY captura LIMIT ?"
+        return [dict(linha) for linha in self.conexao.execute(sql, parametros + [limite])]
+
+    def fechar(self):
+        self.conexao.close()
+
+
+def entrada_catalogo(arquivo, destino, tipo, metadados, hash_hex=None, algoritmo=None, tamanho=None):
+    entrada = {'destino': destino, 'origem': arquivo, 'nome_original': os.path.basename(arquivo),
+               'tipo': tipo, 'tamanho': tamanho, 'algoritmo': algoritmo if hash_hex else None,
+               'hash': hash_hex, 'backup_em': datetime.now().isoformat(timespec='seconds')}
+    entrada.update(metadados)
+    try:
+        if entrada['tamanho'] is None:
+            entrada['tamanho'] = os.path.getsize(arquivo)
+        if not entrada.get('captura'):
+            entrada['captura'] = datetime.fromtimestamp(
+                os.path.getmtime(arquivo)).isoformat()
+    except OSError:
+        pass
+    return entrada
+
+
+# --------------------------- DIÁRIO DO BACKUP ---------------------------
+
+
+MAX_LINHAS_LOG = 2000
+REGISTROS_POR_PAGINA = 200
+
+# Rótulo do filtro da aba de Log -> níveis aceitos (None = todos)
+FILTROS_NIVEL = {
+    "Todos": None,
+    "Somente erros": ('erro',),
+    "Erros e avisos": ('erro', 'aviso'),
+    "Ignorados": ('ignorado',),
+}
+
+
+def _nivel_status(status):
+    if status.startswith('❌'):
+        return 'erro'
+    if status.startswith('⚠️'):
+        return 'aviso'
+    if status.startswith('⏭️'):
+        return 'ignorado'
+    return 'ok'
+
+
+class DiarioBackup:
+    """Diário do backup em JSONL, gravado registro a registro durante a cópia.
+
+    Cada linha é um objeto com `seq`, `hora`, `evento` e `nivel`; uma queda no
+    meio do backup perde no máximo a linha que estava sendo escrita.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.seq = 0
+        self._arquivo = open(caminho, 'a', encoding='utf-8', buffering=1)
+
+    def registrar(self, evento, **campos):
+        self.seq += 1
+        registro = {'seq': self.seq, 'hora': datetime.now().strftime('%H:%M:%S'),
+                    'evento': evento, **campos}
+        self._arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        return registro
+
+    def arquivo(self, data, origem, tipo, destino, status, **extras):
+        return self.registrar('arquivo', data=data, origem=origem, tipo=tipo, destino=destino,
+                              status=status, nivel=_nivel_status(status), **extras)
+
+    def mensagem(self, texto, data=None):
+        return self.registrar('mensagem', data=data, texto=texto, nivel=_nivel_status(texto))
+
+    def fechar(self):
+        if not self._arquivo.closed:
+            self._arquivo.close()
+
+
+def ler_diario(caminho):
+    """Itera os registros do diário; ignora uma última linha truncada por queda."""
+    with open(caminho, encoding='utf-8') as f:
+        for linha in f:
+            try:
+                yield json.loads(linha)
+            except ValueError:
+                continue
+
+
+def _linha_diario(registro):
+    if registro.get('evento') == 'arquivo':
+        linhas = [f"{os.path.basename(registro['origem'])} -> {registro['tipo']} -> "
+                  f"{registro['destino']}: {registro['status']}"]
+        for inicio, fim in registro.get('regioes_ilegiveis') or []:
+            linhas.append(
+                f"    ↳ Região ilegível: bytes {inicio}-{fim - 1} ({formatar_tamanho(fim - inicio)})")
+        return "\n".join(linhas)
+    if registro.get('evento') == 'mensagem':
+        return registro['texto']
+    return None
+
+
+def renderizar_log_texto(caminho_diario, caminho_txt, cabecalho):
+    """Gera o log legível (.txt) a partir do diário.
+
+    Registros com `ordem` (um por arquivo do plano) saem na ordem cronológica do
+    plano, qualquer que tenha sido a ordem de execução; os demais vêm depois, na
+    ordem em que foram gravados. Só (chave, offset) de cada linha fica na memória.
+    """
+    indice = []
+    with open(caminho_diario, 'rb') as f:
+        offset = 0
+        for posicao, linha in enumerate(f):
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                registro = None
+            if registro is not None and _linha_diario(registro) is not None:
+                ordem = registro.get('ordem')
+                indice.append(
+                    ((0, ordem) if ordem is not None else (1, posicao), offset))
+            offset += len(linha)
+        indice.sort()
+
+        with open(caminho_txt, 'w', encoding='utf-8') as saida:
+            saida.write(cabecalho)
+            for _, offset in indice:
+                f.seek(offset)
+                saida.write(_linha_diario(json.loads(f.readline())) + "\n")
+
+
+class LeitorDiario:
+    """Leitura paginada e filtrada de um diário, sem carregar o arquivo inteiro.
+
+    Guarda o deslocamento em que começa cada página já visitada (por filtro),
+    então ir e voltar entre páginas lê só o trecho necessário.
+    """
+
+    def __init__(self, caminho, por_pagina=REGISTROS_POR_PAGINA):
+        self.caminho = caminho
+        self.por_pagina = por_pagina
+        self._inicios = {}
+
+    @staticmethod
+    def _aceita(registro, filtro):
+        if registro.get('evento') not in ('arquivo', 'mensagem'):
+            return False
+        if filtro.get('niveis') and registro.get('nivel') not in filtro['niveis']:
+            return False
+        if filtro.get('data') and registro.get('data') != filtro['data']:
+            return False
+        if filtro.get('tipo') and registro.get('tipo') != filtro['tipo']:
+            return False
+        if filtro.get('texto'):
+            campos = (registro.get(c) or '' for c in ('origem', 'destino', 'status', 'texto'))
+            return filtro['texto'].lower() in " ".join(campos).lower()
+        return True
+
+    def _ler_pagina(self, f, filtro):
+        registros = []
+        while len(registros) < self.por_pagina:
+            linha = f.readline()
+            if not linha.endswith(b"\n"):
+                return registros, True  # fim do arquivo (ou linha ainda sendo gravada)
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                continue
+            if self._aceita(registro, filtro):
+                registros.append(registro)
+        return registros, False
+
+    def pagina(self, numero, filtro=None):
+        """Retorna (número da página, registros, há mais páginas).
+
+        Se `numero` passar do fim, devolve a última página existente.
+        """
+        filtro = filtro or {}
+        inicios = self._inicios.setdefault(json.dumps(filtro, sort_keys=True), [0])
+        atual = min(numero, len(inicios) - 1)
+        with open(self.caminho, 'rb') as f:
+            f.seek(inicios[atual])
+            while True:
+                registros, fim = self._ler_pagina(f, filtro)
+                if not fim and len(inicios) == atual + 1:
+                    inicios.append(f.tell())
+                if atual == numero or fim:
+                    if fim and not registros and atual > 0:
+                        # Página vazia após um múltiplo exato de por_pagina
+                        anterior, registros, _ = self.pagina(atual - 1, filtro)
+                        return anterior, registros, False
+                    return atual, registros, not fim
+                atual += 1
+
+
+# --------------------------- MÉTRICAS E STATUS HTTP ---------------------------
+
+
+PORTA_METRICAS_PADRAO = 9478
+
+
+def endereco_metricas():
+    """(host, porta) do endpoint; BACKUP_CARTAO_METRICAS aceita "porta" ou "host:porta"."""
+    valor = os.environ.get('BACKUP_CARTAO_METRICAS', '').strip()
+    host, _, porta = valor.rpartition(':')
+    try:
+        return host or '127.0.0.1', int(porta) if porta else PORTA_METRICAS_PADRAO
+    except ValueError:
+        return '127.0.0.1', PORTA_METRICAS_PADRAO
+
+
+class MetricasIngest:
+    """Estado vivo do ingest para o endpoint HTTP.
+
+    A cópia só soma contadores sob um lock curto; vazão, ETA e tempos por fase são
+    calculados na leitura, por quem consulta o endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self, operacao='ocioso', bytes_total=0, arquivos_total=0):
+        with self._lock:
+            self.operacao, self.estado = operacao, 'executando' if operacao != 'ocioso' else 'ocioso'
+            self.inicio, self.fim = time.time(), None
+            self.bytes_total, self.arquivos_total = bytes_total, arquivos_total
+            self.bytes_feitos = self.arquivos_feitos = self.erros = self.ignorados = 0
+            self.fase, self._inicio_fase, self.fases = None, None, {}
+            self._filas = {}
+
+    def _fechar_fase(self, agora):
+        if self.fase is not None:
+            self.fases[self.fase] = self.fases.get(
+                self.fase, 0) + agora - self._inicio_fase
+
+    def iniciar_fase(self, nome):
+        with self._lock:
+            agora = time.time()
+            self._fechar_fase(agora)
+            self.fase, self._inicio_fase = nome, agora
+
+    def definir_fila(self, nome, profundidade):
+        """`profundidade` é chamada só na leitura (ex.: fila.qsize)."""
+        with self._lock:
+            self._filas[nome] = profundidade
+
+    def arquivo_concluido(self, tamanho, status):
+        nivel = _nivel_status(status)
+        with self._lock:
+            self.arquivos_feitos += 1
+            self.bytes_feitos += tamanho
+            if nivel == 'erro':
+                self.erros += 1
+            elif nivel == 'ignorado':
+                self.ignorados += 1
+
+    def finalizar(self, sucesso, erros=None):
+        with self._lock:
+            self.fim = time.time()
+            self._fechar_fase(self.fim)
+            self.fase = None
+            self.estado = 'concluido' if sucesso else 'erro'
+            if erros is not None:
+                self.erros = erros
+
+    def instantaneo(self):
+        with self._lock:
+            agora = self.fim or time.time()
+            decorrido = max(agora - self.inicio, 1e-6)
+            fases = dict(self.fases)
+            if self.fase is not None:
+                fases[self.fase] = fases.get(
+                    self.fase, 0) + agora - self._inicio_fase
+            vazao = self.bytes_feitos / decorrido if self.estado != 'ocioso' else 0
+            restante = max(self.bytes_total - self.bytes_feitos, 0)
+            filas = dict(self._filas)
+            dados = {'estacao': platform.node(), 'operacao': self.operacao, 'estado': self.estado,
+                     'fase': self.fase, 'inicio': datetime.fromtimestamp(self.inicio).isoformat(timespec='seconds'),
+                     'decorrido_s': round(decorrido, 1),
+                     'bytes_feitos': self.bytes_feitos, 'bytes_total': self.bytes_total,
+                     'arquivos_feitos': self.arquivos_feitos, 'arquivos_total': self.arquivos_total,
+                     'erros': self.erros, 'ignorados': self.ignorados,
+                     'vazao_bytes_s': round(vazao),
+                     'eta_s': round(restante / vazao) if vazao and self.estado == 'executando' else None,
+                     'fases_s': {nome: round(s, 2) for nome, s in fases.items()}}
+        dados['filas'] = {}
+        for nome, profundidade in filas.items():
+            try:
+                dados['filas'][nome] = int(profundidade())
+            except Exception:
+                continue
+        return dados
+
+    def prometheus(self):
+        """Formato de exposição texto do Prometheus (0.0.4)."""
+        d = self.instantaneo()
+        rotulos = f'estacao="{d["estacao"]}",operacao="{d["operacao"]}"'
+        linhas = []
+
+        def metrica(nome, tipo, ajuda, valores):
+            linhas.append(f"# HELP backup_cartao_{nome} {ajuda}")
+            linhas.append(f"# TYPE backup_cartao_{nome} {tipo}")
+            for extra, valor in valores:
+                linhas.append(
+                    f"backup_cartao_{nome}{{{rotulos}{extra}}} {valor}")
+
+        metrica('em_execucao', 'gauge', "1 enquanto há uma operação em andamento.",
+                [("", int(d['estado'] == 'executando'))])
+        metrica('bytes_processados', 'gauge', "Bytes já processados na operação atual.",
+                [("", d['bytes_feitos'])])
+        metrica('bytes_total', 'gauge',
+                "Bytes previstos na operação atual.", [("", d['bytes_total'])])
+        metrica('arquivos_processados', 'gauge', "Arquivos já processados.",
+                [("", d['arquivos_feitos'])])
+        metrica('arquivos_total', 'gauge', "Arquivos previstos.",
+                [("", d['arquivos_total'])])
+        metrica('erros', 'gauge', "Arquivos com erro.", [("", d['erros'])])
+        metrica('ignorados', 'gauge', "Arquivos ignorados por já existirem.",
+                [("", d['ignorados'])])
+        metrica('vazao_bytes_por_segundo', 'gauge', "Vazão média desde o início.",
+                [("", d['vazao_bytes_s'])])
+        metrica('eta_segundos', 'gauge', "Tempo restante estimado (-1 se desconhecido).",
+                [("", d['eta_s'] if d['eta_s'] is not None else -1)])
+        metrica('fase_segundos', 'gauge', "Tempo gasto em cada fase.",
+                [(f',fase="{fase}"', s) for fase, s in d['fases_s'].items()])
+        metrica('fila_profundidade', 'gauge', "Itens aguardando em filas internas.",
+                [(f',fila="{fila}"', n) for fila, n in d['filas'].items()])
+        return "\n".join(linhas) + "\n"
+
+
+class ServidorMetricas(threading.Thread):
+    """Servidor HTTP em thread: /status (JSON) e /metrics (Prometheus)."""
+
+    def __init__(self, metricas, host='127.0.0.1', porta=PORTA_METRICAS_PADRAO):
+        super().__init__(daemon=True)
+
+        class Manipulador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                caminho = self.path.split('?')[0]
+                if caminho == '/metrics':
+                    corpo = metricas.prometheus().encode()
+                    tipo = 'text/plain; version=0.0.4; charset=utf-8'
+                elif caminho in ('/', '/status'):
+                    corpo = json.dumps(metricas.instantaneo(),
+                                       ensure_ascii=False).encode()
+                    tipo = 'application/json; charset=utf-8'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', tipo)
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass  # sem log por requisição no console
+
+        self.servidor = ThreadingHTTPServer((host, porta), Manipulador)
+        self.servidor.daemon_threads = True
+        self.endereco = f"http://{host}:{self.servidor.server_address[1]}"
+
+    def run(self):
+        self.servidor.serve_forever()
+
+    def parar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+# --------------------------- ENVIO PARA A NUVEM ---------------------------
+
+
+PASTA_ENVIOS = os.path.join(PASTA_CONFIG, 'envios')
+TAMANHO_PARTE_ENVIO = 8 * MB
+PARTES_SIMULTANEAS = 4
+PORTA_ENVIO_PADRAO = 9480
+
+
+def _etag(dados):
+    return hashlib.md5(dados).hexdigest()
+
+
+def chave_envio(caminho, raiz):
+    """Nome do objeto remoto: caminho relativo à pasta de destino, com barras normais."""
+    try:
+        relativo = os.path.relpath(caminho, raiz)
+    except ValueError:  # outra unidade no Windows
+        relativo = os.path.basename(caminho)
+    if relativo.startswith('..'):
+        relativo = os.path.basename(caminho)
+    return relativo.replace(os.sep, '/')
+
+
+class BackendEnvio:
+    """Interface de um destino de envio multipart (no estilo S3).
+
+    As partes são numeradas a partir de 1 e cada uma devolve uma etag (MD5 da parte),
+    conferida pelo cliente. Erros de comunicação ou de envio desconhecido são OSError.
+    """
+
+    identificador = None
+
+    def tamanho(self, chave):
+        """Tamanho do objeto já concluído, ou None se ele não existe."""
+        raise NotImplementedError
+
+    def iniciar(self, chave):
+        """Abre um envio multipart e devolve seu id."""
+        raise NotImplementedError
+
+    def partes(self, id_envio, chave):
+        """{número (str): etag} das partes já recebidas de um envio em aberto."""
+        raise NotImplementedError
+
+    def enviar_parte(self, id_envio, chave, numero, dados):
+        raise NotImplementedError
+
+    def concluir(self, id_envio, chave, numeros):
+        """Junta as partes na ordem dada e devolve o tamanho final do objeto."""
+        raise NotImplementedError
+
+
+class BackendPastaLocal(BackendEnvio):
+    """Backend de teste: objetos numa pasta local (ou de rede), partes em `.multipart/<id>/`."""
+
+    def __init__(self, raiz):
+        self.raiz = os.path.abspath(raiz)
+        self.identificador = f"pasta:{self.raiz}"
+        self._lock = threading.Lock()
+
+    def _objeto(self, chave):
+        caminho = os.path.normpath(os.path.join(self.raiz, *chave.split('/')))
+        if not caminho.startswith(self.raiz + os.sep):
+            raise OSError(errno.EINVAL, f"Chave inválida: {chave}")
+        return caminho
+
+    def _pasta_envio(self, id_envio):
+        if not re.fullmatch(r'[0-9a-f]{32}', id_envio or ''):
+            raise OSError(errno.EINVAL, f"Envio inválido: {id_envio}")
+        return os.path.join(self.raiz, '.multipart', id_envio)
+
+    def tamanho(self, chave):
+        try:
+            return os.path.getsize(self._objeto(chave))
+        except FileNotFoundError:
+            return None
+
+    def iniciar(self, chave):
+        self._objeto(chave)
+        id_envio = os.urandom(16).hex()
+        os.makedirs(self._pasta_envio(id_envio))
+        return id_envio
+
+    def partes(self, id_envio, chave):
+        pasta = self._pasta_envio(id_envio)
+        recebidas = {}
+        for nome in os.listdir(pasta):  # FileNotFoundError se o envio não existe mais
+            if nome.endswith('.parte'):
+                with open(os.path.join(pasta, nome), 'rb') as f:
+                    recebidas[nome[:-6]] = _etag(f.read())
+        return recebidas
+
+    def enviar_parte(self, id_envio, chave, numero, dados):
+        pasta = self._pasta_envio(id_envio)
+        if not os.path.isdir(pasta):
+            raise FileNotFoundError(errno.ENOENT, f"Envio desconhecido: {id_envio}")
+        temporario = os.path.join(pasta, f"{int(numero)}.tmp-{threading.get_ident()}")
+        with open(temporario, 'wb') as f:
+            f.write(dados)
+        os.replace(temporario, os.path.join(pasta, f"{int(numero)}.parte"))
+        return _etag(dados)
+
+    def concluir(self, id_envio, chave, numeros):
+        pasta, destino = self._pasta_envio(id_envio), self._objeto(chave)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        temporario = f"{destino}.envio-{id_envio}"
+        with open(temporario, 'wb') as saida:
+            for numero in numeros:
+                with open(os.path.join(pasta, f"{int(numero)}.parte"), 'rb') as parte:
+                    shutil.copyfileobj(parte, saida, TAMANHO_BLOCO_COPIA)
+        with self._lock:
+            os.replace(temporario, destino)
+        shutil.rmtree(pasta, ignore_errors=True)
+        return os.path.getsize(destino)
+
+
+class BackendHTTP(BackendEnvio):
+    """Cliente do protocolo servido por `ServidorEnvioLocal` (base para um gateway real).
+
+    HEAD /objetos/<chave>; POST ?uploads; GET ?id=&partes; PUT ?id=&parte=N; POST ?id=&concluir.
+    """
+
+    def __init__(self, url_base, tempo_limite=60):
+        self.url_base = url_base.rstrip('/')
+        self.identificador = f"http:{self.url_base}"
+        self.tempo_limite = tempo_limite
+
+    def _requisitar(self, metodo, chave, consulta="", corpo=None):
+        url = f"{self.url_base}/objetos/{urllib.parse.quote(chave)}"
+        if consulta:
+            url += "?" + consulta
+        requisicao = urllib.request.Request(url, data=corpo, method=metodo)
+        with urllib.request.urlopen(requisicao, timeout=self.tempo_limite) as resposta:
+            if metodo == 'HEAD':
+                return int(resposta.headers.get('Content-Length', 0))
+            return json.loads(resposta.read() or b'{}')
+
+    def tamanho(self, chave):
+        try:
+            return self._requisitar('HEAD', chave)
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+
+    def iniciar(self, chave):
+        return self._requisitar('POST', chave, "uploads", b"")['id']
+
+    def partes(self, id_envio, chave):
+        return self._requisitar('GET', chave, urllib.parse.urlencode({'id': id_envio}) + "&partes")['partes']
+
+    def enviar_parte(self, id_envio, chave, numero, dados):
+        return self._requisitar('PUT', chave, urllib.parse.urlencode({'id': id_envio, 'parte': numero}),
+                                bytes(dados))['etag']
+
+    def concluir(self, id_envio, chave, numeros):
+        corpo = json.dumps({'partes': list(numeros)}).encode()
+        return self._requisitar('POST', chave, urllib.parse.urlencode({'id': id_envio}) + "&concluir",
+                                corpo)['tamanho']
+
+
+def backend_envio(destino):
+    """URL http(s):// vira BackendHTTP; qualquer outro texto é uma pasta local."""
+    if destino.startswith(('http://', 'https://')):
+        return BackendHTTP(destino)
+    return BackendPastaLocal(destino)
+
+
+class ServidorEnvioLocal(threading.Thread):
+    """Servidor HTTP de teste que guarda os envios numa pasta via BackendPastaLocal."""
+
+    def __init__(self, raiz, host='127.0.0.1', porta=PORTA_ENVIO_PADRAO):
+        super().__init__(daemon=True)
+        backend = BackendPastaLocal(raiz)
+
+        class Manipulador(BaseHTTPRequestHandler):
+            def _rota(self):
+                caminho, _, consulta = self.path.partition('?')
+                if not caminho.startswith('/objetos/'):
+                    raise FileNotFoundError(errno.ENOENT, caminho)
+                parametros = urllib.parse.parse_qs(consulta, keep_blank_values=True)
+                return urllib.parse.unquote(caminho[len('/objetos/'):]), {c: v[0] for c, v in parametros.items()}
+
+            def _responder(self, codigo, dados=None, tamanho=None):
+                corpo = json.dumps(dados).encode() if dados is not None else b""
+                self.send_response(codigo)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(tamanho if tamanho is not None else len(corpo)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(corpo)
+
+            def _tratar(self, acao):
+                try:
+                    chave, parametros = self._rota()
+                    acao(chave, parametros)
+                except FileNotFoundError:
+                    self._responder(404, {'erro': 'não encontrado'})
+                except (OSError, ValueError, KeyError) as e:
+                    self._responder(400, {'erro': str(e)})
+
+            def _corpo(self):
+                return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            def do_HEAD(self):
+                def acao(chave, parametros):
+                    tamanho = backend.tamanho(chave)
+                    if tamanho is None:
+                        raise FileNotFoundError(errno.ENOENT, chave)
+                    self._responder(200, tamanho=tamanho)
+                self._tratar(acao)
+
+            def do_GET(self):
+                self._tratar(lambda chave, p: self._responder(
+                    200, {'partes': backend.partes(p['id'], chave)}))
+
+            def do_PUT(self):
+                self._tratar(lambda chave, p: self._responder(
+                    200, {'etag': backend.enviar_parte(p['id'], chave, int(p['parte']), self._corpo())}))
+
+            def do_POST(self):
+                def acao(chave, parametros):
+                    if 'uploads' in parametros:
+                        self._corpo()
+                        self._responder(200, {'id': backend.iniciar(chave)})
+                    else:
+                        numeros = json.loads(self._corpo())['partes']
+                        self._responder(200, {'tamanho': backend.concluir(
+                            parametros['id'], chave, numeros)})
+                self._tratar(acao)
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer((host, porta), Manipulador)
+        self.servidor.daemon_threads = True
+        self.endereco = f"http://{host}:{self.servidor.server_address[1]}"
+
+    def run(self):
+        self.servidor.serve_forever()
+
+    def parar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+class FilaEnvio:
+    """Envia em segundo plano, em partes paralelas, os arquivos que a cópia já conferiu.
+
+    O mapa de partes de cada arquivo fica em PASTA_ENVIOS e é regravado a cada parte,
+    então um envio interrompido continua de onde parou (na mesma execução ou na próxima).
+    Enquanto a cópia está ativa o envio respeita `limite_durante_copia` (bytes/s).
+    """
+
+    def __init__(self, backend, partes_simultaneas=PARTES_SIMULTANEAS, limite_durante_copia=0,
+                 tamanho_parte=TAMANHO_PARTE_ENVIO):
+        self.backend = backend
+        self.tamanho_parte = tamanho_parte
+        self.limitador = LimitadorBanda(limite_durante_copia)
+        self.fila = queue.Queue()
+        self.enviados, self.existentes, self.retomados, self.erros = 0, 0, 0, []
+        self.bytes_total, self.bytes_feitos = 0, 0
+        self._lock = threading.Lock()
+        self._vistos = set()
+        self.cancelado = threading.Event()
+        os.makedirs(PASTA_ENVIOS, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=partes_simultaneas)
+        self._trabalhador = threading.Thread(target=self._trabalhar, daemon=True)
+        self._trabalhador.start()
+
+    def _caminho_mapa(self, chave):
+        nome = hashlib.sha1(f"{self.backend.identificador}\n{chave}".encode()).hexdigest()
+        return os.path.join(PASTA_ENVIOS, nome + ".json")
+
+    def _salvar_mapa(self, estado):
+        caminho = self._caminho_mapa(estado['chave'])
+        with open(caminho + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(estado, f)
+        os.replace(caminho + ".tmp", caminho)
+
+    def enfileirar(self, arquivo, chave):
+        if chave in self._vistos:
+            return
+        self._vistos.add(chave)
+        try:
+            tamanho = os.path.getsize(arquivo)
+        except OSError as e:
+            self.erros.append((arquivo, e))
+            return
+        with self._lock:
+            self.bytes_total += tamanho
+        self.fila.put((arquivo, chave))
+
+    def retomar_pendentes(self):
+        """Reenfileira envios interrompidos deste backend cujo arquivo local não mudou."""
+        retomados = 0
+        for caminho in sorted(glob.glob(os.path.join(PASTA_ENVIOS, '*.json'))):
+            try:
+                with open(caminho, encoding='utf-8') as f:
+                    estado = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if estado.get('backend') == self.backend.identificador and os.path.exists(estado.get('arquivo', '')):
+                self.enfileirar(estado['arquivo'], estado['chave'])
+                retomados += 1
+        self.retomados = retomados
+        return retomados
+
+    def copia_concluida(self):
+        """A cópia terminou: o envio passa a usar toda a banda."""
+        self.limitador.ajustar(0)
+
+    def _trabalhar(self):
+        while True:
+            item = self.fila.get()
+            if item is None:
+                break
+            arquivo, chave = item
+            if self.cancelado.is_set():
+                continue
+            try:
+                self._enviar_arquivo(arquivo, chave)
+            except Exception as e:
+                self.erros.append((arquivo, e))
+
+    def _enviar_arquivo(self, arquivo, chave):
+        info = os.stat(arquivo)
+        caminho_mapa = self._caminho_mapa(chave)
+        estado = None
+        try:
+            with open(caminho_mapa, encoding='utf-8') as f:
+                estado = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if estado and (estado.get('arquivo'), estado.get('tamanho'), estado.get('mtime_ns'),
+                       estado.get('tamanho_parte')) != (arquivo, info.st_size, info.st_mtime_ns, self.tamanho_parte):
+            estado = None  # o arquivo local mudou: recomeça do zero
+
+        if estado is None and self.backend.tamanho(chave) == info.st_size:
+            self.existentes += 1
+            with self._lock:
+                self.bytes_feitos += info.st_size
+            if os.path.exists(caminho_mapa):
+                os.remove(caminho_mapa)
+            return
+        if estado is not None:
+            try:
+                # Só valem as partes que o servidor confirma ter, com a mesma etag
+                remotas = self.backend.partes(estado['id'], chave)
+                estado['partes'] = {n: e for n, e in estado['partes'].items()
+                                    if remotas.get(n) == e}
+            except OSError:
+                estado = None
+        if estado is None:
+            estado = {'backend': self.backend.identificador, 'chave': chave, 'arquivo': arquivo,
+                      'tamanho': info.st_size, 'mtime_ns': info.st_mtime_ns,
+                      'tamanho_parte': self.tamanho_parte, 'id': self.backend.iniciar(chave), 'partes': {}}
+            self._salvar_mapa(estado)
+
+        total_partes = max(1, -(-info.st_size // self.tamanho_parte))
+        faltando = [n for n in range(1, total_partes + 1) if str(n) not in estado['partes']]
+        with self._lock:
+            self.bytes_feitos += info.st_size - sum(
+                min(self.tamanho_parte, info.st_size - (n - 1) * self.tamanho_parte) for n in faltando)
+        fd, futuros = os.open(arquivo, os.O_RDONLY | getattr(os, 'O_BINARY', 0)), []
+        try:
+            futuros = [self._pool.submit(self._enviar_parte, fd, estado, n) for n in faltando]
+            for futuro in futuros:
+                futuro.result()
+        finally:
+            for futuro in futuros:
+                futuro.cancel()
+            wait(futuros)
+            os.close(fd)
+
+        tamanho_remoto = self.backend.concluir(estado['id'], chave, list(range(1, total_partes + 1)))
+        if tamanho_remoto != info.st_size:
+            raise OSError(errno.EIO, f"Objeto remoto com {tamanho_remoto} bytes, esperado {info.st_size}")
+        os.remove(caminho_mapa)
+        self.enviados += 1
+
+    def _enviar_parte(self, fd, estado, numero):
+        if self.cancelado.is_set():
+            raise OSError(errno.ECANCELED, "Envio cancelado")
+        dados = _pread(fd, self.tamanho_parte, (numero - 1) * self.tamanho_parte)
+        self.limitador.consumir(len(dados))
+        etag = self.backend.enviar_parte(estado['id'], estado['chave'], numero, dados)
+        if etag != _etag(dados):
+            raise OSError(errno.EIO, f"Parte {numero} chegou corrompida ao destino")
+        with self._lock:
+            estado['partes'][str(numero)] = etag
+            self._salvar_mapa(estado)
+            self.bytes_feitos += len(dados)
+
+    def concluir(self, progresso=None):
+        """Espera a fila esvaziar; `progresso(feitos, total)` é chamado a cada meio segundo."""
+        self.copia_concluida()
+        self.fila.put(None)
+        while self._trabalhador.is_alive():
+            if progresso:
+                progresso(self.bytes_feitos, self.bytes_total)
+            self._trabalhador.join(0.5)
+        self._pool.shutdown()
+
+    def cancelar(self):
+        """Interrompe o envio; os mapas de partes ficam para a próxima execução retomar."""
+        self.cancelado.set()
+        while True:
+            try:
+                self.fila.get_nowait()
+            except queue.Empty:
+                break
+        self.fila.put(None)
+        self._trabalhador.join()
+        self._pool.shutdown()
+
+
+# --------------------------- SONDAGEM DE VELOCIDADE ---------------------------
+
+
+BLOCO_SONDAGEM = 1024 * 1024
+DURACAO_SONDAGEM = 1.5
+LIMITE_SONDAGEM = 256 * MB
+ARQUIVOS_SONDAGEM = 16
+# Destino abaixo dessa fração da leitura do cartão vira o gargalo do backup
+FRACAO_DESTINO_LENTO = 0.5
+
+
+def _abrir_sem_cache(caminho, flags):
+    """Abre com O_DIRECT quando o sistema e o sistema de arquivos aceitam; (fd, direto)."""
+    flags |= getattr(os, 'O_BINARY', 0)
+    if hasattr(os, 'O_DIRECT'):
+        try:
+            return os.open(caminho, flags | os.O_DIRECT, 0o644), True
+        except OSError:
+            pass  # tmpfs e alguns FUSE recusam O_DIRECT
+    return os.open(caminho, flags, 0o644), False
+
+
+def _ler_bloco(fd, buffer, offset):
+    if hasattr(os, 'preadv'):
+        return os.preadv(fd, [buffer], offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    dados = os.read(fd, len(buffer))
+    buffer[:len(dados)] = dados
+    return len(dados)
+
+
+def medir_leitura(arquivos, tamanhos=None, duracao=DURACAO_SONDAGEM, limite=LIMITE_SONDAGEM):
+    """Leitura sequencial (bytes/s) nos maiores arquivos da origem, sem usar o page cache."""
+    tamanhos = tamanhos or {}
+    candidatos = sorted(arquivos, key=lambda a: tamanhos.get(a) or os.path.getsize(a),
+                        reverse=True)[:5]
+    buffer = mmap.mmap(-1, BLOCO_SONDAGEM)  # alinhado à página, como o O_DIRECT exige
+    lidos, inicio = 0, time.perf_counter()
+    for arquivo in candidatos:
+        fd, direto = _abrir_sem_cache(arquivo, os.O_RDONLY)
+        try:
+            if not direto and hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            offset = 0
+            while time.perf_counter() - inicio < duracao and lidos < limite:
+                n = _ler_bloco(fd, buffer, offset)
+                lidos, offset = lidos + n, offset + n
+                if n < BLOCO_SONDAGEM:
+                    break
+        finally:
+            os.close(fd)
+        if time.perf_counter() - inicio >= duracao or lidos >= limite:
+            break
+    tempo = time.perf_counter() - inicio
+    return lidos / tempo if lidos and tempo > 0 else None
+
+
+def medir_escrita(pasta, duracao=DURACAO_SONDAGEM, limite=LIMITE_SONDAGEM):
+    """Gravação sequencial (bytes/s) em `pasta`, com fsync incluído no tempo."""
+    caminho = os.path.join(pasta, f".sondagem_backup_{os.getpid()}.tmp")
+    buffer = mmap.mmap(-1, BLOCO_SONDAGEM)
+    buffer.write(os.urandom(BLOCO_SONDAGEM))  # dados incompressíveis
+    fd, direto = _abrir_sem_cache(
+        caminho, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    escritos, inicio = 0, time.perf_counter()
+    try:
+        while time.perf_counter() - inicio < duracao and escritos < limite:
+            escritos += os.write(fd, buffer)
+            if not direto and escritos % (16 * MB) == 0:
+                os.fsync(fd)
+        os.fsync(fd)
+        tempo = time.perf_counter() - inicio
+    finally:
+        os.close(fd)
+        os.remove(caminho)
+    return escritos / tempo if escritos and tempo > 0 else None
+
+
+def medir_custo_por_arquivo(pasta, quantidade=ARQUIVOS_SONDAGEM):
+    """Segundos gastos por arquivo em criar, gravar 16 KB, ajustar datas e fechar."""
+    pasta_teste = os.path.join(pasta, f".sondagem_backup_{os.getpid()}")
+    os.makedirs(pasta_teste, exist_ok=True)
+    dados = os.urandom(16 * 1024)
+    inicio = time.perf_counter()
+    try:
+        for i in range(quantidade):
+            caminho = os.path.join(pasta_teste, f"{i:04d}.tmp")
+            with open(caminho, 'wb') as f:
+                f.write(dados)
+                f.flush()
+                os.fsync(f.fileno())
+            os.utime(caminho, (time.time(), time.time()))
+        return (time.perf_counter() - inicio) / quantidade
+    finally:
+        shutil.rmtree(pasta_teste, ignore_errors=True)
+
+
+def _pasta_existente(pasta):
+    while not os.path.isdir(pasta) and os.path.dirname(pasta) != pasta:
+        pasta = os.path.dirname(pasta)
+    return pasta
+
+
+def sondar_velocidades(mapa_datas, tamanhos=None):
+    """Mede a leitura da origem e a gravação de cada destino (um teste por dispositivo).
+
+    Retorna {'leitura': bytes/s, 'destinos': {pasta da data: medida}}, em que datas no
+    mesmo dispositivo compartilham a mesma medida.
+    """
+    arquivos = [a for dados in mapa_datas.values() for a in dados['arquivos']]
+    resultado = {'leitura': None, 'destinos': {}}
+    try:
+        resultado['leitura'] = medir_leitura(arquivos, tamanhos)
+    except OSError:
+        pass
+    por_dispositivo = {}
+    for dados in mapa_datas.values():
+        existente = _pasta_existente(dados['pasta'])
+        try:
+            dispositivo = os.stat(existente).st_dev
+        except OSError:
+            continue
+        if dispositivo not in por_dispositivo:
+            medida = {'pasta': existente}
+            try:
+                medida['escrita'] = medir_escrita(existente)
+                medida['custo_arquivo'] = medir_custo_por_arquivo(existente)
+            except OSError as e:
+                medida['erro'] = str(e)
+            por_dispositivo[dispositivo] = medida
+        resultado['destinos'][dados['pasta']] = por_dispositivo[dispositivo]
+    return resultado
+
+
+def estimar_duracao(mapa_datas, sondagem, tamanhos=None, limite_banda=0):
+    """Duração estimada (s) da cópia: bytes pela vazão do gargalo + custo fixo por arquivo."""
+    total = 0.0
+    for dados in mapa_datas.values():
+        medida = sondagem['destinos'].get(dados['pasta'], {})
+        vazoes = [v for v in (sondagem['leitura'], medida.get(
+            'escrita'), limite_banda) if v]
+        if not vazoes:
+            return None
+        total += (tamanho_total_arquivos(dados['arquivos'], tamanhos) / min(vazoes)
+                  + len(dados['arquivos']) * medida.get('custo_arquivo', 0))
+    return total
+
+
+def avisos_sondagem(sondagem):
+    avisos, vistos = [], set()
+    for medida in sondagem['destinos'].values():
+        if id(medida) in vistos:
+            continue
+        vistos.add(id(medida))
+        if 'erro' in medida:
+            avisos.append(
+                f"⚠️ Não foi possível testar {medida['pasta']}: {medida['erro']}")
+        elif sondagem['leitura'] and medida.get('escrita') and \
+                medida['escrita'] < sondagem['leitura'] * FRACAO_DESTINO_LENTO:
+            avisos.append(f"⚠️ {medida['pasta']} grava a {formatar_tamanho(medida['escrita'])}/s, bem abaixo "
+                          f"da leitura do cartão ({formatar_tamanho(sondagem['leitura'])}/s): o destino será o gargalo.")
+    return avisos
+
+
+def formatar_duracao(segundos):
+    segundos = int(round(segundos))
+    if segundos < 60:
+        return f"{segundos} s"
+    horas, minutos = divmod(segundos // 60, 60)
+    return f"{horas} h {minutos:02d} min" if horas else f"{minutos} min"
+
+
+# --------------------------- PLANO E ORDEM DA CÓPIA ---------------------------
+
+
+ORDENS_COPIA = {
+    'cronologica': "Cronológica",
+    'menores': "Menores primeiro (mais arquivos salvos por minuto)",
+    'fotos': "Fotos primeiro, vídeos por último",
+}
+PRIORIDADE_PASTA = {'FOTOS': 0, 'METADATA': 1, 'OUTROS': 2, 'VIDEOS': 3}
+
+
+def nome_destino(arquivo, dados, contador):
+    """Nome final do arquivo conforme as opções de renomeação da data."""
+    nome_original, ext = os.path.splitext(os.path.basename(arquivo))
+    if not (dados.get('renomear') and dados.get('prefixo')):
+        return os.path.basename(arquivo)
+    match = re.search(r'(\d+)', nome_original) if dados['manter_numeracao'] else None
+    num_part = match.group(1) if match else f"{contador:04d}"
+    return f"{dados['prefixo']}_{num_part}{ext.lower()}"
+
+
+def planejar_copia(mapa_datas):
+    """Plano da cópia em ordem cronológica (data, depois mtime).
+
+    A numeração da renomeação e o campo `ordem` saem daqui, então nomes finais e o
+    log em texto não dependem da ordem em que a cópia é executada.
+    """
+    plano = []
+    for data, dados in mapa_datas.items():
+        arquivos = sorted(dados['arquivos'],
+                          key=lambda x: (os.path.getmtime(x), x))
+        for contador, arquivo in enumerate(arquivos, 1):
+            plano.append({'ordem': len(plano), 'data': data, 'arquivo': arquivo,
+                          'tipo': tipo_arquivo(arquivo),
+                          'novo_nome': nome_destino(arquivo, dados, contador)})
+    return plano
+
+
+def ordenar_execucao(plano, mapa_datas, politica='cronologica', tamanhos=None):
+    """Reordena o plano conforme a política; datas fixadas (📌) vêm sempre primeiro."""
+    fixadas = {data for data, dados in mapa_datas.items()
+               if dados.get('fixada')}
+
+    def tamanho(arquivo):
+        if tamanhos and arquivo in tamanhos:
+            return tamanhos[arquivo]
+        try:
+            return os.path.getsize(arquivo)
+        except OSError:
+            return 0
+
+    def chave(item):
+        if politica == 'menores':
+            secundaria = tamanho(item['arquivo'])
+        elif politica == 'fotos':
+            secundaria = PRIORIDADE_PASTA.get(item['tipo'], 2)
+        else:
+            secundaria = 0
+        return (item['data'] not in fixadas, secundaria, item['ordem'])
+
+    return sorted(plano, key=chave)
+
+
+# --------------------------- VERIFICAÇÃO E ASC MHL ---------------------------
+
+
+TAMANHO_BLOCO_HASH = 4 * 1024 * 1024
+TAMANHO_AMOSTRA = 1024 * 1024
+PASTA_MHL = 'ascmhl'
+NS_MHL = 'urn:ASC:MHL:v2.0'
+NS_MHL_CADEIA = 'urn:ASC:MHL:DIRECTORY:v2.0'
+ALGORITMOS_MHL = ('xxh128', 'xxh3', 'xxh64', 'sha1', 'md5')
+
+
+def algoritmo_hash_padrao():
+    return 'xxh64' if XXHASH_AVAILABLE else 'md5'
+
+
+def novo_hash(algoritmo):
+    if algoritmo in ('xxh64', 'xxh3', 'xxh128'):
+        if not XXHASH_AVAILABLE:
+            raise ValueError(
+                f"Algoritmo {algoritmo} requer o módulo 'xxhash'")
+        return {'xxh64': xxhash.xxh64, 'xxh3': xxhash.xxh3_64, 'xxh128': xxhash.xxh3_128}[algoritmo]()
+    return hashlib.new(algoritmo)
+
+
+def calcular_hash(caminho, algoritmo='md5', modo='completo'):
+    """Hash do arquivo ou de um membro de contêiner ('<contêiner>.tar::FOTOS/...').
+
+    No modo 'rapido' usa tamanho + blocos do início, meio e fim.
+    """
+    h = novo_hash(algoritmo)
+    caminho_tar, nome_membro = separar_membro(caminho)
+    with (abrir_membro(caminho_tar, nome_membro) if nome_membro else open(caminho, 'rb', buffering=0)) as f:
+        if modo == 'rapido':
+            tamanho = f.seek(0, os.SEEK_END)
+            h.update(str(tamanho).encode())
+            for inicio in sorted({0, max(0, (tamanho - TAMANHO_AMOSTRA) // 2), max(0, tamanho - TAMANHO_AMOSTRA)}):
+                f.seek(inicio)
+                h.update(f.read(TAMANHO_AMOSTRA))
+        else:
+            buffer = bytearray(TAMANHO_BLOCO_HASH)
+            visao = memoryview(buffer)
+            while True:
+                lidos = f.readinto(buffer)
+                if not lidos:
+                    break
+                h.update(visao[:lidos])
+    return h.hexdigest()
+
+
+def hash_paralelo(caminhos, algoritmo, modo='completo', por_disco=None, callback=None, segundo_plano=False):
+    """Calcula hashes em paralelo, com um pool de threads por disco (st_dev).
+
+    Cada disco recebe `por_disco` leitores simultâneos; discos diferentes trabalham ao
+    mesmo tempo, então a vazão escala com o número de discos e de núcleos (o hashlib
+    libera o GIL durante o cálculo). Retorna {caminho: hash ou Exception}.
+    """
+    por_disco = por_disco or max(1, min(4, os.cpu_count() or 1))
+    pools, futuros = {}, {}
+    try:
+        for caminho in dict.fromkeys(caminhos):
+            try:
+                disco = os.stat(separar_membro(caminho)[0]).st_dev
+            except OSError:
+                disco = None
+            if disco not in pools:
+                pools[disco] = ThreadPoolExecutor(max_workers=por_disco, thread_name_prefix=f"hash-{disco}",
+                                                  initializer=reduzir_prioridade_thread if segundo_plano else None)
+            futuros[pools[disco].submit(
+                calcular_hash, caminho, algoritmo, modo)] = caminho
+
+        resultados = {}
+        for futuro in as_completed(futuros):
+            caminho = futuros[futuro]
+            try:
+                resultados[caminho] = futuro.result()
+            except Exception as e:
+                resultados[caminho] = e
+            if callback:
+                callback(caminho, resultados[caminho])
+        return resultados
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def listar_destino(pasta_destino):
+    """Mídias já copiadas: {caminho: tamanho}, ignorando logs e listas MHL.
+
+    Os membros dos contêineres TAR entram como '<contêiner>.tar::FOTOS/...', lidos do
+    índice lateral (ou do próprio tar).
+    """
+    arquivos = {}
+    for raiz, dirs, nomes in os.walk(pasta_destino):
+        dirs[:] = [d for d in dirs if d != PASTA_MHL]
+        for nome in nomes:
+            caminho = os.path.join(raiz, nome)
+            try:
+                if nome.lower().endswith('.tar'):
+                    for nome_membro, entrada in indice_container(caminho).items():
+                        tamanho = entrada['tamanho_original']
+                        if tamanho is not None:
+                            arquivos[caminho_membro(caminho, nome_membro)] = tamanho
+                elif tipo_arquivo(caminho) != 'OUTROS':
+                    arquivos[caminho] = os.path.getsize(caminho)
+            except (OSError, tarfile.TarError):
+                continue
+    return arquivos
+
+
+def parear_origem_destino(arquivos_origem, pasta_destino):
+    """Associa cada arquivo do cartão aos candidatos no destino com o mesmo tamanho.
+
+    Como os arquivos podem ter sido renomeados, o nome só desempata: se houver um
+    candidato com o mesmo nome ele é o único par; senão todos os candidatos de mesmo
+    tamanho são comparados pelo hash.
+    """
+    por_tamanho = defaultdict(list)
+    for caminho, tamanho in listar_destino(pasta_destino).items():
+        por_tamanho[tamanho].append(caminho)
+
+    pares = []
+    for origem in arquivos_origem:
+        try:
+            candidatos = por_tamanho.get(os.path.getsize(origem), [])
+        except OSError:
+            candidatos = []
+        nome = os.path.basename(origem).upper()
+        mesmo_nome = [c for c in candidatos if os.path.basename(
+            c).upper() == nome]
+        pares.append((origem, mesmo_nome[:1] or candidatos))
+    return pares
+
+
+def verificar_contra_origem(arquivos_origem, pasta_destino, modo='rapido', algoritmo='md5', por_disco=None, progresso=None,
+                            segundo_plano=False):
+    pares = parear_origem_destino(arquivos_origem, pasta_destino)
+    caminhos = [o for o, _ in pares] + [c for _, cs in pares for c in cs]
+    total = len(set(caminhos))
+    feitos = [0]
+
+    def _callback(caminho, _):
+        feitos[0] += 1
+        if progresso:
+            progresso(feitos[0], total, caminho)
+
+    hashes = hash_paralelo(caminhos, algoritmo, modo, por_disco=por_disco,
+                           callback=_callback, segundo_plano=segundo_plano)
+
+    resultados, usados = [], set()
+    for origem, candidatos in pares:
+        h_origem = hashes.get(origem)
+        if not candidatos:
+            resultados.append({'origem': origem, 'destino': None,
+                              'status': 'ausente', 'hash': None})
+        elif isinstance(h_origem, Exception):
+            resultados.append({'origem': origem, 'destino': candidatos[0], 'status': 'erro',
+                               'hash': None, 'erro': str(h_origem)})
+        else:
+            # Arquivos de conteúdo idêntico: prefere um destino ainda não pareado
+            iguais = [c for c in candidatos if hashes.get(c) == h_origem]
+            destino = next((c for c in iguais if c not in usados),
+                           iguais[0] if iguais else None)
+            usados.add(destino)
+            resultados.append({'origem': origem, 'destino': destino or candidatos[0],
+                                'status': 'ok' if destino else 'divergente', 'hash': h_origem,
+                               'algoritmo': algoritmo})
+    return resultados
+
+
+def verificar_contra_mhl(pasta_destino, modo='rapido', por_disco=None, progresso=None, segundo_plano=False):
+    """Confere o destino contra a lista de hashes ASC MHL gravada nele (sem precisar do cartão)."""
+    esperados = importar_mhl(pasta_destino)
+    resultados, para_hash = [], defaultdict(list)
+    for relativo, entrada in esperados.items():
+        caminho = os.path.join(pasta_destino, *relativo.split('/'))
+        if not os.path.exists(caminho):
+            resultados.append({'origem': None, 'destino': caminho,
+                              'status': 'ausente', 'hash': None})
+        elif os.path.getsize(caminho) != entrada['tamanho']:
+            resultados.append({'origem': None, 'destino': caminho,
+                              'status': 'divergente', 'hash': None})
+        elif modo == 'rapido':
+            # A lista só guarda hashes completos; no modo rápido confere o tamanho
+            resultados.append({'origem': None, 'destino': caminho,
+                              'status': 'ok', 'hash': None})
+        else:
+            para_hash[entrada['algoritmo']].append((caminho, entrada['hash']))
+
+    total = sum(len(v) for v in para_hash.values())
+    feitos = [0]
+
+    def _callback(caminho, _):
+        feitos[0] += 1
+        if progresso:
+            progresso(feitos[0], total, caminho)
+
+    for algoritmo, itens in para_hash.items():
+        hashes = hash_paralelo([c for c, _ in itens], algoritmo, 'completo', por_disco=por_disco,
+                               callback=_callback, segundo_plano=segundo_plano)
+        for caminho, esperado in itens:
+            obtido = hashes[caminho]
+            if isinstance(obtido, Exception):
+                resultados.append({'origem': None, 'destino': caminho, 'status': 'erro',
+                                   'hash': None, 'erro': str(obtido)})
+            else:
+                resultados.append({'origem': None, 'destino': caminho, 'hash': obtido, 'algoritmo': algoritmo,
+                                   'status': 'ok' if obtido.lower() == esperado.lower() else 'divergente'})
+    return resultados
+
+
+def _c4_id(dados):
+    # Identificador C4 (SMPTE ST 2114): SHA-512 em base58, prefixo 'c4', 90 caracteres
+    alfabeto = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+    numero = int.from_bytes(hashlib.sha512(dados).digest(), 'big')
+    texto = ''
+    while numero:
+        numero, resto = divmod(numero, 58)
+        texto = alfabeto[resto] + texto
+    return 'c4' + texto.rjust(88, '1')
+
+
+def _data_iso(timestamp=None):
+    momento = datetime.fromtimestamp(
+        timestamp) if timestamp is not None else datetime.now()
+    return momento.astimezone().isoformat(timespec='seconds')
+
+
+def _ler_cadeia_mhl(pasta_mhl):
+    caminho = os.path.join(pasta_mhl, 'ascmhl_chain.xml')
+    if not os.path.exists(caminho):
+        return []
+    raiz = ET.parse(caminho).getroot()
+    geracoes = []
+    for item in raiz.iter(f'{{{NS_MHL_CADEIA}}}hashlist'):
+        geracoes.append((int(item.get('sequencenr', 0)),
+                         item.findtext(f'{{{NS_MHL_CADEIA}}}path'),
+                         item.findtext(f'{{{NS_MHL_CADEIA}}}c4')))
+    return sorted(geracoes)
+
+
+def exportar_mhl(pasta_raiz, entradas):
+    """Grava uma nova geração ASC MHL v2.0 em `<pasta_raiz>/ascmhl`.
+
+    `entradas` é uma lista de (caminho, algoritmo, hash, acao), com acao 'original',
+    'verified' ou 'failed'. Retorna o caminho do arquivo .mhl criado.
+    """
+    pasta_mhl = os.path.join(pasta_raiz, PASTA_MHL)
+    os.makedirs(pasta_mhl, exist_ok=True)
+    geracoes = _ler_cadeia_mhl(pasta_mhl)
+    sequencia = (geracoes[-1][0] if geracoes else 0) + 1
+
+    # O namespace vai como atributo xmlns da raiz: ET.register_namespace mudaria o
+    # prefixo padrão do processo inteiro
+    raiz = ET.Element('hashlist', version='2.0', xmlns=NS_MHL)
+    criador = ET.SubElement(raiz, 'creatorinfo')
+    ET.SubElement(criador, 'creationdate').text = _data_iso()
+    ET.SubElement(criador, 'hostname').text = platform.node()
+    ET.SubElement(criador, 'tool',
+                  version='6.1').text = 'Backup Cartão Pro'
+    processo = ET.SubElement(raiz, 'processinfo')
+    ET.SubElement(processo, 'process').text = 'in-place'
+    ignorar = ET.SubElement(processo, 'ignore')
+    for padrao in ('.DS_Store', PASTA_MHL, 'ascmhl_chain.xml'):
+        ET.SubElement(ignorar, 'pattern').text = padrao
+
+    hashes = ET.SubElement(raiz, 'hashes')
+    agora = _data_iso()
+    for caminho, algoritmo, valor, acao in entradas:
+        st = os.stat(caminho)
+        item = ET.SubElement(hashes, 'hash')
+        ET.SubElement(item, 'path', size=str(st.st_size),
+                      lastmodificationdate=_data_iso(st.st_mtime)).text = os.path.relpath(caminho, pasta_raiz).replace(os.sep, '/')
+        ET.SubElement(item, algoritmo,
+                      action=acao, hashdate=agora).text = valor
+
+    ET.indent(raiz)
+    conteudo = ET.tostring(raiz, encoding='UTF-8', xml_declaration=True)
+    nome_raiz = os.path.basename(os.path.abspath(pasta_raiz))
+    nome = f"{sequencia:04d}_{nome_raiz}_{datetime.now(timezone.utc).strftime('%Y-%m-%d_%H%M%SZ')}.mhl"
+    with open(os.path.join(pasta_mhl, nome), 'wb') as f:
+        f.write(conteudo)
+
+    cadeia = ET.Element('ascmhldirectory', xmlns=NS_MHL_CADEIA)
+    for seq, caminho, c4 in geracoes + [(sequencia, nome, _c4_id(conteudo))]:
+        item = ET.SubElement(cadeia, 'hashlist',
+                             sequencenr=str(seq))
+        ET.SubElement(item, 'path').text = caminho
+        ET.SubElement(item, 'c4').text = c4
+    ET.indent(cadeia)
+    ET.ElementTree(cadeia).write(os.path.join(pasta_mhl, 'ascmhl_chain.xml'),
+                                 encoding='UTF-8', xml_declaration=True)
+    return os.path.join(pasta_mhl, nome)
+
+
+def importar_mhl(pasta_raiz):
+    """Lê as listas ASC MHL da pasta (v2.0 em ascmhl/ e v1.1 soltas na raiz).
+
+    Retorna {caminho_relativo: {'tamanho', 'algoritmo', 'hash'}}; gerações mais
+    recentes sobrescrevem as anteriores.
+    """
+    esperados = {}
+    for arquivo in sorted(glob.glob(os.path.join(pasta_raiz, '*.mhl'))):
+        raiz = ET.parse(arquivo).getroot()
+        for item in raiz.iter('hash'):
+            relativo = item.findtext('file')
+            for tag, algoritmo in (('xxhash64be', 'xxh64'), ('md5', 'md5'), ('sha1', 'sha1')):
+                valor = item.findtext(tag)
+                if relativo and valor and (algoritmo != 'xxh64' or XXHASH_AVAILABLE):
+                    esperados[relativo] = {'tamanho': int(item.findtext('size') or 0),
+                                           'algoritmo': algoritmo, 'hash': valor}
+                    break
+
+    pasta_mhl = os.path.join(pasta_raiz, PASTA_MHL)
+    for _, nome, _ in _ler_cadeia_mhl(pasta_mhl):
+        raiz = ET.parse(os.path.join(pasta_mhl, nome)).getroot()
+        for item in raiz.iter(f'{{{NS_MHL}}}hash'):
+            caminho = item.find(f'{{{NS_MHL}}}path')
+            for algoritmo in ALGORITMOS_MHL:
+                valor = item.find(f'{{{NS_MHL}}}{algoritmo}')
+                if caminho is None or valor is None or valor.get('action') == 'failed':
+                    continue
+                if algoritmo.startswith('xxh') and not XXHASH_AVAILABLE:
+                    continue
+                esperados[caminho.text] = {'tamanho': int(caminho.get('size', 0)),
+                                           'algoritmo': algoritmo, 'hash': valor.text}
+                break
+    return esperados
+
+
+def tem_lista_mhl(pasta):
+    return os.path.exists(os.path.join(pasta, PASTA_MHL, 'ascmhl_chain.xml')) or bool(glob.glob(os.path.join(pasta, '*.mhl')))
+
+
+# --------------------------- DETECÇÃO DE DUPLICATAS ---------------------------
+
+
+TAMANHO_IMPRESSAO = 64 * 1024
+
+
+def impressao_digital(caminho, tamanho):
+    """Impressão digital barata: tamanho + hash dos primeiros e dos últimos 64 KB."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(tamanho).encode())
+    with open(caminho, 'rb', buffering=0) as f:
+        h.update(f.read(TAMANHO_IMPRESSAO))
+        if tamanho > TAMANHO_IMPRESSAO:
+            f.seek(max(TAMANHO_IMPRESSAO, tamanho - TAMANHO_IMPRESSAO))
+            h.update(f.read(TAMANHO_IMPRESSAO))
+    return h.hexdigest()
+
+
+def encontrar_duplicatas(arquivos, tamanhos=None, trabalhadores=8, impressoes=None):
+    """Agrupa arquivos de conteúdo idêntico (cartões dual-slot, pastas já copiadas etc.).
+
+    Só arquivos com tamanho repetido recebem impressão digital, calculada em paralelo.
+    Até 2 x 64 KB ela cobre o arquivo inteiro; acima disso o grupo é provável e só é
+    pulado depois de conferido por hash completo na cópia (ver `ingest`), para a
+    análise não ler os dois cartões inteiros. Retorna uma lista de grupos ordenados.
+    `impressoes` ({arquivo: impressão}) traz as já conhecidas e recebe as calculadas.
+    """
+    por_tamanho = defaultdict(list)
+    for arquivo in arquivos:
+        try:
+            tamanho = tamanhos[arquivo] if tamanhos else os.path.getsize(
+                arquivo)
+        except (OSError, KeyError):
+            continue
+        if tamanho > 0:
+            por_tamanho[tamanho].append(arquivo)
+    candidatos = [(a, t) for t, grupo in por_tamanho.items()
+                  if len(grupo) > 1 for a in grupo]
+    if not candidatos:
+        return []
+
+    def _impressao(item):
+        try:
+            return impressao_digital(*item)
+        except OSError:
+            return None
+
+    impressoes = {} if impressoes is None else impressoes
+    faltando = [item for item in candidatos if item[0] not in impressoes]
+    with ThreadPoolExecutor(max_workers=trabalhadores) as pool:
+        impressoes.update(zip((a for a, _ in faltando), pool.map(_impressao, faltando)))
+    por_impressao = defaultdict(list)
+    for arquivo, tamanho in candidatos:
+        if impressoes[arquivo]:
+            por_impressao[(tamanho, impressoes[arquivo])].append(arquivo)
+
+    return sorted(sorted(grupo) for grupo in por_impressao.values() if len(grupo) > 1)
+
+
+def redundantes_na_selecao(grupos, selecionados):
+    """{cópia a pular: arquivo que fica}; de cada grupo fica o primeiro que será copiado.
+
+    `selecionados` são os arquivos das datas escolhidas que passaram pelos demais filtros;
+    um grupo sem nenhum arquivo selecionado não afeta nada.
+    """
+    redundantes = {}
+    for grupo in grupos:
+        presentes = [a for a in grupo if a in selecionados]
+        redundantes.update((a, presentes[0]) for a in presentes[1:])
+    return redundantes
+
+
+def duplicatas_da_data(redundantes, arquivos):
+    """Parte de `redundantes` que pertence à data, guardada no mapa para a conferência."""
+    return {a: redundantes[a] for a in arquivos if a in redundantes}
+
+# --------------------------- API ASSÍNCRONA ---------------------------
+
+
+# Trabalhos simultâneos dividem os mesmos executores: cada um ocupa no máximo uma
+# thread por vez (o arquivo em curso), em vez de uma thread dedicada por trabalho.
+EXECUTOR_MOTOR = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 4) + 4),
+                                    thread_name_prefix='motor_ingest')
+EXECUTOR_SEGUNDO_PLANO = ThreadPoolExecutor(max_workers=4, thread_name_prefix='motor_ingest_ocioso',
+                                            initializer=reduzir_prioridade_thread)
+
+
+class CanalEventos:
+    """Eventos de progresso de um trabalho, consumidos com `async for`.
+
+    Cada evento é um dict com a chave 'tipo'. `emitir` pode ser chamado de qualquer
+    thread; o canal precisa ser criado dentro do loop que vai consumi-lo.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._fila = asyncio.Queue()
+
+    def _colocar(self, evento):
+        try:
+            no_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            no_loop = False
+        if no_loop:
+            self._fila.put_nowait(evento)
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._fila.put_nowait, evento)
+        except RuntimeError:
+            pass  # loop já encerrado: ninguém mais consome
+
+    def emitir(self, tipo, **dados):
+        self._colocar(dict(dados, tipo=tipo))
+
+    def fechar(self):
+        self._colocar(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        evento = await self._fila.get()
+        if evento is None:
+            raise StopAsyncIteration
+        return evento
+
+
+async def _em_executor(executor, funcao, *args, ao_cancelar=None):
+    """Roda `funcao` no executor. Se a tarefa for cancelada, chama `ao_cancelar` (que só
+    deve sinalizar a chamada em curso para parar), espera a chamada terminar (nada fica
+    gravando pela metade por trás) e então propaga o cancelamento."""
+    futuro = asyncio.get_running_loop().run_in_executor(executor, funcao, *args)
+    try:
+        return await asyncio.shield(futuro)
+    except asyncio.CancelledError:
+        if ao_cancelar is not None:
+            ao_cancelar()
+        while not futuro.done():
+            try:
+                await asyncio.wait({futuro})
+            except asyncio.CancelledError:
+                pass
+        raise
+
+
+def _ler_com_cache(caches, campo, funcao, arquivos):
+    """{arquivo: funcao(arquivo)}, lendo em paralelo só o que o cache da análise não tem."""
+    resultado, faltando = {}, []
+    for arquivo in arquivos:
+        achado, valor = caches[arquivo].obter(arquivo, campo)
+        if achado:
+            resultado[arquivo] = valor
+        else:
+            faltando.append(arquivo)
+    if faltando:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            lidos = dict(zip(faltando, executor.map(funcao, faltando)))
+        for arquivo, valor in lidos.items():
+            caches[arquivo].guardar(arquivo, campo, valor)
+        resultado.update(lidos)
+    return resultado
+
+
+def _analisar(caminhos, incluir_xml, ler_catalogo):
+    varredura, caches = {}, {}
+    for caminho in caminhos:
+        varredura_origem = varrer_origem(caminho)
+        cache = CacheAnalise(caminho, varredura_origem)
+        varredura.update(varredura_origem)
+        caches.update(dict.fromkeys(varredura_origem, cache))
+    fotos, videos, xmls = filtrar_varredura(varredura, incluir_xml)
+    tamanhos = {a: info[1] for a, info in varredura.items()}
+    mtime = {a: info[2] for a, info in varredura.items()}
+    metadados = {}
+    if ler_catalogo:
+        # Só os cabeçalhos são lidos; em paralelo para esconder a latência do cartão
+        metadados = _ler_com_cache(caches, 'metadados', ler_metadados, fotos + videos)
+
+    # Nota/rótulo/rejeição dos sidecars, lidos mesmo se os XMP não forem copiados
+    sidecars = associar_sidecars(fotos, [a for a in varredura if a.upper().endswith('.XMP')])
+    lidas = _ler_com_cache(caches, 'classificacao', ler_classificacao_xmp, set(sidecars.values()))
+    classificacoes = {foto: lidas[sidecar] for foto, sidecar in sidecars.items()
+                      if lidas[sidecar]}
+
+    # Sidecars idênticos podem pertencer a fotos diferentes: só mídia entra na busca
+    impressoes = {}
+    for arquivo in fotos + videos:
+        achado, impressao = caches[arquivo].obter(arquivo, 'impressao')
+        if achado:
+            impressoes[arquivo] = impressao
+    conhecidas = set(impressoes)
+    duplicatas = encontrar_duplicatas(fotos + videos, tamanhos, impressoes=impressoes)
+    for arquivo, impressao in impressoes.items():
+        if arquivo not in conhecidas and impressao:
+            caches[arquivo].guardar(arquivo, 'impressao', impressao)
+    for cache in set(caches.values()):
+        cache.salvar()
+    redundantes = {a for grupo in duplicatas for a in grupo[1:]}
+
+    arquivos_por_data = defaultdict(
+        lambda: {'arquivos': [], 'tipos': defaultdict(list)})
+    for arquivo in fotos + videos + xmls:
+        data = extrair_data_arquivo(arquivo, mtime[arquivo])
+        arquivos_por_data[data]['arquivos'].append(arquivo)
+        arquivos_por_data[data]['tipos'][tipo_arquivo(arquivo)].append(arquivo)
+
+    datas = {}
+    for data, info in arquivos_por_data.items():
+        for lista in info['tipos'].values():
+            lista.sort(key=mtime.get)
+        fotos_data = info['tipos'].get('FOTOS', [])
+        datas[data] = {'arquivos': info['arquivos'], 'tamanho': tamanho_total_arquivos(info['arquivos'], tamanhos),
+                       'tipos': info['tipos'],
+                       'duplicatas': [a for a in info['arquivos'] if a in redundantes],
+                       'classificacoes': {a: classificacoes[a] for a in fotos_data if a in classificacoes},
+                       'sidecars': {a: sidecars[a] for a in fotos_data if a in sidecars}}
+    return {'fotos': fotos, 'videos': videos, 'xmls': xmls, 'tamanhos': tamanhos, 'mtime': mtime,
+            'metadados': metadados, 'duplicatas': duplicatas, 'datas': datas}
+
+
+async def scan(caminhos, incluir_xml=True, ler_catalogo=False, executor=None):
+    """Analisa uma ou mais origens e agrupa os arquivos por data de captura.
+
+    Devolve um dict com fotos/videos/xmls, tamanhos, mtime, metadados (com `ler_catalogo`),
+    grupos de duplicatas e, em 'datas', cada dia com arquivos, tamanho, tipos (listas em
+    ordem de captura), duplicatas redundantes e classificações XMP.
+    """
+    if isinstance(caminhos, str):
+        caminhos = caminhos_origem(caminhos)
+    return await _em_executor(executor or EXECUTOR_MOTOR, _analisar, list(caminhos), incluir_xml, ler_catalogo)
+
+
+async def plan(analise, destino, datas=None, nota_minima=0, pular_rejeitadas=False, pular_duplicatas=True,
+               prefixo=None, manter_numeracao=True):
+    """Monta o mapa de datas aceito por `ingest` a partir do resultado de `scan`.
+
+    Cada data vai para `destino/AAAA-MM-DD`; `datas` restringe os dias copiados. Os filtros
+    são os mesmos da janela de seleção de datas. Dias que ficam vazios são omitidos.
+    """
+    selecionadas = analise['datas'] if datas is None else {
+        d: analise['datas'][d] for d in datas if d in analise['datas']}
+    classificacoes, sidecars = {}, {}
+    for info in analise['datas'].values():
+        classificacoes.update(info.get('classificacoes', {}))
+        sidecars.update(info.get('sidecars', {}))
+    excluidos = excluidos_por_classificacao(
+        [a for info in analise['datas'].values() for a in info['arquivos']],
+        classificacoes, sidecars, nota_minima, pular_rejeitadas)
+    redundantes = {}
+    if pular_duplicatas:
+        redundantes = redundantes_na_selecao(analise['duplicatas'], {
+            a for info in selecionadas.values() for a in info['arquivos'] if a not in excluidos})
+
+    mapa_datas = {}
+    for data, info in sorted(selecionadas.items()):
+        arquivos = [a for a in info['arquivos'] if a not in excluidos and a not in redundantes]
+        if arquivos:
+            mapa_datas[data] = {'pasta': os.path.join(destino, data), 'prefixo': prefixo or None,
+                                'renomear': bool(prefixo), 'manter_numeracao': manter_numeracao,
+                                'fixada': False, 'arquivos': arquivos,
+                                'duplicatas': duplicatas_da_data(redundantes, info['arquivos'])}
+    return mapa_datas
+
+
+async def ingest(mapa_datas, opcoes=None, eventos=None, origem="", destino="", tamanhos=None, executor=None):
+    """Copia os arquivos de `mapa_datas` (de `plan`) e devolve o resumo do backup.
+
+    As opções são as da interface (modo_destino, reorganizar, cache, ordem, limitador,
+    previas, catalogo, envio...). O progresso sai em `eventos`, um `CanalEventos` que é
+    fechado ao final: diario, fase, progresso, arquivo, log e fim. Cancelar a tarefa
+    interrompe entre um arquivo e outro (e para na hora prévias, folhas de contato e
+    envio); o diário registra o cancelamento. As duplicatas puladas ('duplicatas' de cada
+    data) são conferidas por hash depois da cópia; as que não conferem são copiadas.
+    """
+    opcoes = opcoes or {}
+    if executor is None:
+        executor = EXECUTOR_SEGUNDO_PLANO if opcoes.get('segundo_plano') else EXECUTOR_MOTOR
+    try:
+        return await _ingerir(mapa_datas, opcoes, eventos, origem, destino,
+                              tamanhos if tamanhos is not None else {}, executor)
+    finally:
+        if eventos is not None:
+            eventos.fechar()
+
+
+async def _ingerir(mapa_datas, opcoes, eventos, origem, destino, tamanhos, executor):
+    # Cópia rasa com listas próprias: duplicatas que não conferem entram na lista da data,
+    # e o mapa do chamador (reaproveitado pela interface) não pode mudar
+    mapa_datas = {data: dict(dados, arquivos=list(dados['arquivos'])) for data, dados in mapa_datas.items()}
+    def emitir(tipo, **dados):
+        if eventos is not None:
+            eventos.emitir(tipo, **dados)
+
+    def progresso(percentual, info, detalhe=None):
+        emitir('progresso', percentual=percentual, info=info, detalhe=detalhe)
+
+    def fase(nome):
+        metricas.iniciar_fase(nome)
+        emitir('fase', nome=nome)
+
+    copiados, erros, total_tamanho, pastas_criadas = 0, 0, 0, set()
+    removidos_origem = 0
+    tempo_inicio = time.time()
+    modo_destino = opcoes.get('modo_destino', 'pastas')
+    reorganizar = opcoes.get('reorganizar', 'copiar')
+    cache = opcoes.get('cache', 'normal')
+    limitador = opcoes.get('limitador')
+    recuperacoes = []
+    gerador_previas = None
+    metricas = opcoes.get('metricas') or MetricasIngest()
+    catalogo, entradas_catalogo = None, []
+    metadados = opcoes.get('metadados') or {}
+    fila_envio = None
+
+    total_arquivos_a_copiar = sum(len(d['arquivos'])
+                                  for d in mapa_datas.values())
+    if total_arquivos_a_copiar == 0:
+        resumo_dados = {'arquivos_copiados': 0, 'erros': 0, 'tamanho_total': '0 B', 'pastas_criadas': 0,
+                        'tempo_total': 0, 'pasta_destino': None}
+        emitir('fim', concluido=True, sucesso=True, resumo=resumo_dados)
+        return resumo_dados
+
+    destino_log_base = list(mapa_datas.values())[0]['pasta']
+    destino = destino or os.path.dirname(destino_log_base)
+    nome_log = f"backup_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    try:
+        os.makedirs(destino_log_base, exist_ok=True)
+        diario = DiarioBackup(os.path.join(destino_log_base, nome_log + ".jsonl"))
+    except OSError as e:
+        emitir('log', texto=f"❌ Não foi possível criar o diário do backup: {e}")
+        emitir('fim', concluido=False, sucesso=False, resumo=None)
+        return None
+    if opcoes.get('previas') and modo_destino == 'pastas':
+        gerador_previas = GeradorPrevias()
+    if opcoes.get('catalogo'):
+        try:
+            catalogo = CatalogoMetadados()
+        except sqlite3.Error as e:
+            diario.mensagem(f"❌ Catálogo de metadados indisponível: {e}")
+    algoritmo_catalogo = algoritmo_hash_padrao()
+    if opcoes.get('envio') is not None:
+        fila_envio = FilaEnvio(opcoes['envio'], limite_durante_copia=opcoes.get('limite_envio', 0))
+        metricas.definir_fila('envio', fila_envio.fila.qsize)
+        if fila_envio.retomar_pendentes():
+            diario.mensagem(
+                f"☁️ Retomando {fila_envio.retomados} envio(s) interrompido(s) para {fila_envio.backend.identificador}")
+
+    def enviar(caminho):
+        if fila_envio is not None:
+            fila_envio.enfileirar(caminho, chave_envio(caminho, destino))
+
+    sem_metadados = 0
+
+    def catalogar(arq, destino, tipo, hash_obj=None, forcar=False):
+        nonlocal sem_metadados
+        if catalogo is None:
+            return
+        if arq is not None:
+            dados_arquivo = metadados.get(arq)
+            if dados_arquivo is None:
+                # Não lidos na análise: reler os cabeçalhos no destino seria mais uma passada,
+                # então a entrada fica com nome, tamanho, data e hash
+                dados_arquivo = {}
+                if tipo != 'METADATA':
+                    sem_metadados += 1
+            entradas_catalogo.append(entrada_catalogo(
+                arq, destino, tipo, dados_arquivo, hash_obj.hexdigest() if hash_obj else None,
+                algoritmo_catalogo, tamanhos.get(arq)))
+        if entradas_catalogo and (forcar or len(entradas_catalogo) >= LOTE_CATALOGO):
+            try:
+                catalogo.registrar(entradas_catalogo)
+            except sqlite3.Error as e:
+                diario.mensagem(
+                    f"❌ Erro ao gravar {len(entradas_catalogo)} arquivo(s) no catálogo: {e}")
+            entradas_catalogo.clear()
+
+    todos_arquivos = [a for d in mapa_datas.values() for a in d['arquivos']]
+    metricas.reiniciar('backup', tamanho_total_arquivos(todos_arquivos, tamanhos),
+                       total_arquivos_a_copiar)
+    fase('copia')
+    if gerador_previas is not None:
+        metricas.definir_fila('previas', gerador_previas.fila.qsize)
+    diario.registrar('inicio', origem=origem, destino=destino,
+                     total_arquivos=total_arquivos_a_copiar, reorganizacao=reorganizar)
+    emitir('diario', caminho=diario.caminho)
+
+    plano = ordenar_execucao(planejar_copia(mapa_datas), mapa_datas,
+                             opcoes.get('ordem', 'cronologica'), tamanhos)
+    if opcoes.get('ordem', 'cronologica') != 'cronologica':
+        progresso(0, "Planejando cópia...",
+                  f"\n🔀 Ordem da cópia: {ORDENS_COPIA[opcoes['ordem']]}")
+
+    containers, cancelado = {}, threading.Event()
+    # Arquivos que ficam no lugar de duplicatas: status e hash do fluxo da cópia
+    sobreviventes = {s for dados in mapa_datas.values() for s in dados.get('duplicatas', {}).values()}
+    status_sobreviventes, hashes_sobreviventes = {}, {}
+
+    def copiar_item(item):
+        nonlocal copiados, erros, total_tamanho, removidos_origem
+        data, arq, tipo, novo_nome = item['data'], item['arquivo'], item['tipo'], item['novo_nome']
+        dados = mapa_datas[data]
+        destino_final = arq  # no TAR o arquivo mantido de uma duplicata é conferido na origem
+        adiado = False
+        try:
+            ext = os.path.splitext(arq)[1].lower()
+            status = ""
+            if modo_destino != 'pastas':
+                if data not in containers:
+                    os.makedirs(dados['pasta'], exist_ok=True)
+                    containers[data] = ContainerTar(os.path.join(dados['pasta'], f"backup_{data}.tar"),
+                                                    comprimir_meta=(modo_destino == 'tar_zstd'))
+                container = containers[data]
+                nome_membro = f"{tipo}/{novo_nome}"
+                st = os.stat(arq)
+                if container.contem(nome_membro, st.st_size, st.st_mtime):
+                    status = "⏭️ Ignorado (idêntico)"
+                else:
+                    container.adicionar(
+                        arq, nome_membro, tipo, limitador)
+                    status = "✅ Copiado (tar)"
+                    total_tamanho += os.path.getsize(arq)
+                catalogar(arq, caminho_membro(container.caminho, nome_membro), tipo)
+            else:
+                destino_subpasta = os.path.join(dados['pasta'], tipo)
+                if destino_subpasta not in pastas_criadas:
+                    os.makedirs(destino_subpasta, exist_ok=True)
+                    pastas_criadas.add(destino_subpasta)
+
+                destino_final = os.path.join(destino_subpasta, novo_nome)
+
+                # Um arquivo salvo com áreas ilegíveis tem o mesmo tamanho, mas não é idêntico
+                if (os.path.exists(destino_final) and os.path.getsize(destino_final) == os.path.getsize(arq)
+                        and not os.path.exists(caminho_mapa_danos(destino_final))):
+                    status = "⏭️ Ignorado (idêntico)"
+                    catalogar(arq, destino_final, tipo)
+                else:
+                    tamanho_origem = os.path.getsize(arq)
+                    hash_copia = novo_hash(algoritmo_catalogo) if catalogo or arq in sobreviventes else None
+                    metodo, pendentes = reorganizar_arquivo(
+                        arq, destino_final, reorganizar, limitador, hash_copia, cache)
+                    tamanho_copiado = os.path.getsize(destino_final)
+                    if pendentes:
+                        # Termina o restante do cartão antes de insistir nas áreas ruins
+                        status = f"⚠️ Leitura parcial ({len(pendentes)} região(ões) adiada(s) para recuperação)"
+                        recuperacoes.append(
+                            (data, arq, destino_final, tipo, novo_nome, pendentes, item['ordem']))
+                        adiado = True
+                    elif tamanho_copiado == tamanho_origem:
+                        if os.path.exists(caminho_mapa_danos(destino_final)):
+                            os.remove(caminho_mapa_danos(destino_final))
+                        status = STATUS_REORGANIZACAO[metodo]
+                        if metodo == 'mover':
+                            removidos_origem += 1
+                        if metodo == 'copia' and reorganizar == 'mover':
+                            status += " (mover indisponível neste destino; origem mantida)"
+                        elif metodo == 'copia' and reorganizar != 'copiar':
+                            status += f" ({reorganizar} indisponível neste destino)"
+                        total_tamanho += tamanho_copiado
+                        if metodo == 'copia' and arq in sobreviventes:
+                            hashes_sobreviventes[arq] = hash_copia.hexdigest()
+                        catalogar(arq, destino_final, tipo,
+                                  hash_copia if metodo == 'copia' else None)
+                    else:
+                        status = "❌ Erro (tamanho diferente)"
+                        erros += 1
+
+                if status.startswith(('✅', '⏭️')):
+                    enviar(destino_final)
+                if gerador_previas and ext.upper() in EXTENSOES_RAW and status.startswith(('✅', '⏭️')):
+                    gerador_previas.enfileirar(
+                        destino_final, os.path.join(dados['pasta'], PASTA_PREVIAS))
+
+        except Exception as e:
+            status = f"❌ Erro: {e}"
+            erros += 1
+
+        copiados += 1
+        if arq in sobreviventes:
+            status_sobreviventes[arq] = (status, destino_final)
+        progresso(min(100, (copiados / total_arquivos_a_copiar) * 100),
+                  f"Copiando: {os.path.basename(arq)}", f"{status} -> {novo_nome}")
+        metricas.arquivo_concluido(tamanhos.get(arq, 0), status)
+        if adiado:
+            # O resultado do arquivo sai uma vez só, da recuperação; até lá fica uma nota
+            diario.mensagem(f"⚠️ {os.path.basename(arq)}: leitura parcial, {len(pendentes)} região(ões) "
+                            f"adiada(s) para recuperação", data=data)
+            return
+        emitir('arquivo', data=data, arquivo=arq, categoria=tipo, novo_nome=novo_nome, status=status)
+
+        diario.arquivo(data, arq, tipo, novo_nome, status, ordem=item['ordem'])
+
+    def conferir_duplicata(i, total, data, arq, sobrevivente):
+        """Verdadeiro se `arq` pode ser pulado: o arquivo que ficou foi salvo e é igual a ele."""
+        status, salvo_em = status_sobreviventes.get(sobrevivente, ("", None))
+        if not status.startswith(('✅', '⏭️')):
+            return False
+        tamanho = tamanhos.get(arq)
+        if tamanho is None:
+            tamanho = os.path.getsize(arq)
+        if tamanho <= 2 * TAMANHO_IMPRESSAO:
+            return True  # a impressão digital já cobriu o arquivo inteiro
+        progresso(100 * i / total, f"Conferindo duplicata: {os.path.basename(arq)} ({i}/{total})")
+        try:
+            esperado = hashes_sobreviventes.get(sobrevivente) or calcular_hash(
+                sobrevivente if os.path.exists(sobrevivente) else salvo_em, algoritmo_catalogo)
+            return calcular_hash(arq, algoritmo_catalogo) == esperado
+        except OSError:
+            return False
+
+    def fechar_containers():
+        nonlocal erros
+        for data, container in sorted(containers.items()):
+            try:
+                container.fechar()
+                enviar(container.caminho)
+            except Exception as e:
+                erros += 1
+                diario.mensagem(
+                    f"❌ Erro ao finalizar contêiner {container.caminho}: {e}", data=data)
+        containers.clear()
+
+    def recuperar_item(i, data, arq, destino_final, tipo, novo_nome, pendentes, ordem):
+        nonlocal erros, total_tamanho
+        progresso((i / len(recuperacoes)) * 100,
+                  f"Recuperando: {os.path.basename(arq)} ({i}/{len(recuperacoes)})")
+        try:
+            ilegiveis = recuperar_regioes(
+                arq, destino_final, pendentes, limitador=limitador)
+        except Exception as e:
+            ilegiveis, status = None, f"❌ Erro na recuperação: {e}"
+        if ilegiveis is None:
+            erros += 1
+        elif not ilegiveis:
+            status = "🩹 Recuperado integralmente"
+            total_tamanho += os.path.getsize(destino_final)
+            catalogar(arq, destino_final, tipo)
+            if os.path.exists(caminho_mapa_danos(destino_final)):
+                os.remove(caminho_mapa_danos(destino_final))
+            enviar(destino_final)
+        else:
+            erros += 1
+            perdidos = sum(fim - inicio for inicio, fim in ilegiveis)
+            if opcoes.get('preencher_ilegiveis'):
+                status = f"⚠️ Salvo com {formatar_tamanho(perdidos)} ilegíveis preenchidos com zeros"
+                with open(caminho_mapa_danos(destino_final), 'w', encoding='utf-8') as f:
+                    json.dump({'origem': arq, 'regioes_ilegiveis': ilegiveis}, f)
+            else:
+                status = f"❌ Erro: {formatar_tamanho(perdidos)} ilegíveis"
+                os.remove(destino_final)
+        progresso(100 * i / len(recuperacoes),
+                  f"Recuperando: {os.path.basename(arq)}", f"{status} -> {novo_nome}")
+        emitir('arquivo', data=data, arquivo=arq, categoria=tipo, novo_nome=novo_nome, status=status)
+        diario.arquivo(data, arq, tipo, novo_nome, status, ordem=ordem,
+                       regioes_ilegiveis=ilegiveis or [])
+
+    def fechar_catalogo():
+        if catalogo is not None:
+            catalogar(None, None, None, forcar=True)
+            catalogo.fechar()
+            if sem_metadados:
+                diario.mensagem(f"⚠️ Catálogo: câmera, lente e ISO de {sem_metadados} arquivo(s) ficaram em branco "
+                                f"(não lidos na análise; analise com o catálogo ativado para preenchê-los)")
+
+    def concluir_previas():
+        gerador_previas.concluir(d['pasta'] for d in mapa_datas.values())
+        diario.mensagem(f"🖼️ Prévias de RAW em {PASTA_PREVIAS}: {gerador_previas.geradas} gerada(s), "
+                        f"{gerador_previas.existentes} já existente(s), {gerador_previas.sem_previa} sem prévia embutida")
+        for raw, erro in gerador_previas.erros:
+            diario.mensagem(
+                f"❌ Erro na prévia de {os.path.basename(raw)}: {erro}")
+
+    def concluir_envio():
+        fila_envio.concluir(lambda feitos, total: progresso(
+            100 * feitos / total if total else 100,
+            f"Enviando para a nuvem: {formatar_tamanho(feitos)} de {formatar_tamanho(total)}"))
+        diario.mensagem(f"☁️ Envio: {fila_envio.enviados} arquivo(s) enviado(s), "
+                        f"{fila_envio.existentes} já existente(s) no destino, {len(fila_envio.erros)} erro(s)")
+        for arquivo, erro in fila_envio.erros:
+            diario.mensagem(f"❌ Erro no envio de {os.path.basename(arquivo)}: {erro}")
+
+    def resumo():
+        resumo_dados = {'arquivos_copiados': copiados - erros, 'erros': erros,
+                        'tamanho_total': formatar_tamanho(total_tamanho),
+                        'tempo_total': int(time.time() - tempo_inicio), 'pasta_destino': destino_log_base,
+                        'reorganizacao': reorganizar, 'removidos_origem': removidos_origem}
+        if fila_envio is not None:
+            resumo_dados['enviados'] = (f"{fila_envio.enviados + fila_envio.existentes}"
+                                        + (f" ({len(fila_envio.erros)} erro(s))" if fila_envio.erros else ""))
+        return resumo_dados
+
+    def cancelar():
+        # Tudo o que já foi gravado fica consistente: catálogo, contêineres e diário
+        fechar_containers()
+        fechar_catalogo()
+        if gerador_previas is not None:
+            gerador_previas.cancelar()
+        if fila_envio is not None:
+            fila_envio.cancelar()
+        diario.registrar('cancelado', copiados=copiados - erros, erros=erros,
+                         tamanho_total=total_tamanho, tempo_total=int(time.time() - tempo_inicio))
+        diario.fechar()
+        metricas.finalizar(False, erros)
+
+    def interromper():
+        # Roda no loop, no instante do cancelamento: só sinaliza quem está trabalhando
+        cancelado.set()
+        if gerador_previas is not None:
+            gerador_previas.cancelado.set()
+        if fila_envio is not None:
+            fila_envio.cancelado.set()
+
+    async def executar(funcao, *args):
+        return await _em_executor(executor, funcao, *args, ao_cancelar=interromper)
+
+    try:
+        data_atual = None
+        for item in plano:
+            data = item['data']
+            if data != data_atual and opcoes.get('ordem', 'cronologica') == 'cronologica':
+                progresso(int((copiados / total_arquivos_a_copiar) * 100),
+                          f"Processando data: {formatar_data_br(data)}", f"\n📅 Iniciando backup de {formatar_data_br(data)} ({len(mapa_datas[data]['arquivos'])} arquivos)")
+            data_atual = data
+            await executar(copiar_item, item)
+
+        # Duplicatas puladas na seleção: as que não conferem com o arquivo que ficou são copiadas
+        duplicatas = [(data, arq, sobrevivente) for data, dados in mapa_datas.items()
+                      for arq, sobrevivente in dados.get('duplicatas', {}).items()]
+        if duplicatas:
+            fase('duplicatas')
+        puladas, ordem = 0, len(plano)
+        nomes_usados = {(item['data'], item['tipo'], item['novo_nome']) for item in plano}
+        for i, (data, arq, sobrevivente) in enumerate(duplicatas, 1):
+            if await executar(conferir_duplicata, i, len(duplicatas), data, arq, sobrevivente):
+                puladas += 1
+                continue
+            dados, tipo = mapa_datas[data], tipo_arquivo(arq)
+            dados['arquivos'].append(arq)
+            total_arquivos_a_copiar += 1
+            # Mesmo nome do arquivo mantido (outro slot) com conteúdo diferente: não pode sobrescrevê-lo
+            novo_nome = nome_destino(arq, dados, len(dados['arquivos']))
+            raiz, ext = os.path.splitext(novo_nome)
+            n = 1
+            while (data, tipo, novo_nome) in nomes_usados:
+                n += 1
+                novo_nome = f"{raiz}_{n}{ext}"
+            nomes_usados.add((data, tipo, novo_nome))
+            await executar(copiar_item, {'ordem': ordem, 'data': data, 'arquivo': arq, 'tipo': tipo,
+                                         'novo_nome': novo_nome})
+            ordem += 1
+        if duplicatas:
+            diario.mensagem(f"♊ Duplicatas: {puladas} pulada(s) por serem iguais ao arquivo mantido, "
+                            f"{len(duplicatas) - puladas} copiada(s) por não conferirem")
+
+        await executar(fechar_containers)
+
+        if recuperacoes:
+            fase('recuperacao')
+            progresso(100, "Recuperando áreas danificadas...",
+                      f"\n🩹 Relendo {len(recuperacoes)} arquivo(s) com áreas danificadas")
+        for i, recuperacao in enumerate(recuperacoes, 1):
+            await executar(recuperar_item, i, *recuperacao)
+
+        await executar(fechar_catalogo)
+        if fila_envio is not None:
+            fila_envio.copia_concluida()
+
+        if gerador_previas is not None:
+            fase('previas')
+            progresso(100, "Extraindo prévias dos RAW...",
+                      "\n🖼️ Finalizando prévias JPEG dos RAW")
+            await executar(concluir_previas)
+
+        if opcoes.get('folhas_contato') and modo_destino == 'pastas':
+            fase('folhas_contato')
+            await executar(gerar_folhas_contato_por_data, mapa_datas, progresso, diario, cancelado)
+
+        if fila_envio is not None:
+            fase('envio')
+            progresso(0, "Enviando para a nuvem...",
+                      f"\n☁️ Concluindo o envio para {fila_envio.backend.identificador}")
+            await executar(concluir_envio)
+
+        fase('log')
+        progresso(100, "Finalizando...", "\n🔍 Gerando log...")
+    except asyncio.CancelledError:
+        await _em_executor(executor, cancelar)
+        resumo_dados = resumo()
+        emitir('log', texto=f"⛔ Backup cancelado: {copiados} de {total_arquivos_a_copiar} arquivos processados")
+        emitir('fim', concluido=False, sucesso=False, resumo=resumo_dados)
+        raise
+
+    resumo_dados = resumo()
+    resumo_texto = (f"📊 RESUMO DO BACKUP\n{'='*40}\n"
+                    f"✅ Arquivos copiados: {copiados - erros}\n"
+                    f"❌ Erros: {erros}\n"
+                    f"💾 Tamanho total: {formatar_tamanho(total_tamanho)}\n"
+                    f"⏱️ Tempo total: {resumo_dados['tempo_total']} segundos\n{'='*40}")
+
+    diario.registrar('fim', copiados=copiados - erros, erros=erros,
+                     tamanho_total=total_tamanho, tempo_total=resumo_dados['tempo_total'])
+    diario.fechar()
+    cabecalho = (f"BACKUP LOG - {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n"
+                 f"Origem: {origem}\nDestino: {destino}\n\n"
+                 + resumo_texto + "\n\n" + "="*40 + "\nDETALHES\n" + "="*40 + "\n\n")
+    try:
+        await _em_executor(executor, renderizar_log_texto, diario.caminho, os.path.join(
+            destino_log_base, nome_log + ".txt"), cabecalho)
+    except Exception as e:
+        emitir('log', texto=f"ERRO: Não foi possível salvar o log: {e}")
+
+    emitir('log', texto=resumo_texto)
+    metricas.finalizar(erros == 0, erros)
+    emitir('fim', concluido=True, sucesso=(erros == 0), resumo=resumo_dados)
+    return resumo_dados
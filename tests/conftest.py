@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# O motor fica na raiz do projeto; ~/.backup_cartao (tipos, caches, catálogo) vai para
+# uma pasta temporária antes da importação, para os testes não lerem nem gravarem a do usuário
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['HOME'] = os.environ['USERPROFILE'] = tempfile.mkdtemp(prefix='backup_cartao_testes_')
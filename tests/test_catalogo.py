@@ -0,0 +1,50 @@
+import pytest
+
+from motor_ingest import CatalogoMetadados, entrada_catalogo
+
+
+def entrada(nome, captura, camera, lente, tipo='FOTOS', hash_hex='ab12'):
+    return entrada_catalogo(f'/cartao/DCIM/{nome}', f'/backup/{captura[:10]}/{tipo}/{nome}', tipo,
+                            {'captura': captura, 'camera': camera, 'lente': lente},
+                            hash_hex, 'xxh64' if hash_hex else None, tamanho=1000)
+
+
+@pytest.fixture
+def catalogo(tmp_path):
+    catalogo = CatalogoMetadados(str(tmp_path / 'catalogo.sqlite3'))
+    catalogo.registrar([
+        entrada('DSC0001.ARW', '2024-05-01T09:00:00', 'ILCE-7M4', 'FE 24-70mm F2.8 GM II'),
+        entrada('DSC0002.ARW', '2024-05-01T23:30:00', 'ILCE-7M4', 'FE 85mm F1.8'),
+        entrada('C0001.MP4', '2024-05-02T10:00:00', 'ILCE-7M4', None, tipo='VIDEOS'),
+        entrada('IMG_0001.CR3', '2024-05-03T08:00:00', 'Canon EOS R6', 'RF24-105mm F4 L IS USM'),
+    ])
+    yield catalogo
+    catalogo.fechar()
+
+
+def nomes(resultados):
+    return [r['nome_original'] for r in resultados]
+
+
+def test_filtros(catalogo):
+    assert nomes(catalogo.buscar()) == ['DSC0001.ARW', 'DSC0002.ARW', 'C0001.MP4', 'IMG_0001.CR3']
+    assert nomes(catalogo.buscar(camera='canon')) == ['IMG_0001.CR3']
+    assert nomes(catalogo.buscar(lente='85mm')) == ['DSC0002.ARW']
+    assert nomes(catalogo.buscar(tipo='VIDEOS')) == ['C0001.MP4']
+    assert nomes(catalogo.buscar(texto='IMG_')) == ['IMG_0001.CR3']
+    assert nomes(catalogo.buscar(camera='ILCE', tipo='FOTOS', limite=1)) == ['DSC0001.ARW']
+
+
+def test_intervalo_inclui_o_dia_final_inteiro(catalogo):
+    assert nomes(catalogo.buscar(de='2024-05-01', ate='2024-05-01')) == ['DSC0001.ARW', 'DSC0002.ARW']
+    assert nomes(catalogo.buscar(de='2024-05-02')) == ['C0001.MP4', 'IMG_0001.CR3']
+    assert nomes(catalogo.buscar(ate='2024-04-30')) == []
+
+
+def test_atualizacao_mantem_hash_conhecido(catalogo):
+    catalogo.registrar([entrada('DSC0001.ARW', '2024-05-01T09:00:00', 'ILCE-7M4', 'Tamron 28-75mm',
+                                hash_hex=None)])
+    [linha] = catalogo.buscar(texto='DSC0001')
+    assert linha['lente'] == 'Tamron 28-75mm'
+    assert (linha['hash'], linha['algoritmo']) == ('ab12', 'xxh64')
+    assert len(catalogo.buscar()) == 4
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from motor_ingest import (ZSTD_AVAILABLE, ContainerTar, abrir_membro, carregar_indice_container,
+                          extrair_do_container)
+
+
+def criar(caminho, conteudo):
+    with open(caminho, 'wb') as f:
+        f.write(conteudo)
+    return str(caminho)
+
+
+@pytest.fixture
+def arquivos(tmp_path):
+    origem = tmp_path / 'cartao'
+    origem.mkdir()
+    return {
+        'FOTOS/DSC0001.arw': criar(origem / 'DSC0001.arw', os.urandom(5000)),
+        'METADATA/DSC0001.xmp': criar(origem / 'DSC0001.xmp', b'<x:xmpmeta/>' * 300),
+    }
+
+
+def preencher(caminho_tar, arquivos, comprimir_meta=False):
+    container = ContainerTar(caminho_tar, comprimir_meta)
+    for nome, arquivo in arquivos.items():
+        container.adicionar(arquivo, nome, nome.split('/')[0])
+    container.fechar()
+
+
+def test_adicionar_e_contem(tmp_path, arquivos):
+    caminho_tar = str(tmp_path / '2024-05-01.tar')
+    preencher(caminho_tar, arquivos)
+    assert os.path.exists(caminho_tar + '.idx.json')
+
+    container = ContainerTar(caminho_tar)
+    try:
+        for nome, arquivo in arquivos.items():
+            st = os.stat(arquivo)
+            assert container.contem(nome, st.st_size, st.st_mtime)
+            assert not container.contem(nome, st.st_size + 1, st.st_mtime)
+        assert not container.contem('FOTOS/DSC0002.arw', 5000)
+    finally:
+        container.fechar()
+
+
+def test_extrair_membro_isolado(tmp_path, arquivos):
+    caminho_tar = str(tmp_path / '2024-05-01.tar')
+    preencher(caminho_tar, arquivos)
+
+    destino = str(tmp_path / 'extraido.arw')
+    extrair_do_container(caminho_tar, 'FOTOS/DSC0001.arw', destino)
+    with open(destino, 'rb') as a, open(arquivos['FOTOS/DSC0001.arw'], 'rb') as b:
+        assert a.read() == b.read()
+    with abrir_membro(caminho_tar, 'METADATA/DSC0001.xmp') as f:
+        assert f.read() == b'<x:xmpmeta/>' * 300
+
+
+@pytest.mark.parametrize('comprimir_meta', [
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(not ZSTD_AVAILABLE, reason="requer zstandard")),
+])
+def test_indice_reconstruido_sem_idx(tmp_path, arquivos, comprimir_meta):
+    caminho_tar = str(tmp_path / '2024-05-01.tar')
+    preencher(caminho_tar, arquivos, comprimir_meta)
+    original = carregar_indice_container(caminho_tar)
+    os.remove(caminho_tar + '.idx.json')
+
+    reconstruido = carregar_indice_container(caminho_tar)
+    assert reconstruido.keys() == original.keys()
+    for nome, entrada in reconstruido.items():
+        for campo in ('membro', 'offset', 'tamanho', 'tamanho_original', 'compressao'):
+            assert entrada[campo] == original[nome][campo], (nome, campo)
+
+    # Retomada sobre o índice reconstruído reconhece tudo o que já foi gravado
+    tamanho_tar = os.path.getsize(caminho_tar)
+    container = ContainerTar(caminho_tar, comprimir_meta)
+    for nome, arquivo in arquivos.items():
+        st = os.stat(arquivo)
+        assert container.contem(nome, st.st_size, st.st_mtime)
+    container.fechar()
+    assert os.path.getsize(caminho_tar) == tamanho_tar
@@ -0,0 +1,63 @@
+import pytest
+
+import motor_ingest
+from motor_ingest import LimitadorBanda
+
+
+class Relogio:
+    """Relógio falso: `sleep` só avança o tempo, então as esperas são exatas e instantâneas."""
+
+    def __init__(self):
+        self.agora = 1000.0
+        self.dormido = 0.0
+        self.ao_dormir = None
+
+    def monotonic(self):
+        return self.agora
+
+    def sleep(self, segundos):
+        # Piso de 1 µs: frações abaixo da resolução do float não fariam o relógio andar
+        segundos = max(segundos, 1e-6)
+        self.agora += segundos
+        self.dormido += segundos
+        if self.ao_dormir:
+            self.ao_dormir()
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(motor_ingest.time, 'monotonic', relogio.monotonic)
+    monkeypatch.setattr(motor_ingest.time, 'sleep', relogio.sleep)
+    return relogio
+
+
+def test_taxa_zero_nao_limita(relogio):
+    limitador = LimitadorBanda(0)
+    for _ in range(100):
+        limitador.consumir(10 * 1024 * 1024)
+    assert relogio.dormido == 0
+
+
+def test_vazao_segue_a_taxa(relogio):
+    limitador = LimitadorBanda(1_000_000)
+    for _ in range(10):
+        limitador.consumir(100_000)
+    assert relogio.dormido == pytest.approx(1.0, abs=1e-3)
+
+
+def test_credito_ocioso_limitado_pela_rajada(relogio):
+    taxa = 40 * 1024 * 1024
+    limitador = LimitadorBanda(taxa)
+    relogio.agora += 100  # muito tempo parado não vira crédito ilimitado
+    limitador.consumir(taxa)
+    # Só a rajada de 250 ms estava disponível; o restante espera a taxa
+    assert relogio.dormido == pytest.approx(0.75, abs=1e-3)
+
+
+def test_ajuste_durante_a_espera(relogio):
+    limitador = LimitadorBanda(1000)
+    relogio.ao_dormir = lambda: limitador.ajustar(0)
+    limitador.consumir(1_000_000)  # levaria 1000 s na taxa inicial
+    assert relogio.dormido <= 0.2
+    assert limitador.taxa == 0
@@ -0,0 +1,76 @@
+import os
+
+from motor_ingest import (PASTA_MHL, calcular_hash, exportar_mhl, importar_mhl, tem_lista_mhl,
+                          verificar_contra_mhl)
+
+
+def criar_destino(raiz):
+    arquivos = []
+    for relativo, conteudo in (('FOTOS/DSC0001.arw', b'a' * 3000), ('VIDEOS/C0001.mp4', b'b' * 7000)):
+        caminho = os.path.join(raiz, *relativo.split('/'))
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, 'wb') as f:
+            f.write(conteudo)
+        arquivos.append(caminho)
+    return arquivos
+
+
+def exportar(raiz, arquivos, acao='original'):
+    return exportar_mhl(raiz, [(c, 'md5', calcular_hash(c, 'md5'), acao) for c in arquivos])
+
+
+def test_exportar_e_importar(tmp_path):
+    raiz = str(tmp_path)
+    arquivos = criar_destino(raiz)
+    assert not tem_lista_mhl(raiz)
+
+    mhl = exportar(raiz, arquivos)
+    assert os.path.dirname(mhl) == os.path.join(raiz, PASTA_MHL)
+    assert tem_lista_mhl(raiz)
+
+    esperados = importar_mhl(raiz)
+    assert set(esperados) == {'FOTOS/DSC0001.arw', 'VIDEOS/C0001.mp4'}
+    assert esperados['FOTOS/DSC0001.arw'] == {
+        'tamanho': 3000, 'algoritmo': 'md5', 'hash': calcular_hash(arquivos[0], 'md5')}
+
+
+def test_geracoes_encadeadas(tmp_path):
+    raiz = str(tmp_path)
+    arquivos = criar_destino(raiz)
+    primeira = exportar(raiz, arquivos)
+
+    with open(arquivos[0], 'ab') as f:
+        f.write(b'novo')
+    segunda = exportar(raiz, arquivos[:1], 'verified')
+    assert os.path.basename(primeira).startswith('0001_')
+    assert os.path.basename(segunda).startswith('0002_')
+
+    # A geração mais recente prevalece; os demais arquivos continuam da primeira
+    esperados = importar_mhl(raiz)
+    assert esperados['FOTOS/DSC0001.arw']['tamanho'] == 3004
+    assert esperados['VIDEOS/C0001.mp4']['tamanho'] == 7000
+
+
+def test_falhas_nao_viram_referencia(tmp_path):
+    raiz = str(tmp_path)
+    arquivos = criar_destino(raiz)
+    exportar(raiz, arquivos[:1], 'failed')
+    assert importar_mhl(raiz) == {}
+
+
+def test_verificar_destino(tmp_path):
+    raiz = str(tmp_path)
+    arquivos = criar_destino(raiz)
+    exportar(raiz, arquivos)
+
+    with open(arquivos[0], 'r+b') as f:
+        f.write(b'X')  # mesmo tamanho, conteúdo diferente
+    os.remove(arquivos[1])
+
+    status = {os.path.relpath(r['destino'], raiz).replace(os.sep, '/'): r['status']
+              for r in verificar_contra_mhl(raiz, modo='completo')}
+    assert status == {'FOTOS/DSC0001.arw': 'divergente', 'VIDEOS/C0001.mp4': 'ausente'}
+
+    # O modo rápido só confere o tamanho
+    rapido = verificar_contra_mhl(raiz, modo='rapido')
+    assert [r['status'] for r in rapido if r['destino'] == arquivos[0]] == ['ok']
@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+from motor_ingest import ordenar_execucao, planejar_copia
+
+
+def criar(pasta, nome, tamanho, mtime):
+    caminho = os.path.join(pasta, nome)
+    with open(caminho, 'wb') as f:
+        f.write(bytes(tamanho))
+    os.utime(caminho, (mtime, mtime))
+    return caminho
+
+
+@pytest.fixture
+def mapa_datas(tmp_path):
+    pasta = str(tmp_path)
+    base = 1_700_000_000
+    # Listados fora de ordem de propósito: o plano ordena por data e mtime
+    dia1 = [criar(pasta, 'C0002.MP4', 9000, base + 30), criar(pasta, 'DSC0007.ARW', 5000, base + 10),
+            criar(pasta, 'DSC0007.XMP', 100, base + 20)]
+    dia2 = [criar(pasta, 'DSC0100.ARW', 3000, base + 90_000), criar(pasta, 'C0003.MP4', 1000, base + 80_000)]
+    return {
+        '2023-11-14': {'arquivos': dia1, 'renomear': True, 'prefixo': 'Casamento',
+                       'manter_numeracao': False, 'fixada': False},
+        '2023-11-15': {'arquivos': dia2, 'renomear': False, 'prefixo': None,
+                       'manter_numeracao': False, 'fixada': False},
+    }
+
+
+def nomes(plano):
+    return [os.path.basename(item['arquivo']) for item in plano]
+
+
+def test_plano_cronologico(mapa_datas):
+    plano = planejar_copia(mapa_datas)
+    assert nomes(plano) == ['DSC0007.ARW', 'DSC0007.XMP', 'C0002.MP4', 'C0003.MP4', 'DSC0100.ARW']
+    assert [item['ordem'] for item in plano] == list(range(5))
+    assert [item['tipo'] for item in plano] == ['FOTOS', 'METADATA', 'VIDEOS', 'VIDEOS', 'FOTOS']
+    assert [item['novo_nome'] for item in plano] == [
+        'Casamento_0001.arw', 'Casamento_0002.xmp', 'Casamento_0003.mp4', 'C0003.MP4', 'DSC0100.ARW']
+
+
+def test_manter_numeracao(mapa_datas):
+    mapa_datas['2023-11-14']['manter_numeracao'] = True
+    plano = planejar_copia(mapa_datas)
+    assert [item['novo_nome'] for item in plano[:3]] == [
+        'Casamento_0007.arw', 'Casamento_0007.xmp', 'Casamento_0002.mp4']
+
+
+def test_ordem_de_execucao_nao_muda_nomes(mapa_datas):
+    plano = planejar_copia(mapa_datas)
+    nomes_finais = {item['arquivo']: item['novo_nome'] for item in plano}
+    for politica in ('cronologica', 'menores', 'fotos'):
+        execucao = ordenar_execucao(plano, mapa_datas, politica)
+        assert sorted(execucao, key=lambda item: item['ordem']) == plano
+        assert {item['arquivo']: item['novo_nome'] for item in execucao} == nomes_finais
+
+
+def test_politicas(mapa_datas):
+    plano = planejar_copia(mapa_datas)
+    assert ordenar_execucao(plano, mapa_datas) == plano
+    assert nomes(ordenar_execucao(plano, mapa_datas, 'menores')) == [
+        'DSC0007.XMP', 'C0003.MP4', 'DSC0100.ARW', 'DSC0007.ARW', 'C0002.MP4']
+    assert nomes(ordenar_execucao(plano, mapa_datas, 'fotos')) == [
+        'DSC0007.ARW', 'DSC0100.ARW', 'DSC0007.XMP', 'C0002.MP4', 'C0003.MP4']
+    # Tamanhos já conhecidos (da análise) dispensam o stat
+    tamanhos = {item['arquivo']: -item['ordem'] for item in plano}
+    assert nomes(ordenar_execucao(plano, mapa_datas, 'menores', tamanhos)) == nomes(plano)[::-1]
+
+
+def test_data_fixada_primeiro(mapa_datas):
+    plano = planejar_copia(mapa_datas)
+    mapa_datas['2023-11-15']['fixada'] = True
+    assert nomes(ordenar_execucao(plano, mapa_datas)) == [
+        'C0003.MP4', 'DSC0100.ARW', 'DSC0007.ARW', 'DSC0007.XMP', 'C0002.MP4']
+    assert nomes(ordenar_execucao(plano, mapa_datas, 'fotos')) == [
+        'DSC0100.ARW', 'C0003.MP4', 'DSC0007.ARW', 'DSC0007.XMP', 'C0002.MP4']
@@ -0,0 +1,77 @@
+import errno
+import os
+
+import pytest
+
+import motor_ingest
+from motor_ingest import BLOCOS_RECUPERACAO, recuperar_regioes
+
+TAMANHO = 1024 * 1024
+
+
+@pytest.fixture
+def arquivos(tmp_path, monkeypatch):
+    monkeypatch.setattr(motor_ingest.time, 'sleep', lambda _: None)
+    origem, destino = str(tmp_path / 'origem.arw'), str(tmp_path / 'destino.arw')
+    conteudo = os.urandom(TAMANHO)
+    with open(origem, 'wb') as f:
+        f.write(conteudo)
+    with open(destino, 'wb') as f:
+        f.write(bytes(TAMANHO))  # como a primeira passada deixa as regiões puladas
+    return origem, destino, conteudo
+
+
+def setores_ruins(monkeypatch, inicio, fim, falhas=None):
+    """Leituras que tocam [inicio, fim) dão EIO; com `falhas`, só as N primeiras."""
+    pread = motor_ingest._pread
+    restantes = [falhas]
+
+    def _pread(fd, tamanho, offset):
+        if offset < fim and offset + tamanho > inicio and restantes[0] != 0:
+            if restantes[0] is not None:
+                restantes[0] -= 1
+            raise OSError(errno.EIO, "Input/output error")
+        return pread(fd, tamanho, offset)
+    monkeypatch.setattr(motor_ingest, '_pread', _pread)
+
+
+def ler(caminho):
+    with open(caminho, 'rb') as f:
+        return f.read()
+
+
+def test_isola_setores_ilegiveis(arquivos, monkeypatch):
+    origem, destino, conteudo = arquivos
+    setores_ruins(monkeypatch, 200_000, 201_000)
+
+    ilegiveis = recuperar_regioes(origem, destino, [(100_000, 400_000)])
+
+    # A região ilegível fica reduzida aos blocos mínimos que tocam o defeito
+    menor = BLOCOS_RECUPERACAO[-1]
+    inicio = 100_000 + (200_000 - 100_000) // menor * menor
+    fim = 100_000 + -(-(201_000 - 100_000) // menor) * menor
+    assert ilegiveis == [(inicio, fim)]
+
+    copiado = ler(destino)
+    assert copiado[100_000:inicio] == conteudo[100_000:inicio]
+    assert copiado[fim:400_000] == conteudo[fim:400_000]
+    assert copiado[inicio:fim] == bytes(fim - inicio)
+    # Fora das regiões pendentes o destino não é tocado
+    assert copiado[:100_000] == bytes(100_000)
+    assert copiado[400_000:] == bytes(TAMANHO - 400_000)
+
+
+def test_falha_transitoria_recuperada(arquivos, monkeypatch):
+    origem, destino, conteudo = arquivos
+    # Cada nível de bloco falha uma vez; a nova tentativa no menor bloco consegue ler
+    setores_ruins(monkeypatch, 500_000, 500_100, falhas=len(BLOCOS_RECUPERACAO))
+
+    assert recuperar_regioes(origem, destino, [(0, TAMANHO)]) == []
+    assert ler(destino) == conteudo
+
+
+def test_regioes_vizinhas_unidas(arquivos, monkeypatch):
+    origem, destino, _ = arquivos
+    setores_ruins(monkeypatch, 0, TAMANHO)
+
+    assert recuperar_regioes(origem, destino, [(0, 4096), (4096, 8192)], tentativas=2) == [(0, 8192)]
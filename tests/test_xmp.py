@@ -0,0 +1,77 @@
+import pytest
+
+from motor_ingest import associar_sidecars, excluidos_por_classificacao, ler_classificacao_xmp
+
+CABECALHO = ('<x:xmpmeta xmlns:x="adobe:ns:meta/">'
+             '<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">')
+RODAPE = '</rdf:RDF></x:xmpmeta>'
+
+
+def sidecar(tmp_path, descricao, nome='DSC0001.xmp', rodape=RODAPE):
+    caminho = tmp_path / nome
+    caminho.write_text(CABECALHO + descricao + rodape, encoding='utf-8')
+    return str(caminho)
+
+
+def test_atributos(tmp_path):
+    caminho = sidecar(tmp_path, '<rdf:Description xmlns:xmp="http://ns.adobe.com/xap/1.0/" '
+                                'xmp:Rating="4" xmp:Label="Red"/>')
+    assert ler_classificacao_xmp(caminho) == {
+        'nota': 4, 'rotulo': 'Red', 'escolhida': False, 'rejeitada': False}
+
+
+def test_elementos_com_prefixo_proprio(tmp_path):
+    # O que vale é o namespace, não o nome do prefixo
+    caminho = sidecar(tmp_path, '<rdf:Description xmlns:a="http://ns.adobe.com/xap/1.0/">'
+                                '<a:Rating>\n  3\n</a:Rating><a:Label>Verde</a:Label>'
+                                '</rdf:Description>')
+    classificacao = ler_classificacao_xmp(caminho)
+    assert (classificacao['nota'], classificacao['rotulo']) == (3, 'Verde')
+
+
+def test_prefixo_sem_declaracao(tmp_path):
+    caminho = sidecar(tmp_path, '<rdf:Description xmp:Rating="5"/>')
+    assert ler_classificacao_xmp(caminho)['nota'] == 5
+
+
+@pytest.mark.parametrize('descricao, escolhida, rejeitada', [
+    ('xmp:Rating="-1"', False, True),
+    ('xmpDM:pick="-1"', False, True),
+    ('xmpDM:pick="1"', True, False),
+    ('xmpDM:good="true"', True, False),
+    ('xmpDM:good="false"', False, False),
+    ('photomechanic:Tagged="True"', True, False),
+    ('photomechanic:Tagged="False"', False, False),
+])
+def test_escolha_e_rejeicao(tmp_path, descricao, escolhida, rejeitada):
+    caminho = sidecar(tmp_path, f'<rdf:Description {descricao}/>')
+    classificacao = ler_classificacao_xmp(caminho)
+    assert (classificacao['escolhida'], classificacao['rejeitada']) == (escolhida, rejeitada)
+
+
+def test_sem_classificacao(tmp_path):
+    caminho = sidecar(tmp_path, '<rdf:Description xmlns:dc="http://purl.org/dc/elements/1.1/" '
+                                'dc:format="image/x-sony-arw"/>')
+    assert ler_classificacao_xmp(caminho) is None
+    assert ler_classificacao_xmp(str(tmp_path / 'inexistente.xmp')) is None
+
+
+def test_para_no_fim_do_rdf(tmp_path):
+    # Lixo depois do rdf:RDF (padding, gravação interrompida) não é lido
+    caminho = sidecar(tmp_path, '<rdf:Description xmp:Rating="2"/>',
+                      rodape='</rdf:RDF><<< truncado')
+    assert ler_classificacao_xmp(caminho)['nota'] == 2
+
+
+def test_exclusao_preserva_sidecar_compartilhado(tmp_path):
+    raw, jpg, avulsa = (str(tmp_path / n) for n in ('DSC0001.ARW', 'DSC0001.JPG', 'DSC0002.ARW'))
+    xmp, xmp_avulsa = str(tmp_path / 'DSC0001.XMP'), str(tmp_path / 'DSC0002.ARW.xmp')
+    sidecars = associar_sidecars([raw, jpg, avulsa], [xmp, xmp_avulsa])
+    assert sidecars == {raw: xmp, jpg: xmp, avulsa: xmp_avulsa}
+
+    classificacoes = {raw: {'nota': 1}, jpg: {'nota': 4}, avulsa: {'nota': 0}}
+    arquivos = [raw, jpg, avulsa, xmp, xmp_avulsa]
+    excluidos = excluidos_por_classificacao(arquivos, classificacoes, sidecars, nota_minima=3)
+    # O XMP do par continua porque o JPEG mantido ainda depende dele
+    assert excluidos == {raw, avulsa, xmp_avulsa}
+    assert excluidos_por_classificacao(arquivos, classificacoes, sidecars) == set()